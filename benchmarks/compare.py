@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Compares two JSON outputs of benchmarks/fill.py, case by case.
+
+Usage: python benchmarks/compare.py BEFORE.json AFTER.json [--threshold FRACTION]
+
+Prints the ratio of events per second (after/before) for each case and chunk size in both files and exits with status 1 if any is slower than 1 - threshold (default: 0.1, i.e. 10% slower).
+"""
+
+import argparse
+import json
+import sys
+
+def load(filename):
+    with open(filename) as file:
+        out = json.load(file)
+    return out, dict(((x["case"], x["chunk"]), x) for x in out["results"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares two benchmarks/fill.py outputs.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fractional slowdown to report as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    beforeinfo, before = load(args.before)
+    afterinfo, after = load(args.after)
+    print("before: {0} ({1})".format(args.before, beforeinfo.get("commit")))
+    print("after:  {0} ({1})".format(args.after, afterinfo.get("commit")))
+    print("")
+
+    regressions = 0
+    for key in sorted(set(before).intersection(after)):
+        ratio = after[key]["eventspersec"] / before[key]["eventspersec"]
+        if ratio < 1 - args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio > 1 + args.threshold:
+            flag = "  improvement"
+        else:
+            flag = ""
+        print("{0:20s} {1:>9d} events: {2:14.0f} -> {3:14.0f} events/s  x{4:6.2f}{5}".format(key[0], key[1], before[key]["eventspersec"], after[key]["eventspersec"], ratio, flag))
+
+    for key in sorted(set(before).symmetric_difference(after)):
+        print("{0:20s} {1:>9d} events: only in {2}".format(key[0], key[1], args.before if key in before else args.after))
+
+    if regressions > 0:
+        print("\n{0} regression{1}".format(regressions, "" if regressions == 1 else "s"))
+        sys.exit(1)
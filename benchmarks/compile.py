@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Times Book construction and fill-plan compilation for many-histogram books.
+
+Usage: python benchmarks/compile.py [numhists ...]    (default: 1000 10000)
+"""
+
+import sys
+import time
+
+from histbook import *
+
+def book(numhists):
+    out = Book()
+    for i in range(numhists):
+        out["h{0}".format(i)] = Hist(bin("sqrt(x**2 + y**{0})".format(i % 7 + 1), 10, 0, i + 1), weight="w*{0}".format(i % 13 + 1), filter="z > {0}".format(i % 5))
+    return out
+
+def run(numhists):
+    starttime = time.time()
+    b = book(numhists)
+    midtime = time.time()
+    b.fields
+    endtime = time.time()
+    return {"numhists": numhists, "construct": midtime - starttime, "compile": endtime - midtime, "instructions": len(b._instructions)}
+
+if __name__ == "__main__":
+    for numhists in [int(x) for x in sys.argv[1:]] or [1000, 10000]:
+        result = run(numhists)
+        print("{numhists:6d} hists: construct {construct:8.3f} s  compile {compile:8.3f} s  ({instructions} instructions)".format(**result))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+
+"""Measures fill throughput (events per second) and per-fill latency on synthetic data.
+
+Usage: python benchmarks/fill.py [CASE ...] [--chunks N ...] [--backend NAME] [--mintime SECONDS] [--output FILE.json]
+
+Each case is a Hist or Book filled repeatedly with chunks of each size, after one untimed fill to compile the fill plan. CASE arguments select cases whose names start with them (default: all). Compare two JSON outputs with benchmarks/compare.py.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy
+
+import histbook
+import histbook.fill
+from histbook import *
+
+clock = getattr(time, "perf_counter", time.time)
+
+def backends():
+    """Calculation backends of the histbook being measured (only ``"numpy"`` for versions without fill plans, so that older commits can be compared)."""
+    return getattr(getattr(histbook.fill, "FillPlan", None), "backends", ("numpy",))
+
+def data(numevents, seed=12345):
+    """Synthetic events: normal ``x``, ``y``, ``z``, uniform weight ``w``, integers ``n`` in [0, 20), and categories ``c`` (10 values) and ``id`` (up to 10000 values)."""
+    random = numpy.random.RandomState(seed)
+    return {"x": random.normal(0, 1, numevents),
+            "y": random.normal(0, 1, numevents),
+            "z": random.normal(0, 1, numevents),
+            "w": random.uniform(0, 1, numevents),
+            "n": random.randint(0, 20, numevents),
+            "c": random.randint(0, 10, numevents),
+            "id": random.randint(0, 10000, numevents)}
+
+def book(numhists):
+    """Book of histograms that share subexpressions: a few radii, each binned, weighted, and filtered several ways."""
+    out = Book()
+    for i in range(numhists):
+        out["h{0}".format(i)] = Hist(bin("sqrt(x**2 + y**2) + {0}*z".format(i % 3), i % 10 + 10, 0, 5), weight="w*{0}".format(i % 7 + 1), filter="z > {0}".format((i % 5) * 0.25))
+    return out
+
+cases = [
+    ("bin1d",               lambda: Hist(bin("x", 100, -5, 5))),
+    ("bin2d",               lambda: Hist(bin("x", 100, -5, 5), bin("y", 100, -5, 5))),
+    ("bin3d",               lambda: Hist(bin("x", 20, -5, 5), bin("y", 20, -5, 5), bin("z", 20, -5, 5))),
+    ("split",               lambda: Hist(split("x", (-2, -1, 0, 1, 2)))),
+    ("intbin",              lambda: Hist(intbin("n", 0, 19))),
+    ("groupby-low",         lambda: Hist(groupby("c"))),
+    ("groupby-high",        lambda: Hist(groupby("id"))),
+    ("profile",             lambda: Hist(bin("x", 100, -5, 5), profile("y"), profile("z"))),
+    ("weighted-filtered",   lambda: Hist(bin("x", 100, -5, 5), weight="w", filter="y > 0")),
+    ("book10",              lambda: book(10)),
+    ("book100",             lambda: book(100)),
+    ("book1000",            lambda: book(1000)),
+    ]
+
+def measure(fillable, arrays, mintime, minrepeat=3):
+    """Fills ``fillable`` with ``arrays`` until at least ``mintime`` seconds and ``minrepeat`` fills have passed; returns the latency of each fill in seconds."""
+    fillable.fill(arrays)   # compiles the fill plan and warms up buffers
+    latencies = []
+    total = 0.0
+    while total < mintime or len(latencies) < minrepeat:
+        starttime = clock()
+        fillable.fill(arrays)
+        latencies.append(clock() - starttime)
+        total += latencies[-1]
+    return latencies
+
+def run(names, chunks, backend, mintime):
+    results = []
+    for name, factory in cases:
+        if len(names) > 0 and not any(name.startswith(x) for x in names):
+            continue
+        for chunk in chunks:
+            fillable = factory()
+            if backend is not None and hasattr(fillable, "backend"):
+                fillable.backend = backend
+            latencies = sorted(measure(fillable, data(chunk), mintime))
+            results.append({"case": name,
+                            "chunk": chunk,
+                            "fills": len(latencies),
+                            "best": latencies[0],
+                            "median": latencies[len(latencies) // 2],
+                            "eventspersec": chunk / latencies[0]})
+            print("{case:20s} {chunk:>9d} events: {eventspersec:14.0f} events/s  best {best:10.6f} s  median {median:10.6f} s  ({fills} fills)".format(**results[-1]))
+            sys.stdout.flush()
+    return results
+
+def commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures histbook fill throughput on synthetic data.")
+    parser.add_argument("cases", nargs="*", help="names (or prefixes) of cases to run: {0}".format(", ".join(x for x, y in cases)))
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 100000], help="number of events per fill (default: 1000 100000)")
+    parser.add_argument("--backend", default=None, help="calculation backend: {0} (default: histbook.fill.defaultbackend)".format(", ".join(backends())))
+    parser.add_argument("--mintime", type=float, default=0.5, help="minimum seconds of timed fills per case and chunk size (default: 0.5)")
+    parser.add_argument("--output", default=None, help="JSON file to write results to")
+    args = parser.parse_args()
+    if args.backend is not None and args.backend not in backends():
+        parser.error("backend must be one of: {0}".format(", ".join(backends())))
+
+    results = run(args.cases, args.chunks, args.backend, args.mintime)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"histbook": histbook.__version__,
+                       "commit": commit(),
+                       "python": platform.python_version(),
+                       "numpy": numpy.__version__,
+                       "platform": platform.platform(),
+                       "backend": args.backend,
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, file, indent=2, sort_keys=True)
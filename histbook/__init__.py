@@ -31,7 +31,19 @@
 from histbook.axis import groupby, groupbin, bin, intbin, split, cut, profile
 from histbook.book import Book, ChannelsBook, SamplesBook, SystematicsBook
 from histbook.hist import Hist
-from histbook.vega import overlay, beside, below, grid
+import sys
+
+if sys.version_info >= (3, 7):
+    # plotting (histbook.vega) is only loaded when one of these is first used
+    def __getattr__(name):
+        if name in ("overlay", "beside", "below", "grid"):
+            import histbook.vega
+            return getattr(histbook.vega, name)
+        raise AttributeError("module {0} has no attribute {1}".format(repr(__name__), repr(name)))
+else:
+    from histbook.vega import overlay, beside, below, grid
+
+__all__ = ["groupby", "groupbin", "bin", "intbin", "split", "cut", "profile", "Book", "ChannelsBook", "SamplesBook", "SystematicsBook", "Hist", "overlay", "beside", "below", "grid"]
 
 # convenient access to the version number
 from histbook.version import __version__
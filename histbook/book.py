@@ -36,9 +36,10 @@ import threading
 
 import numpy
 
-import histbook.calc.spark
+import histbook.calc
 import histbook.fill
 import histbook.hist
+import histbook.instr
 import histbook.util
 
 if sys.version_info[0] <= 2:
@@ -526,15 +527,64 @@ class Book(GenericBook, histbook.fill.Fillable):
     def _changed(self):
         self._fields = None
 
+    def copy(self):
+        """Return an immediate copy of the book of histograms."""
+        out = super(Book, self).copy()
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        return out
+
+    def copyonfill(self):
+        """Return a copy of the book of histograms whose content is copied if filled."""
+        out = super(Book, self).copyonfill()
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        return out
+
+    def cleared(self):
+        """Return a copy with all bins of all histograms set to zero."""
+        out = super(Book, self).cleared()
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        return out
+
+    @property
+    def _hists(self):
+        return list(self.itervalues(recursive=True, onlyhist=True))
+
+    @property
+    def nbytes(self):
+        """Approximate number of bytes used by the content of all histograms (see :py:meth:`Hist.nbytes <histbook.hist.Hist.nbytes>` and ``memoryreport``)."""
+        return sum(x.nbytes for x in self.itervalues(recursive=True, onlyhist=True))
+
+    @property
+    def _histnames(self):
+        return list(self.iterkeys(recursive=True, onlyhist=True))
+
     @property
     def _goals(self):
-        return functools.reduce(set.union, (x._goals for x in self.itervalues(recursive=True, onlyhist=True)))
+        out = set()
+        for x in self.itervalues(recursive=True, onlyhist=True):
+            out.update(x._goals)
+        return out
 
     def _streamline(self, i, instructions):
         self._destination = []
+        lookup = {}
         for i, x in enumerate(self.itervalues(recursive=True, onlyhist=True)):
             self._destination.append(x._destination[0])
-            x._streamline(i, instructions)
+            for goal, js in x._lookup.items():
+                lookup.setdefault(goal, []).extend((i, j) for j in js)
+
+        for instruction in instructions:
+            if isinstance(instruction, histbook.instr.Export):
+                if not hasattr(instruction, "destination"):
+                    instruction.destination = []
+                instruction.destination.extend(lookup.get(instruction.goal, ()))
+
         return instructions
 
     def fill(self, arrays=None, **more):
@@ -554,9 +604,10 @@ class Book(GenericBook, histbook.fill.Fillable):
             more field values
         """
 
-        if histbook.calc.spark.isspark(arrays, more):
+        if histbook.calc.isspark(arrays, more):
             # pyspark.DataFrame
-            threads = [threading.Thread(target=histbook.calc.spark.fillspark(x, arrays)) for x in self.itervalues(recursive=True, onlyhist=True)]
+            from histbook.calc import spark
+            threads = [threading.Thread(target=spark.fillspark(x, arrays)) for x in self.itervalues(recursive=True, onlyhist=True)]
             for x in self.itervalues(recursive=True, onlyhist=True):
                 x._prefill()
             for x in threads:
@@ -581,9 +632,8 @@ class Book(GenericBook, histbook.fill.Fillable):
 
             for x in self.itervalues(recursive=True, onlyhist=True):
                 x._prefill()
-            length = self._fill(arrays)
-            for x in self.itervalues(recursive=True, onlyhist=True):
-                x._postfill(arrays, length)
+            self._fill(arrays)
+            self._reclaim()
 
 ################################################################ for constructing fillable views
 
@@ -28,11 +28,21 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import functools
+import threading
+
 import histbook.expr
 
 import numpy
 INDEXTYPE = numpy.int32
 
+def isspark(arrays, more):
+    """Returns ``True`` if ``arrays`` is a PySpark DataFrame (checked by name, so that neither PySpark nor :py:mod:`histbook.calc.spark` has to be imported)."""
+    out = arrays.__class__.__name__ == "DataFrame" and arrays.__class__.__module__ == "pyspark.sql.dataframe"
+    if out and len(more) > 0:
+        raise TypeError("if arrays is a PySpark DataFrame, keyword arguments are not allowed")
+    return out
+
 library = {}
 
 library["numpy.add"] = numpy.add
@@ -153,6 +163,234 @@ def histbook_groupby(values):
 
 library["histbook.groupby"] = histbook_groupby
 
+class _FactorizerKeys(object):
+    # the keys of one family of types (see Factorizer._family) and the tables that look them up
+    def __init__(self):
+        self.keys = []          # slot -> key
+        self.slots = {}         # code (or object) -> slot
+        self.keyarray = None
+        self.table = None       # (hash table codes, hash table slots, shift, longest probe, lowest code, highest code, direct table or None)
+
+class Factorizer(object):
+    u"""
+    Stateful replacement for ``histbook.groupby`` that keeps a dictionary of the keys it has seen (code \u2192 slot) from one call to the next, so that a fill only looks up its values instead of sorting them.
+
+    Integers, booleans, and strings of up to 8 bytes are their own codes; longer fixed-width strings are hashed to codes and compared with the keys they are assigned to. A string's code doesn't depend on the width of the array it's in, so chunks with different string widths share keys. Codes are looked up in a direct table (if their range is small) or an open-addressing hash table, so a fill costs O(N) and only new keys are added to the dictionary. Python objects are looked up one by one in the dictionary, and other types (such as floating point numbers) are passed to ``numpy.unique``.
+
+    Each family of types (signed integers, unsigned integers, booleans, bytes, unicode, and objects) has its own dictionary, so that equal codes of different types (such as ``b"a"`` and ``u"a"``) are never confused.
+
+    Results are identical to ``histbook_groupby``: the distinct values in this call, sorted, and the index of each value among them.
+    """
+
+    MULTIPLIER = numpy.uint64(0x9e3779b97f4a7c15)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Forgets all keys."""
+        with self._lock:
+            self._families = {}     # family -> _FactorizerKeys; calls in progress keep the ones they started with
+
+    @property
+    def keys(self):
+        """All keys seen since the last ``clear``, in the order they were added (for each family of types)."""
+        return sum([x.keys for n, x in sorted(self._families.items())], [])
+
+    @staticmethod
+    def _family(dtype):
+        if dtype.kind in "iubSU" and dtype.itemsize > 0:
+            return dtype.kind
+        elif dtype.kind == "O":
+            return "O"
+        else:
+            return None
+
+    def __call__(self, values):
+        values = numpy.asarray(values)
+        family = self._family(values.dtype)
+        if len(values) == 0 or family is None:
+            return histbook_groupby(values)
+
+        state = self._families.get(family)
+        if state is None:
+            with self._lock:
+                state = self._families.setdefault(family, _FactorizerKeys())
+
+        if family == "O":
+            slots = self._objectslots(state, values)
+        else:
+            codes, exact = self._codes(values)
+            slots = self._lookup(state, codes, values)
+            if not exact and not numpy.array_equal(state.keyarray[slots], values):
+                return histbook_groupby(values)      # hash collision
+
+        keyarray = state.keyarray
+        present = numpy.flatnonzero(numpy.bincount(slots, minlength=len(keyarray)))
+        uniques = keyarray[present]
+        order = numpy.argsort(uniques, kind="mergesort")
+        remap = numpy.empty(len(keyarray), dtype=INDEXTYPE)
+        remap[present[order]] = numpy.arange(len(present), dtype=INDEXTYPE)
+        return uniques[order].astype(values.dtype), remap[slots]
+
+    def _codes(self, values):
+        if values.dtype.kind == "b":
+            return values.view(numpy.uint8).astype(numpy.int64), True
+        elif values.dtype.kind == "i":
+            return values.astype(numpy.int64), True
+        elif values.dtype.kind == "u":
+            return values.astype(numpy.uint64).view(numpy.int64), True
+
+        if not values.dtype.isnative:
+            values = values.astype(values.dtype.newbyteorder("="))
+        itemsize = values.dtype.itemsize
+        numwords = (itemsize + 7) // 8
+        values = numpy.ascontiguousarray(values)
+        if itemsize % 8 == 0:
+            words = values.view(numpy.uint64).reshape(len(values), numwords)
+        else:
+            words = numpy.zeros((len(values), 8 * numwords), dtype=numpy.uint8)
+            words[:, :itemsize] = values.view(numpy.uint8).reshape(len(values), itemsize)
+            words = words.view(numpy.uint64)
+        if numwords == 1:
+            return words.reshape(-1).view(numpy.int64), True
+
+        # strings that fit in one word are their own codes, as in narrower arrays; others get a linear hash (modulo 2**64)
+        # of their words with odd multipliers that depend only on the word's position, so trailing zeros don't change it
+        codes = numpy.einsum("ij,j->i", words, self._weights(numwords), dtype=numpy.uint64, casting="unsafe")
+        short = ~words[:, 1:].any(axis=1)
+        codes[short] = words[short, 0]
+        return codes.view(numpy.int64), False
+
+    @staticmethod
+    def _weights(numwords):
+        # splitmix64 of each position
+        with numpy.errstate(over="ignore"):
+            z = numpy.arange(1, numwords + 1, dtype=numpy.uint64) * numpy.uint64(0x9e3779b97f4a7c15)
+            z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xbf58476d1ce4e5b9)
+            z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94d049bb133111eb)
+            return (z ^ (z >> numpy.uint64(31))) | numpy.uint64(1)
+
+    def _hash(self, codes, shift):
+        return numpy.right_shift(numpy.multiply(codes.view(numpy.uint64), self.MULTIPLIER), numpy.uint64(shift)).astype(numpy.intp)
+
+    def _lookup(self, state, codes, values):
+        table = state.table
+        if table is None:
+            slots = numpy.full(len(codes), -1, dtype=INDEXTYPE)
+
+        else:
+            tablecodes, tableslots, shift, longest, low, high, direct = table
+            if direct is not None and low <= codes.min() and codes.max() <= high:      # not codes.max() - low, which can overflow
+                slots = direct[codes - low]
+
+            else:
+                position = self._hash(codes, shift)
+                slots = tableslots[position]
+                mismatch = (tablecodes[position] != codes)
+                pending = numpy.flatnonzero(mismatch & (slots >= 0))
+                slots[mismatch] = -1
+
+                mask = len(tableslots) - 1
+                for probe in range(1, longest + 1):
+                    if len(pending) == 0:
+                        break
+                    where = (position[pending] + probe) & mask
+                    occupied = (tableslots[where] >= 0)
+                    hit = occupied & (tablecodes[where] == codes[pending])
+                    slots[pending[hit]] = tableslots[where[hit]]
+                    pending = pending[occupied & ~hit]
+
+        missing = numpy.flatnonzero(slots < 0)
+        if len(missing) > 0:
+            newcodes, first = numpy.unique(codes[missing], return_index=True)
+            self._insert(state, newcodes, values[missing[first]])
+            slots[missing] = self._lookup(state, codes[missing], values[missing])
+        return slots
+
+    def _insert(self, state, codes, values):
+        with self._lock:
+            added = []
+            for code, value in zip(codes.tolist(), values):
+                if code not in state.slots:
+                    state.slots[code] = len(state.keys)
+                    state.keys.append(value)
+                    added.append(code)
+            if len(added) == 0:
+                return
+            state.keyarray = numpy.array(state.keys)
+
+            allcodes = numpy.array(list(state.slots), dtype=numpy.int64)
+            allslots = numpy.array(list(state.slots.values()), dtype=INDEXTYPE)
+
+            # open addressing with linear probing, rebuilt at 1/2 full to be 1/4 full
+            if state.table is None or 2 * len(allcodes) > len(state.table[1]):
+                bits = 2
+                while 2**bits < 4 * len(allcodes):
+                    bits += 1
+                tablecodes = numpy.zeros(2**bits, dtype=numpy.int64)
+                tableslots = numpy.full(2**bits, -1, dtype=INDEXTYPE)
+                shift = 64 - bits
+                longest = self._place(state, tablecodes, tableslots, shift, 0, allcodes.tolist())
+            else:
+                tablecodes, tableslots, shift, longest, low, high, direct = state.table
+                longest = self._place(state, tablecodes, tableslots, shift, longest, added)
+
+            low = allcodes.min()
+            high = allcodes.max()
+            direct = None
+            if -2**62 <= low and high <= 2**62 and high - low < max(2**16, 4 * len(allcodes)):
+                direct = numpy.full(high - low + 1, -1, dtype=INDEXTYPE)
+                direct[allcodes - low] = allslots
+
+            state.table = (tablecodes, tableslots, shift, longest, low, high, direct)
+
+    def _place(self, state, tablecodes, tableslots, shift, longest, codes):
+        mask = len(tableslots) - 1
+        for code, position in zip(codes, self._hash(numpy.array(codes, dtype=numpy.int64), shift).tolist()):
+            probe = 0
+            while tableslots[(position + probe) & mask] >= 0:
+                probe += 1
+            tablecodes[(position + probe) & mask] = code       # code before slot, for lookups in other threads
+            tableslots[(position + probe) & mask] = state.slots[code]
+            longest = max(longest, probe)
+        return longest
+
+    def _objectslots(self, state, values):
+        slots = state.slots
+        out = numpy.empty(len(values), dtype=INDEXTYPE)
+        new = False
+        for i, x in enumerate(values):
+            slot = slots.get(x)
+            if slot is None:
+                with self._lock:
+                    slot = slots.get(x)
+                    if slot is None:
+                        slot = slots[x] = len(state.keys)
+                        state.keys.append(x)
+                new = True
+            out[i] = slot
+
+        if new:
+            with self._lock:
+                keyarray = numpy.empty(len(state.keys), dtype=object)
+                keyarray[:] = state.keys
+                state.keyarray = keyarray
+        return out
+
+# library functions that keep state from one call to the next: each FillPlan makes its own instance
+persistent = {"histbook.groupby": Factorizer}
+
 def histbook_groupbin(nanflow, closedlow):
     def groupbin(values, binwidth, origin):
         if origin == 0:
@@ -201,17 +439,14 @@ library["histbook.groupbin_L"] = histbook_groupbin(False, True)
 library["histbook.groupbin_H"] = histbook_groupbin(False, False)
     
 def histbook_bin(underflow, overflow, nanflow, closedlow):
-    if nanflow:
-        nanindex = (1 if underflow else 0) + (1 if overflow else 0)
-    else:
-        nanindex = numpy.ma.masked
-
     if underflow:
         shift = 1
     else:
         shift = 0
 
     def bin(values, numbins, low, high):
+        trash = shift + numbins + (1 if overflow else 0) + (1 if nanflow else 0)
+
         indexes = values - float(low)
         numpy.multiply(indexes, float(numbins) / float(high - low), indexes)
 
@@ -223,18 +458,18 @@ def histbook_bin(underflow, overflow, nanflow, closedlow):
             numpy.ceil(indexes, indexes)
             numpy.add(indexes, shift - 1, indexes)
 
-        out = numpy.ma.array(indexes, dtype=INDEXTYPE)
         with numpy.errstate(invalid="ignore"):
-            if underflow:
-                numpy.maximum(out, 0, out)
-            else:
-                out[out < 0] = numpy.ma.masked
             if overflow:
-                numpy.minimum(out, shift + numbins, out)
+                numpy.minimum(indexes, shift + numbins, indexes)
             else:
-                out[out >= (numbins + shift)] = numpy.ma.masked
-            out[numpy.isnan(indexes)] = nanindex + numbins
-        return out
+                indexes[indexes >= (numbins + shift)] = trash
+            if underflow:
+                numpy.maximum(indexes, 0, indexes)
+            else:
+                indexes[indexes < 0] = trash
+            indexes[numpy.isnan(indexes)] = (trash - 1) if nanflow else trash
+
+        return indexes.astype(INDEXTYPE)
 
     return bin
 
@@ -262,17 +497,19 @@ def histbook_intbin(underflow, overflow):
         shift = 0
 
     def intbin(values, min, max):
-        indexes = numpy.ma.array((values + (shift - min)), dtype=INDEXTYPE)
+        trash = shift + 1 + max - min + (1 if overflow else 0)
 
-        if underflow:
-            numpy.maximum(indexes, 0, indexes)
-        else:
-            indexes[indexes < 0] = numpy.ma.masked
+        indexes = numpy.array((values + (shift - min)), dtype=INDEXTYPE)
 
         if overflow:
             numpy.minimum(indexes, (shift + 1 + max - min), indexes)
         else:
-            indexes[indexes > (shift + max - min)] = numpy.ma.masked
+            indexes[indexes > (shift + max - min)] = trash
+
+        if underflow:
+            numpy.maximum(indexes, 0, indexes)
+        else:
+            indexes[indexes < 0] = trash
 
         return indexes
 
@@ -285,20 +522,24 @@ library["histbook.intbin__"] = histbook_intbin(False, False)
 
 def histbook_split(underflow, overflow, nanflow, closedlow):
     def split(values, edges):
-        indexes = numpy.ma.array(numpy.digitize(values, edges), dtype=INDEXTYPE)
+        trash = len(edges) - 1 + (1 if underflow else 0) + (1 if overflow else 0) + (1 if nanflow else 0)
+        if not underflow:
+            trash += 1     # until the final shift down by one
+
+        indexes = numpy.array(numpy.digitize(values, edges), dtype=INDEXTYPE)
         if not closedlow:
             indexes[library["numpy.isin"](values, edges)] -= 1
 
         if not overflow:
-            indexes[indexes == len(edges)] = numpy.ma.masked
+            indexes[indexes == len(edges)] = trash
 
         if nanflow:
             indexes[numpy.isnan(values)] = len(edges) + (1 if overflow else 0)
         else:
-            indexes[numpy.isnan(values)] = numpy.ma.masked
+            indexes[numpy.isnan(values)] = trash
 
         if not underflow:
-            indexes[indexes == 0] = numpy.ma.masked
+            indexes[indexes == 0] = trash
             numpy.subtract(indexes, 1, indexes)
 
         return indexes
@@ -322,7 +563,373 @@ library["histbook.split__NH"] = histbook_split(False, False, True, False)
 library["histbook.split___L"] = histbook_split(False, False, False, True)
 library["histbook.split___H"] = histbook_split(False, False, False, False)
 
-library["histbook.cut"] = lambda values: numpy.ma.array(values, dtype=INDEXTYPE)
+library["histbook.cut"] = lambda values: numpy.array(values, dtype=INDEXTYPE)
+
+def groupruns(inverses, numuniques):
+    u"""
+    Sorts entries by their group keys so that each combination of keys is a contiguous run of entries.
+
+    All levels of nested groups are sorted together: the per-level indexes are combined into a single mixed-radix key and sorted once with a stable sort (or ``numpy.lexsort`` if the combined key would not fit in 64 bits). Entries with a negative index at any level are dropped.
+
+    Parameters
+    ----------
+    inverses : list of Numpy arrays of integers
+        for each group level, the index of each entry's key in that level's uniques
+
+    numuniques : list of int
+        for each group level, the number of uniques
+
+    Returns
+    -------
+    order : Numpy array of integers
+        permutation to apply to the per-entry arrays
+
+    starts, stops : Numpy arrays of integers
+        boundaries of the runs in the permuted arrays
+
+    keys : list of Numpy arrays of integers
+        for each group level, the index in that level's uniques of each run
+    """
+    length = len(inverses[0])
+    if length == 0:
+        empty = numpy.empty(0, dtype=numpy.intp)
+        return empty, empty, empty, [empty for x in inverses]
+
+    bad = None
+    for inverse in inverses:
+        if inverse.min() < 0:
+            if bad is None:
+                bad = (inverse < 0)
+            else:
+                numpy.logical_or(bad, inverse < 0, bad)
+
+    numkeys = 1
+    for x in numuniques:
+        numkeys *= max(x, 1)
+
+    if numkeys < 2**62:
+        key = numpy.array(inverses[0], dtype=numpy.int64)
+        for inverse, x in zip(inverses[1:], numuniques[1:]):
+            numpy.multiply(key, x, key)
+            numpy.add(key, inverse, key)
+        if bad is not None:
+            key[bad] = -1
+
+        if numkeys < 2**15:
+            key = key.astype(numpy.int16)      # small integers are radix-sorted
+        elif numkeys < 2**31:
+            key = key.astype(numpy.int32)
+
+        order = numpy.argsort(key, kind="mergesort")
+        key = key[order]
+        if bad is not None:
+            first = numpy.searchsorted(key, 0)
+            order = order[first:]
+            key = key[first:]
+
+        starts = numpy.flatnonzero(key[1:] != key[:-1]) + 1
+        starts = numpy.concatenate(([0] if len(key) > 0 else [], starts)).astype(numpy.intp)
+        stops = numpy.concatenate((starts[1:], [len(key)])).astype(numpy.intp)
+
+        runkey = key[starts].astype(numpy.int64)
+        keys = []
+        for x in numuniques[:0:-1]:
+            keys.insert(0, runkey % x)
+            runkey = runkey // x
+        keys.insert(0, runkey)
+
+    else:
+        order = numpy.lexsort(tuple(inverses[::-1]))
+        if bad is not None:
+            order = order[~bad[order]]
+
+        sortedinverses = [inverse[order] for inverse in inverses]
+        change = functools.reduce(numpy.logical_or, [x[1:] != x[:-1] for x in sortedinverses])
+        starts = numpy.concatenate(([0] if len(order) > 0 else [], numpy.flatnonzero(change) + 1)).astype(numpy.intp)
+        stops = numpy.concatenate((starts[1:], [len(order)])).astype(numpy.intp)
+        keys = [x[starts] for x in sortedinverses]
+
+    return order, starts, stops, keys
+
+SPARSEFILL = 8
+
+def product(shape):
+    """Returns the number of elements in an array of this ``shape`` (like ``numpy.prod``, which takes microseconds on a short tuple: too long to call for every histogram of a large Book on every fill)."""
+    out = 1
+    for x in shape:
+        out *= x
+    return out
+
+def accumulate(content, indexes, length, columns):
+    u"""
+    Adds weighted counts into the last dimension of ``content``, one column at a time.
+
+    Entries are identified by a flattened index into a space that has one more bin at the end of each of the first dimensions of ``content``. Binning functions put excluded entries (no underflow, overflow, or nanflow bin to put them in) in this extra "trash" bin, which is discarded here.
+
+    Each column is computed with ``numpy.bincount`` over the whole flattened index space; the index array is cast once and shared by all columns. ``numpy.add.at`` is only used for sparse fills (many more bins than entries, see ``SPARSEFILL``) and for weights that ``numpy.bincount`` can't handle.
+
+    Parameters
+    ----------
+    content : Numpy array
+        contiguous array whose last dimension holds the columns (sumw, sumw2, profile sums, etc.)
+
+    indexes : ``None`` or Numpy array of integers
+        flattened index of each entry in the first dimensions of ``content``, extended by a trash bin in each dimension; if ``None``, all entries go into the first bin
+
+    length : int
+        number of entries
+
+    columns : list of (int, ``None``, number or Numpy array)
+        column index in the last dimension of ``content`` and the amount to add for each entry: ``None`` counts each entry once, a number weights all entries equally, and an array gives a weight for each entry
+    """
+    if indexes is None:
+        flat = content.reshape((-1, content.shape[-1]))
+        for column, weights in columns:
+            if weights is None:
+                flat[0, column] += length
+            elif isinstance(weights, numpy.ndarray):
+                flat[0, column] += weights.sum()
+            else:
+                flat[0, column] += length * weights
+        return
+
+    shape = content.shape[:-1]
+    trashshape = tuple(x + 1 for x in shape)
+    numbins = product(shape)
+
+    if len(indexes) * SPARSEFILL < numbins:
+        digits = numpy.unravel_index(indexes, trashshape)
+        keep = functools.reduce(numpy.logical_and, [digit < x for digit, x in zip(digits, shape)])
+        indexes = numpy.ravel_multi_index(tuple(digit[keep] for digit in digits), shape)
+        flat = content.reshape((-1, content.shape[-1]))
+        for column, weights in columns:
+            if isinstance(weights, numpy.ndarray):
+                weights = weights[keep]
+            numpy.add.at(flat[:, column], indexes, 1 if weights is None else weights)
+        return
+
+    indexes = numpy.asarray(indexes, dtype=numpy.intp)
+    numtrash = product(trashshape)
+    real = tuple(slice(0, x) for x in shape)
+    counts = None
+    for column, weights in columns:
+        if not isinstance(weights, numpy.ndarray):
+            if counts is None:
+                counts = numpy.bincount(indexes, minlength=numtrash).reshape(trashshape)[real]
+            if weights is None:
+                content[..., column] += counts
+            else:
+                content[..., column] += counts * weights
+
+        elif weights.dtype.kind in ("b", "i", "u", "f") and len(weights.shape) == 1:
+            content[..., column] += numpy.bincount(indexes, weights, minlength=numtrash).reshape(trashshape)[real]
+
+        else:
+            digits = numpy.unravel_index(indexes, trashshape)
+            keep = functools.reduce(numpy.logical_and, [digit < x for digit, x in zip(digits, shape)])
+            numpy.add.at(content.reshape((-1, content.shape[-1]))[:, column], numpy.ravel_multi_index(tuple(digit[keep] for digit in digits), shape), weights[keep])
+
+def _numba():
+    try:
+        import numba
+    except ImportError:
+        return None
+    else:
+        return numba
+
+class Unbinned(object):
+    u"""
+    Values to be binned by one of the binning functions in :py:data:`library` (``histbook.bin``, ``histbook.intbin``, ``histbook.split``, or ``histbook.cut``), exported by a :py:class:`FillPlan <histbook.fill.FillPlan>` with the ``"numba"`` backend in place of their bin indexes, so that binning can be done by :py:func:`fusedkernel` in the same pass as accumulation.
+
+    Parameters
+    ----------
+    values : Numpy array
+        values to bin
+
+    fcn : str
+        name of the binning function in :py:data:`library`
+
+    args : tuple
+        the binning function's constant arguments (after ``values``)
+    """
+
+    def __init__(self, values, fcn, args):
+        self.values = values
+        self.fcn = fcn
+        self.args = args
+        self._indexes = None
+
+    def indexes(self):
+        """Returns the bin indexes, as calculated by the binning function (only once)."""
+        if self._indexes is None:
+            self._indexes = library[self.fcn](self.values, *self.args)
+        return self._indexes
+
+    def binning(self):
+        """Returns the binning for :py:func:`fusedkernel` and its arguments (after ``values``), or ``None`` if the kernel wouldn't reproduce the binning function exactly for this type of values."""
+        values = self.values
+        if not isinstance(values, numpy.ndarray) or len(values.shape) != 1:
+            return None
+
+        if self.fcn.startswith("histbook.bin"):
+            flags = self.fcn[len("histbook.bin"):]
+            if values.dtype.kind in ("i", "u") or values.dtype == numpy.dtype(numpy.float64):     # narrower floats are binned in their own precision
+                numbins, low, high = self.args
+                return ("bin", flags[0] == "U", flags[1] == "O", flags[2] == "N", flags[3] == "L"), [numbins, float(low), float(numbins) / float(high - low)]
+
+        elif self.fcn.startswith("histbook.intbin"):
+            flags = self.fcn[len("histbook.intbin"):]
+            if values.dtype.kind == "i":
+                min, max = self.args
+                return ("intbin", flags[0] == "U", flags[1] == "O"), [(1 if flags[0] == "U" else 0) - min, max - min]
+
+        elif self.fcn.startswith("histbook.split"):
+            flags = self.fcn[len("histbook.split"):]
+            if values.dtype.kind in ("i", "u", "f"):
+                edges, = self.args
+                return ("split", flags[0] == "U", flags[1] == "O", flags[2] == "N", flags[3] == "L"), [numpy.array(edges, dtype=numpy.float64)]
+
+        elif self.fcn == "histbook.cut":
+            if values.dtype.kind == "b":
+                return ("cut",), []
+
+        return None
+
+# binning functions whose calls can be left to the histograms as Unbinned values
+binning = set(n for n in library if n.startswith(("histbook.bin", "histbook.intbin", "histbook.split")) or n == "histbook.cut")
+
+_fusedkernels = {}
+
+def fusedkernel(binnings, numprofiles, weighting):
+    u"""
+    Returns a Numba-compiled function that bins and accumulates entries in a single pass, or ``None`` if Numba is not installed.
+
+    The function takes ``(content, length, ..., sumx, sumx2..., weight, weight2, sumwcolumn, sumw2column, sumwxcolumn, sumwx2column...)``, where ``content`` is the two-dimensional (bins \u2192 columns) view of a histogram's content and each axis contributes ``totbins, stride, values`` followed by the arguments of its binning. For each entry, it computes the bin index of each axis from the raw ``values`` (with the same underflow, overflow, nanflow, and closedlow rules as the binning functions in :py:data:`library`), skips entries that fall in no bin, flattens the indexes with the ``strides``, and adds the weights and profile sums to all columns without making any intermediate arrays. Kernels are generated for and cached by signature.
+
+    Parameters
+    ----------
+    binnings : tuple of tuples
+        for each (fixed) axis, ``("index",)`` for values that are already bin indexes (excluded entries have index ``totbins``), ``("bin", underflow, overflow, nanflow, closedlow)`` with arguments ``numbins, low, scale``, ``("intbin", underflow, overflow)`` with arguments ``offset, span``, ``("split", underflow, overflow, nanflow, closedlow)`` with argument ``edges``, or ``("cut",)`` with no arguments (see :py:meth:`Unbinned.binning <histbook.calc.Unbinned.binning>`)
+
+    numprofiles : int
+        number of profile axes
+
+    weighting : 0, 1, or 2
+        ``0`` for unweighted (no sumw2 column), ``1`` for a constant weight, and ``2`` for a weight array, in which NaN weights are treated as zero
+    """
+    key = (tuple(binnings), numprofiles, weighting)
+    if key not in _fusedkernels:
+        numba = _numba()
+        if numba is None:
+            _fusedkernels[key] = None
+
+        else:
+            args = ["content", "length"]
+            body = []
+            for k, binning in enumerate(binnings):
+                args.extend(["totbins{0}".format(k), "stride{0}".format(k), "values{0}".format(k)])
+                if binning[0] == "index":
+                    body.append("j{0} = values{0}[i]".format(k))
+                    body.append("if j{0} >= totbins{0}:".format(k))
+                    body.append("    continue")
+
+                elif binning[0] == "bin":
+                    underflow, overflow, nanflow, closedlow = binning[1:]
+                    shift = 1 if underflow else 0
+                    args.extend(["numbins{0}".format(k), "low{0}".format(k), "scale{0}".format(k)])
+                    body.append("x = (values{0}[i] - low{0}) * scale{0}".format(k))
+                    if closedlow:
+                        body.append("x = numpy.floor(x) + {0}".format(shift))
+                    else:
+                        body.append("x = numpy.ceil(x) + {0}".format(shift - 1))
+                    body.append("if x != x:")
+                    body.append("    j{0} = numbins{0} + {1}".format(k, shift + (1 if overflow else 0)) if nanflow else "    continue")
+                    body.append("elif x >= numbins{0} + {1}:".format(k, shift))
+                    body.append("    j{0} = numbins{0} + {1}".format(k, shift) if overflow else "    continue")
+                    body.append("elif x < 0:")
+                    body.append("    j{0} = 0".format(k) if underflow else "    continue")
+                    body.append("else:")
+                    body.append("    j{0} = int(x)".format(k))
+
+                elif binning[0] == "intbin":
+                    underflow, overflow = binning[1:]
+                    shift = 1 if underflow else 0
+                    args.extend(["offset{0}".format(k), "span{0}".format(k)])
+                    body.append("j{0} = numpy.int32(values{0}[i] + offset{0})".format(k))      # wraps around like the binning function's cast
+                    body.append("if j{0} > span{0} + {1}:".format(k, shift))
+                    body.append("    j{0} = span{0} + {1}".format(k, shift + 1) if overflow else "    continue")
+                    body.append("elif j{0} < 0:".format(k))
+                    body.append("    j{0} = 0".format(k) if underflow else "    continue")
+
+                elif binning[0] == "split":
+                    underflow, overflow, nanflow, closedlow = binning[1:]
+                    args.append("edges{0}".format(k))
+                    body.append("x = values{0}[i]".format(k))
+                    body.append("if x != x:")
+                    body.append("    j{0} = len(edges{0}) + {1}".format(k, (1 if overflow else 0) - (0 if underflow else 1)) if nanflow else "    continue")
+                    body.append("else:")
+                    body.append("    lo = 0")                                   # number of edges <= x, like numpy.digitize
+                    body.append("    hi = len(edges{0})".format(k))
+                    body.append("    while lo < hi:")
+                    body.append("        mid = (lo + hi) // 2")
+                    body.append("        if edges{0}[mid] <= x:".format(k))
+                    body.append("            lo = mid + 1")
+                    body.append("        else:")
+                    body.append("            hi = mid")
+                    body.append("    j{0} = lo".format(k))
+                    if not closedlow:
+                        body.append("    if j{0} > 0 and edges{0}[j{0} - 1] == x:".format(k))
+                        body.append("        j{0} -= 1".format(k))
+                    if not overflow:
+                        body.append("    if j{0} == len(edges{0}):".format(k))
+                        body.append("        continue")
+                    if not underflow:
+                        body.append("    if j{0} == 0:".format(k))
+                        body.append("        continue")
+                        body.append("    j{0} -= 1".format(k))
+
+                elif binning[0] == "cut":
+                    body.append("j{0} = 1 if values{0}[i] else 0".format(k))
+
+                else:
+                    raise AssertionError(binning)
+
+            for k in range(numprofiles):
+                args.extend(["sumx{0}".format(k), "sumx2{0}".format(k)])
+            args.extend(["weight", "weight2", "sumw", "sumw2"])
+            for k in range(numprofiles):
+                args.extend(["sumwx{0}".format(k), "sumwx2{0}".format(k)])
+
+            body.append("flat = {0}".format(" + ".join("j{0} * stride{0}".format(k) for k in range(len(binnings))) if len(binnings) > 0 else "0"))
+
+            if weighting == 0:
+                body.append("content[flat, sumw] += 1.0")
+                for k in range(numprofiles):
+                    body.append("content[flat, sumwx{0}] += sumx{0}[i]".format(k))
+                    body.append("content[flat, sumwx2{0}] += sumx2{0}[i]".format(k))
+
+            else:
+                if weighting == 1:
+                    body.append("w = weight")
+                    body.append("w2 = weight2")
+                else:
+                    body.append("w = weight[i]")
+                    body.append("w2 = weight2[i]")
+                    body.append("if w != w:")
+                    body.append("    w = 0.0")
+                    body.append("    w2 = 0.0")
+                body.append("content[flat, sumw] += w")
+                body.append("content[flat, sumw2] += w2")
+                for k in range(numprofiles):
+                    body.append("content[flat, sumwx{0}] += sumx{0}[i] * w".format(k))
+                    body.append("content[flat, sumwx2{0}] += sumx2{0}[i] * w".format(k))
+
+            source = "def fill({0}):\n    for i in range(length):\n{1}\n".format(", ".join(args), "\n".join("        " + x for x in body))
+            namespace = {"numpy": numpy}
+            exec(source, namespace)
+            _fusedkernels[key] = numba.njit(nogil=True)(namespace["fill"])
+
+    return _fusedkernels[key]
 
 def calculate(expr, symbols):
     u"""
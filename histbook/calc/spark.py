@@ -33,15 +33,12 @@ import math
 import numpy
 
 import histbook.axis
+import histbook.calc
 import histbook.instr
 import histbook.expr
 import histbook.hist
 
-def isspark(arrays, more):
-    out = arrays.__class__.__name__ == "DataFrame" and arrays.__class__.__module__ == "pyspark.sql.dataframe"
-    if out and len(more) > 0:
-        raise TypeError("if arrays is a PySpark DataFrame, keyword arguments are not allowed")
-    return out
+isspark = histbook.calc.isspark
 
 def tocolumns(df, expr):
     import pyspark.sql.functions as fcns
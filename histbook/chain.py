@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2018, DIANA-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from __future__ import absolute_import
+
+import histbook.axis
+
+class PlottingChain(object):
+    """Mix-in for :py:class:`Hist <histbook.hist.Hist>` (as the first in a plotting chain) and :py:class:`Channels <histbook.vega.Channel>` in a plotting chain."""
+
+    def __init__(self, source, item):
+        if isinstance(source, PlottingChain):
+            self._source = source._source
+            self._chain = source._chain + (item,)
+        else:
+            self._source = source
+            self._chain = (item,)
+
+    def __repr__(self):
+        return "".join(repr(x) for x in (self._source,) + self._chain)
+
+    def __str__(self, indent="\n     ", paren=True):
+        return ("(" if paren else "") + indent.join(repr(x) for x in (self._source,) + self._chain) + (")" if paren else "")
+
+    def _singleaxis(self, axis):
+        if axis is None:
+            if len(self._source._group + self._source._fixed) == 1:
+                axis, = self._source._group + self._source._fixed
+            else:
+                raise TypeError("histogram has more than one axis; one must be specified for plotting")
+        return axis
+
+    def _asaxis(self, axis):
+        if axis is None:
+            return None
+        elif isinstance(axis, histbook.axis.Axis):
+            return axis
+        else:
+            return self._source.axis[axis]
+
+    def overlay(self, axis):
+        """
+        Display bins in ``axis`` overlaid on each other in different colors.
+
+        Parameters
+        ----------
+        axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay
+
+        Returns
+        -------
+        :py:class:`PlottingChain <histbook.vega.PlottingChain>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.OverlayChannel) for x in self._chain):
+            raise TypeError("cannot overlay an overlay")
+        return PlottingChain(self, histbook.vega.OverlayChannel(self._asaxis(axis)))
+
+    def stack(self, axis, order=None):
+        """
+        Display bins in ``axis`` stacked on one another in an area plot.
+
+        Parameters
+        ----------
+        axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay
+
+        order : iterable of strings
+            stacking order of bins
+
+        Returns
+        -------
+        :py:class:`PlottingChain <histbook.vega.PlottingChain>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.StackChannel) for x in self._chain):
+            raise TypeError("cannot stack a stack")
+        return PlottingChain(self, histbook.vega.StackChannel(self._asaxis(axis), order))
+
+    def beside(self, axis):
+        """
+        Display bins in ``axis`` next to each other horizontally.
+
+        Parameters
+        ----------
+        axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay
+
+        Returns
+        -------
+        :py:class:`PlottingChain <histbook.vega.PlottingChain>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.BesideChannel) for x in self._chain):
+            raise TypeError("cannot split plots beside each other that are already split with beside (can do beside and below)")
+        return PlottingChain(self, histbook.vega.BesideChannel(self._asaxis(axis)))
+
+    def below(self, axis):
+        """
+        Display bins in ``axis`` next to each other vertically.
+
+        Parameters
+        ----------
+        axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay
+
+        Returns
+        -------
+        :py:class:`PlottingChain <histbook.vega.PlottingChain>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.BelowChannel) for x in self._chain):
+            raise TypeError("cannot split plots below each other that are already split with below (can do beside and below)")
+        return PlottingChain(self, histbook.vega.BelowChannel(self._asaxis(axis)))
+
+    def bar(self, axis=None, profile=None, error=False, normalized=False, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None, shapescale=None):
+        """
+        Display bins in ``axis`` (if not the only axis) as bars on the horizontal axis.
+
+        Parameters
+        ----------
+        axis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay; if ``None`` *(default)*, use the only axis in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        error : bool
+            if ``True``, overlay error bars
+
+        normalized : bool
+            if ``True``, normalize the histogram
+
+        width, height, title, config, xscale, yscale, colorscale, shapescale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable1d <histbook.vega.Plotable1d>`
+        """
+        import histbook.vega
+        if error and any(isinstance(x, (histbook.vega.BesideChannel, histbook.vega.BelowChannel)) for x in self._chain):
+            raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
+        return histbook.vega.Plotable1d(self, histbook.vega.BarChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, normalized, width, height, title, config, xscale, yscale, colorscale, shapescale))
+
+    def step(self, axis=None, profile=None, error=False, normalized=False, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None, shapescale=None):
+        """
+        Display bins in ``axis`` (if not the only axis) as steps on the horizontal axis.
+
+        Parameters
+        ----------
+        axis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay; if ``None`` *(default)*, use the only axis in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        error : bool
+            if ``True``, overlay error bars
+
+        normalized : bool
+            if ``True``, normalize the histogram
+
+        width, height, title, config, xscale, yscale, colorscale, shapescale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable1d <histbook.vega.Plotable1d>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.StackChannel) for x in self._chain):
+            raise TypeError("only area and bar can be stacked")
+        if error and any(isinstance(x, (histbook.vega.BesideChannel, histbook.vega.BelowChannel)) for x in self._chain):
+            raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
+        return histbook.vega.Plotable1d(self, histbook.vega.StepChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, normalized, width, height, title, config, xscale, yscale, colorscale, shapescale))
+
+    def area(self, axis=None, profile=None, error=False, normalized=False, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None, shapescale=None):
+        """
+        Display bins in ``axis`` (if not the only axis) as areas on the horizontal axis.
+
+        Parameters
+        ----------
+        axis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay; if ``None`` *(default)*, use the only axis in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        error : bool
+            if ``True``, overlay error bars
+
+        normalized : bool
+            if ``True``, normalize the histogram
+
+        width, height, title, config, xscale, yscale, colorscale, shapescale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable1d <histbook.vega.Plotable1d>`
+        """
+        import histbook.vega
+        if error and any(isinstance(x, (histbook.vega.BesideChannel, histbook.vega.BelowChannel)) for x in self._chain):
+            raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
+        return histbook.vega.Plotable1d(self, histbook.vega.AreaChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, normalized, width, height, title, config, xscale, yscale, colorscale, shapescale))
+
+    def line(self, axis=None, profile=None, error=False, normalized=False, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None, shapescale=None):
+        """
+        Display bins in ``axis`` (if not the only axis) as lines on the horizontal axis.
+
+        Parameters
+        ----------
+        axis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay; if ``None`` *(default)*, use the only axis in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        error : bool
+            if ``True``, overlay error bars
+
+        normalized : bool
+            if ``True``, normalize the histogram
+
+        width, height, title, config, xscale, yscale, colorscale, shapescale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable1d <histbook.vega.Plotable1d>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.StackChannel) for x in self._chain):
+            raise TypeError("only area and bar can be stacked")
+        if error and any(isinstance(x, (histbook.vega.BesideChannel, histbook.vega.BelowChannel)) for x in self._chain):
+            raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
+        return histbook.vega.Plotable1d(self, histbook.vega.LineChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, normalized, width, height, title, config, xscale, yscale, colorscale, shapescale))
+
+    def marker(self, axis=None, profile=None, error=True, normalized=False, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None, shapescale=None):
+        """
+        Display bins in ``axis`` (if not the only axis) as markers on the horizontal axis.
+
+        Parameters
+        ----------
+        axis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the axis to overlay; if ``None`` *(default)*, use the only axis in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        error : bool
+            if ``True``, overlay error bars
+
+        normalized : bool
+            if ``True``, normalize the histogram
+
+        width, height, title, config, xscale, yscale, colorscale, shapescale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable1d <histbook.vega.Plotable1d>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.StackChannel) for x in self._chain):
+            raise TypeError("only area and bar can be stacked")
+        if error and any(isinstance(x, (histbook.vega.BesideChannel, histbook.vega.BelowChannel)) for x in self._chain):
+            raise NotImplementedError("error bars are currently incompatible with splitting beside or below")
+        return histbook.vega.Plotable1d(self, histbook.vega.MarkerChannel(self._asaxis(self._singleaxis(axis)), self._asaxis(profile), error, normalized, width, height, title, config, xscale, yscale, colorscale, shapescale))
+
+    def heatmap(self, xaxis=None, yaxis=None, profile=None, width=None, height=None, title=None, config=None, xscale=None, yscale=None, colorscale=None):
+        """
+        Display bins in ``xaxis`` and ``yaxis`` (if not the only two axes) as a heatmap.
+
+        Parameters
+        ----------
+        xaxis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the horizontal axis to overlay; if ``None`` *(default)*, use the first of the only two axes in this :py:class:`Hist <histbook.hist.Hist>`
+
+        yaxis : ``None``, :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            the vertical axis to overlay; if ``None`` *(default)*, use the second of the only two axes in this :py:class:`Hist <histbook.hist.Hist>`
+
+        profile : ``None``, :py:class:`profile <histbook.axis.profile>`, algebraic expression (lambda or string) or index position (integer)
+            if ``None`` *(default)*, display bin counts; otherwise, display profile means (and errors on the mean)
+
+        width, height, title, config, xscale, yscale, colorscale : ``None`` or JSON
+            graphical directives to pass to Vega-Lite
+
+        Returns
+        -------
+        :py:class:`Plotable2d <histbook.vega.Plotable2d>`
+        """
+        import histbook.vega
+        if any(isinstance(x, histbook.vega.OverlayChannel) for x in self._chain):
+            raise TypeError("two dimensional plots can't be overlaid")
+        if any(isinstance(x, histbook.vega.StackChannel) for x in self._chain):
+            raise TypeError("two dimensional plots can't be stacked")
+
+        if xaxis is None and yaxis is None:
+            if len(self._source._group + self._source._fixed) == 2:
+                xaxis, yaxis = self._source._group + self._source._fixed
+            else:
+                raise TypeError("histogram doesn't have exactly two axes; an x and y must be specified for plotting")
+        elif xaxis is None or yaxis is None:
+            raise TypeError("xaxis and yaxis must both be None or neither be None")
+
+        return histbook.vega.Plotable2d(self, histbook.vega.HeatmapChannel(self._asaxis(xaxis), self._asaxis(yaxis), self._asaxis(profile), width, height, title, config, xscale, yscale, colorscale))
@@ -33,7 +33,9 @@ import functools
 import itertools
 import math
 import sys
+import threading
 import types
+import weakref
 try:
     import cPickle as pickle
 except ImportError:
@@ -41,17 +43,113 @@ except ImportError:
 
 import numpy
 
-import histbook.util.astunparse
+import histbook.util
 
 class ExpressionError(Exception): pass
 
-class Expr(object):
-    """A symbolic expression, constructed from a lambda or string using :py:meth:`Expr.parse <histbook.expr.Expr.parse>`."""
+def _unparse(node):
+    import histbook.util.astunparse    # only needed for error messages
+    return histbook.util.astunparse.tostring(node).strip()
+
+def _internkey(args):
+    # subexpressions are already interned (and kept alive by the expression that holds them), so they're identified by id;
+    # constants are identified by type and value, so that Const(1), Const(1.0), and Const(True) remain distinct objects,
+    # and floats also by their sign, so that Const(-0.0) and Const(0.0) do too (they're equal, but 1/x differs)
+    return tuple([id(x) if isinstance(x, Expr) else _internkey(x) if isinstance(x, tuple) else (type(x), frozenset(x)) if isinstance(x, (set, frozenset)) else (type(x), x, math.copysign(1.0, x)) if isinstance(x, (float, numpy.floating)) else (type(x), x) for x in args])
+
+class _Interned(type):
+    """Metaclass for :py:class:`Expr <histbook.expr.Expr>`: constructing an expression that is identical to a live one (same classes, same constant types and values) returns the existing object, whose hash is computed only once."""
+
+    table = weakref.WeakValueDictionary()
+    lock = threading.Lock()
+
+    def __call__(cls, *args, **kwds):
+        out = type.__call__(cls, *args, **kwds)
+        initargs = out._initargs()
+        key = (cls, _internkey(initargs))
+        try:
+            existing = _Interned.table.get(key, None)
+        except TypeError:
+            object.__setattr__(out, "_hash", None)     # unhashable constant: not interned, and hash(out) raises TypeError
+            return out
+        if existing is not None:
+            return existing
+
+        object.__setattr__(out, "_hash", hash((cls.__name__,) + tuple(frozenset(x) if isinstance(x, set) else x for x in initargs)))
+        with _Interned.lock:
+            return _Interned.table.setdefault(key, out)
+
+_ExprBase = _Interned("_ExprBase", (object,), {"__slots__": ()})
+
+class ParseCache(histbook.util.LRUCache):
+    """
+    Cache of :py:meth:`Expr.parse <histbook.expr.Expr.parse>` results, keyed by expression string and ``defs`` (see :py:class:`LRUCache <histbook.util.LRUCache>`).
+
+    The cache used by ``Expr.parse`` is ``histbook.expr.parsecache``; its ``hits`` and ``misses`` count lookups since the last ``clear``, and setting ``maxsize`` to ``0`` disables it.
+    """
+
+    def __init__(self, maxsize=1024):
+        super(ParseCache, self).__init__(maxsize)
+
+    @staticmethod
+    def key(expression, defs):
+        """Returns a hashable key for ``expression`` and ``defs`` (as passed to ``Expr.parse``) or ``None`` if they can't be cached."""
+        if not isinstance(expression, histbook.util.string):
+            return None
+        if defs is None:
+            return (expression, ())
+
+        frozen = []
+        for n, x in sorted(defs.items(), key=lambda pair: pair[0]):
+            if isinstance(x, (Expr, histbook.util.string)):
+                frozen.append((n, x))
+            else:
+                try:
+                    frozen.append((n, (type(x), pickle.dumps(x))))
+                except:
+                    return None
+        out = (expression, tuple(frozen))
+        try:
+            hash(out)
+        except TypeError:
+            return None
+        return out
+
+class Expr(_ExprBase):
+    """
+    A symbolic expression, constructed from a lambda or string using :py:meth:`Expr.parse <histbook.expr.Expr.parse>`.
+
+    Expressions are immutable and hash-consed: structurally identical expressions are the same object, so equality checks usually stop at an identity test and hashes are computed once, when the expression is built.
+    """
+
+    __slots__ = ("_hash", "__weakref__")
 
     def __repr__(self):
         return "{0}({1})".format(self.__class__.__name__, ", ".join(self._reprargs()))
 
-    # assumes __eq__ and __lt__ have been defined
+    def __setattr__(self, name, value):
+        if hasattr(self, "_hash"):
+            raise AttributeError("{0} objects are immutable".format(self.__class__.__name__))
+        object.__setattr__(self, name, value)    # still in __init__
+
+    def __hash__(self):
+        if self._hash is None:
+            raise TypeError("unhashable constant in {0}".format(repr(self)))
+        return self._hash
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Expr) and self._hash == other._hash and self.__class__.__name__ == other.__class__.__name__ and self._initargs() == other._initargs())
+
+    def __reduce__(self):
+        return (self.__class__, self._initargs())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # assumes __lt__ and _initargs (constructor arguments) have been defined
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -85,7 +183,21 @@ class Expr(object):
 
         defs : ``None`` or dict
             if not ``None``, provides names to recognize in ``expression`` (to avoid repetitive code)
+
+        Results for string expressions are cached in ``histbook.expr.parsecache`` (see :py:class:`ParseCache <histbook.expr.ParseCache>`), so parsing the same expression with the same ``defs`` again returns the same (immutable) object.
         """
+        key = ParseCache.key(expression, defs)
+        if key is None or parsecache.maxsize <= 0:
+            return Expr._parse(expression, defs)
+
+        out = parsecache.get(key)
+        if out is None:
+            out = Expr._parse(expression, defs)
+            parsecache.put(key, out)
+        return out
+
+    @staticmethod
+    def _parse(expression, defs):
         _defs = {}
         if defs is not None:
             for n, x in defs.items():
@@ -121,7 +233,7 @@ class Expr(object):
             elif isinstance(node, ast.Name):
                 return env.get(node.id, None)
             else:
-                raise ExpressionError("functions must be named, not constructed: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                raise ExpressionError("functions must be named, not constructed: {0}".format(_unparse(node)))
 
         def recurse(node, relations=False):
             if isinstance(node, ast.Num):
@@ -138,7 +250,7 @@ class Expr(object):
                 if all(isinstance(x, Const) for x in content):
                     return Const(set(x.value for x in content))
                 else:
-                    raise ExpressionError("sets in expressions may not contain variable contents: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                    raise ExpressionError("sets in expressions may not contain variable contents: {0}".format(_unparse(node)))
 
             elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
                 if node.id == "None":
@@ -172,7 +284,7 @@ class Expr(object):
                 elif isinstance(node.ops[0], ast.In):    cmp, swap = "in",     False
                 elif isinstance(node.ops[0], ast.NotIn): cmp, swap = "not in", False
                 else:
-                    raise ExpressionError("only comparision relations supported: '==', '!=', '<', '<=', '>', '>=', 'in', and 'not in': {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                    raise ExpressionError("only comparision relations supported: '==', '!=', '<', '<=', '>', '>=', 'in', and 'not in': {0}".format(_unparse(node)))
                 
                 left = recurse(node.left)
                 right = recurse(node.comparators[0])
@@ -182,7 +294,7 @@ class Expr(object):
                     left, right = sorted([left, right])
 
                 if (cmp == "in" or cmp == "not in") and not (isinstance(right, Const) and isinstance(right.value, set)):
-                    raise ExpressionError("comparisons 'in' and 'not in' can only be used with a set: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                    raise ExpressionError("comparisons 'in' and 'not in' can only be used with a set: {0}".format(_unparse(node)))
 
                 return Relation(cmp, left, right)
 
@@ -190,7 +302,7 @@ class Expr(object):
                 return recurse(ast.BoolOp(ast.And(), [ast.Compare(node.left if i == 0 else node.comparators[i - 1], [node.ops[i]], [node.comparators[i]]) for i in range(len(node.ops))]), relations=True)
 
             elif isinstance(node, ast.Compare):
-                raise ExpressionError("comparison operators are only allowed at the top of an expression: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                raise ExpressionError("comparison operators are only allowed at the top of an expression: {0}".format(_unparse(node)))
 
             elif relations and isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
                 content = recurse(node.operand, relations=True)
@@ -206,7 +318,7 @@ class Expr(object):
                 return functools.reduce(LogicalOr.combine, [Logical.normalform(recurse(x, relations=True)) for x in node.values]).simplify()
 
             elif isinstance(node, ast.BoolOp):
-                raise ExpressionError("logical operators are only allowed at the top of an expression: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                raise ExpressionError("logical operators are only allowed at the top of an expression: {0}".format(_unparse(node)))
                 
             elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
                 content = recurse(node.operand)
@@ -226,7 +338,7 @@ class Expr(object):
                     return BitAnd.negate(content).simplify()
 
             elif isinstance(node, ast.UnaryOp):
-                raise ExpressionError("only unary operators supported: 'not', '-', '+', and '~': {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                raise ExpressionError("only unary operators supported: 'not', '-', '+', and '~': {0}".format(_unparse(node)))
 
             elif isinstance(node, ast.BinOp):
                 if   isinstance(node.op, ast.Add):      fcn = "+"
@@ -240,7 +352,7 @@ class Expr(object):
                 elif isinstance(node.op, ast.BitAnd):   fcn = "&"
                 elif isinstance(node.op, ast.BitXor):   op, fcn = "^",  "xor"
                 else:
-                    raise ExpressionError("only binary operators supported: '+', '-', '*', '/', '//', '%', '**', '|', '&', and '^': {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                    raise ExpressionError("only binary operators supported: '+', '-', '*', '/', '//', '%', '**', '|', '&', and '^': {0}".format(_unparse(node)))
 
                 left = recurse(node.left)
                 right = recurse(node.right)
@@ -264,7 +376,7 @@ class Expr(object):
                         negation = TimesDiv.negate(right.pos[0])
                     elif right.const == PlusMinus.identity and len(right.pos) == 0 and len(right.neg) == 1:
                         negation = TimesDiv.negate(right.neg[0])
-                        negation.const = PlusMinus.negateval(negation.const)
+                        negation = TimesDiv(PlusMinus.negateval(negation.const), negation.pos, negation.neg)
                     else:
                         negation = TimesDiv.negate(right)   # additive terms in the denominator
 
@@ -316,12 +428,12 @@ class Expr(object):
                             break
                     
                 if fcn is None:
-                    raise ExpressionError("unhandled function in expression: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                    raise ExpressionError("unhandled function in expression: {0}".format(_unparse(node)))
 
                 return Call(fcn, *(recurse(x, relations=(i == 0 and fcn == "where")) for i, x in enumerate(node.args)))
 
             else:
-                ExpressionError("unhandled syntax in expression: {0}".format(histbook.util.astunparse.tostring(node).strip()))
+                ExpressionError("unhandled syntax in expression: {0}".format(_unparse(node)))
 
         return recurse(pyast, relations=True)
         
@@ -332,6 +444,8 @@ class Expr(object):
 
     recognized = {abs: "abs", max: "max", min: "min"}
 
+parsecache = ParseCache()
+
 class _Placeholder(object):
     count = 0
     def __init__(self):
@@ -485,25 +599,20 @@ _recognize(numpy, "where", "where")
 class Const(Expr):
     """Represents a literal constant in the expression tree, such as a number, boolean, or ``None``."""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def _initargs(self):
+        return (self.value,)
+
     def _reprargs(self):
         return (repr(self.value),)
 
     def __str__(self):
         return str(self.value)
 
-    def __hash__(self):
-        if isinstance(self.value, set):
-            value = (set, tuple(sorted(self.value)))
-        else:
-            value = self.value
-        return hash((Const, value))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             if type(self.value).__name__ == type(other.value).__name__:
@@ -519,21 +628,20 @@ class Const(Expr):
 class Name(Expr):
     """Represents a named variable in the expression tree."""
 
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
+    def _initargs(self):
+        return (self.value,)
+
     def _reprargs(self):
         return (repr(self.value),)
 
     def __str__(self):
         return self.value
 
-    def __hash__(self):
-        return hash((Name, self.value))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return self.value < other.value
@@ -547,10 +655,15 @@ class Name(Expr):
 class BroadcastConst(Name):
     """Represents a literal constant in the expression tree that should be broadcast to the length of field data."""
 
+    __slots__ = ("name",)
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
 
+    def _initargs(self):
+        return (self.name, self.value)
+
     def _reprargs(self):
         return (repr(self.name), repr(self.value))
 
@@ -560,16 +673,6 @@ class BroadcastConst(Name):
         else:
             return self.name
 
-    def __hash__(self):
-        if isinstance(self.value, set):
-            value = (set, tuple(sorted(self.value)))
-        else:
-            value = self.value
-        return hash((Const, self.name, value))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.name == other.name and self.value == other.value
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             if type(self.name).__name__ == type(other.name).__name__:
@@ -592,22 +695,21 @@ class BroadcastConst(Name):
 class Call(Expr):
     """Represents a function call in the expression tree."""
 
+    __slots__ = ("fcn", "args")
+
     def __init__(self, fcn, *args):
         self.fcn = fcn
         self.args = args
 
+    def _initargs(self):
+        return (self.fcn,) + self.args
+
     def _reprargs(self):
         return (repr(self.fcn),) + tuple(repr(x) for x in self.args)
 
     def __str__(self):
         return "{0}({1})".format(self.fcn, ", ".join(str(x) for x in self.args))
 
-    def __hash__(self):
-        return hash((Call, self.fcn, self.args))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.fcn == other.fcn and self.args == other.args
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return (self.fcn, self.args) < (other.fcn, other.args)
@@ -623,30 +725,34 @@ class Call(Expr):
 class BinOp(Call):
     """Represents a binary operation in the expression tree, such as ``%`` or ``**``."""
 
+    __slots__ = ("op",)
+
     def __init__(self, fcn, left, right, op):
         super(BinOp, self).__init__(fcn, left, right)
         self.op = op
 
+    def _initargs(self):
+        return (self.fcn,) + self.args + (self.op,)
+
     def __str__(self):
         return (" " + self.op + " ").join(("(" + str(x) + ")") if isinstance(x, BinOp) else str(x) for x in self.args)
 
 class RingAlgebra(Expr):
     """Abstract class for ring algebras, such as addition and multiplication."""
 
+    __slots__ = ("const", "pos", "neg")
+
     def __init__(self, const, pos, neg):
         self.const = const
         self.pos = pos
         self.neg = neg
 
+    def _initargs(self):
+        return (self.const, self.pos, self.neg)
+
     def _reprargs(self):
         return (repr(self.const), repr(self.pos), repr(self.neg))
 
-    def __hash__(self):
-        return hash((self.__class__, self.const, self.pos, self.neg))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.const == other.const and self.pos == other.pos and self.neg == other.neg
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return (self.const, self.pos, self.neg) < (other.const, other.pos, other.neg)
@@ -686,6 +792,8 @@ class RingAlgebra(Expr):
 class RingAlgebraMultLike(RingAlgebra):
     """Abstract class for the multiplication-like part of a ring algebra."""
 
+    __slots__ = ()
+
     @classmethod
     def normalform(op, arg):
         if isinstance(arg, op):
@@ -701,6 +809,8 @@ class RingAlgebraMultLike(RingAlgebra):
 class RingAlgebraAddLike(RingAlgebra):
     """Abstract class for the addition-like part of a ring algebra."""
 
+    __slots__ = ()
+
     @classmethod
     def normalform(op, arg):
         if isinstance(arg, op):
@@ -737,9 +847,9 @@ class RingAlgebraAddLike(RingAlgebra):
             elif len(x.pos) == len(x.neg) == 0:
                 const = op.calcval(const, x.const)
             else:
-                for y in terms:
+                for i, y in enumerate(terms):
                     if x.similar(y):
-                        y.const = op.calcval(x.const, y.const)
+                        terms[i] = op.subop(op.calcval(x.const, y.const), y.pos, y.neg)
                         break
                 else:
                     terms.append(x)
@@ -751,9 +861,9 @@ class RingAlgebraAddLike(RingAlgebra):
             elif len(x.pos) == len(x.neg) == 0:
                 const = op.calcval(const, op.negateval(x.const))
             else:
-                for y in terms:
+                for i, y in enumerate(terms):
                     if x.similar(y):
-                        y.const = op.calcval(op.negateval(x.const), y.const)
+                        terms[i] = op.subop(op.calcval(op.negateval(x.const), y.const), y.pos, y.neg)
                         break
                 else:
                     terms.append(op.subop(op.negateval(x.const), x.pos, x.neg))
@@ -763,8 +873,7 @@ class RingAlgebraAddLike(RingAlgebra):
             if x.const == op.identity:
                 pass
             elif op.isnegval(x.const):
-                x.const = op.negateval(x.const)
-                negterms.append(x)
+                negterms.append(op.subop(op.negateval(x.const), x.pos, x.neg))
             else:
                 posterms.append(x)
 
@@ -813,6 +922,8 @@ class RingAlgebraAddLike(RingAlgebra):
 class RingAlgebraBinOp(object):
     """Abstract class for a binary operation in a ring algebra (for pretty printing)."""
 
+    __slots__ = ()
+
     def __str__(self):
         out = []
         if self.const != self.identity or len(self.pos) == 0:
@@ -829,6 +940,8 @@ class RingAlgebraBinOp(object):
 class TimesDiv(RingAlgebraBinOp, RingAlgebraMultLike):
     """Represents multiplication and division in a ring algebra (actually, a whole field because it includes division)."""
 
+    __slots__ = ()
+
     posop = "*"
     negop = "/"
 
@@ -846,6 +959,8 @@ class TimesDiv(RingAlgebraBinOp, RingAlgebraMultLike):
 class PlusMinus(RingAlgebraBinOp, RingAlgebraAddLike):
     """Represents addition and subtraction in a ring algebra (actually, a whole field because it includes division)."""
 
+    __slots__ = ()
+
     posop = " + "
     negop = " - "
 
@@ -899,20 +1014,19 @@ class PlusMinus(RingAlgebraBinOp, RingAlgebraAddLike):
 class Logical(object):
     """Mix-in for logical operations."""
 
+    __slots__ = ()
+
     commutative = True
 
     def __init__(self, *args):
         self.args = tuple(sorted(set(args)))
 
+    def _initargs(self):
+        return self.args
+
     def _reprargs(self):
         return tuple(repr(x) for x in self.args)
 
-    def __hash__(self):
-        return hash((self.__class__, self.args))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.args == other.args
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return self.args < other.args
@@ -949,6 +1063,8 @@ class Logical(object):
 class LogicalAnd(Logical, RingAlgebraMultLike):
     """Represents logical and in a ring algebra."""
 
+    __slots__ = ("args",)
+
     @classmethod
     def combine(op, left, right):
         left, right = op.normalform(left), op.normalform(right)
@@ -967,6 +1083,8 @@ class LogicalAnd(Logical, RingAlgebraMultLike):
 class LogicalOr(Logical, RingAlgebraAddLike):
     """Represents logical or in a ring algebra."""
 
+    __slots__ = ("args",)
+
     @classmethod
     def combine(op, left, right):
         left, right = op.normalform(left), op.normalform(right)
@@ -985,23 +1103,22 @@ class LogicalOr(Logical, RingAlgebraAddLike):
 class Relation(Expr):
     """Represents a logical relation in the expression tree, such as ``==`` and ``in``."""
 
+    __slots__ = ("cmp", "left", "right")
+
     def __init__(self, cmp, left, right):
         self.cmp = cmp
         self.left = left
         self.right = right
 
+    def _initargs(self):
+        return (self.cmp, self.left, self.right)
+
     def _reprargs(self):
         return (repr(self.cmp), repr(self.left), repr(self.right))
 
     def __str__(self):
         return "{0} {1} {2}".format(str(self.left), self.cmp, str(self.right))
 
-    def __hash__(self):
-        return hash((Relation, self.cmp, self.left, self.right))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.cmp == other.cmp and self.left == other.left and self.right == other.right
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return (self.cmp, self.left, self.right) < (other.cmp, other.left, other.right)
@@ -1027,10 +1144,15 @@ class Relation(Expr):
 class Predicate(Expr):
     """Represents a logical predicate (name identified as boolean) in the expression tree."""
 
+    __slots__ = ("value", "positive")
+
     def __init__(self, value, positive=True):
         self.value = value
         self.positive = positive
 
+    def _initargs(self):
+        return (self.value, self.positive)
+
     def _reprargs(self):
         return (repr(self.value), repr(self.positive))
 
@@ -1040,12 +1162,6 @@ class Predicate(Expr):
         else:
             return "not " + self.value
 
-    def __hash__(self):
-        return hash((Predicate, self.value, self.positive))
-
-    def __eq__(self, other):
-        return self.__class__.__name__ == other.__class__.__name__ and self.value == other.value and self.positive == other.positive
-
     def __lt__(self, other):
         if self.__class__.__name__ == other.__class__.__name__:
             return (self.value, self.positive) < (other.value, other.positive)
@@ -28,6 +28,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import numbers
+import threading
+import time
+
 import numpy
 
 import histbook.calc
@@ -35,32 +39,1534 @@ import histbook.expr
 import histbook.instr
 import histbook.util
 
+def _full(length, value):
+    if isinstance(value, (histbook.util.string, bytes)):
+        value = numpy.array(value)
+    if isinstance(value, numpy.ndarray) and value.shape == () and (value.dtype.kind == "U" or value.dtype.kind == "S"):
+        out = numpy.empty(length, dtype=value.dtype)
+        out[:] = value
+        return out
+    else:
+        return numpy.full(length, value)
+
+def _broadcast(length, value):
+    if getattr(numpy, "broadcast_to", None) is None:
+        return _full(length, value)
+    else:
+        return numpy.broadcast_to(numpy.array(value), (length,))
+
+def _select(arrays, fields):
+    if arrays.__class__.__name__ == "DataFrame" and arrays.__class__.__module__ == "pandas.core.frame":
+        arrays = dict((n, arrays[n].values) for n in arrays.columns if n in fields)
+    out = {}
+    length = None
+    for n in fields:
+        try:
+            array = arrays[n]
+        except KeyError:
+            continue
+        if not isinstance(array, numpy.ndarray):
+            array = numpy.array(array)
+        if length is None and array.shape != ():
+            length = array.shape[0]
+        out[n] = array
+    return out, (1 if length is None else length)
+
+def _normalize(arrays, more, method):
+    if arrays.__class__.__name__ == "DataFrame" and arrays.__class__.__module__ == "pyspark.sql.dataframe":
+        raise TypeError("{0} does not take PySpark DataFrames; use fill".format(method))
+    if arrays is None:
+        return more
+    elif len(more) == 0:
+        return arrays
+    elif arrays.__class__.__name__ == "DataFrame" and arrays.__class__.__module__ == "pandas.core.frame":
+        raise TypeError("if arrays is a Pandas DataFrame, keyword arguments are not allowed")
+    else:
+        return histbook.util.ChainedDict(arrays, more)
+
+def _view(arrays, start, stop):
+    return dict((n, x if x.shape == () else x[start:stop]) for n, x in arrays.items())
+
+def _ranges(length, num):
+    num = max(1, min(num, length))
+    return [(length * i // num, length * (i + 1) // num) for i in range(num)]
+
+_ALIGNMENT = 64
+
+def _layout(arrays):
+    out = []
+    offset = 0
+    for n, x in arrays:
+        out.append((n, offset, x.dtype.str, x.shape))
+        offset += -(-x.nbytes // _ALIGNMENT) * _ALIGNMENT
+    return out, max(offset, 1)
+
+def _attach(buffer, layout):
+    return dict((n, numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=buffer, offset=offset)) for n, offset, dtype, shape in layout)
+
+_processfillable = None
+
+_clock = getattr(time, "perf_counter", time.time)
+
+def _sharedmemory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return None         # before Python 3.8
+    return shared_memory
+
+def _initprocess(fillable):
+    global _processfillable
+    _processfillable = fillable
+    fillable.fields
+
+def _fillprocess(task):
+    inputname, inputlayout, objects, start, stop, slabname, slablayout, profiling = task
+    fillable = _processfillable
+    hists = fillable._hists
+    names = fillable._histnames
+    profile = FillProfile() if profiling else None
+
+    def run(inputbuffer, slabbuffer):
+        arrays = dict(objects)
+        arrays.update(_view(_attach(inputbuffer, inputlayout), start, stop))
+        slabs = _attach(slabbuffer, slablayout)
+        destination = [[None] * len(x) for x in fillable._destination]
+        out = [None] * len(hists)
+        def accumulate(i, rows):
+            x, dest = hists[i], destination[i]
+            starttime = _clock()
+            if i in slabs:
+                content = slabs[i]
+                content.fill(0)
+                x._accumulate(content, dest, rows, fillable._plan.backend)
+            else:
+                content = x._newcontent()
+                x._accumulate(content, dest, rows, fillable._plan.backend)
+                out[i] = (content, [uniques for uniques, inverse in dest[:len(x._group)]])
+            if profile is not None:
+                profile.record("postfill", names[i], _clock() - starttime, 0)
+
+        fillable._runplan(arrays, destination, accumulate, profile=profile)
+        return out, profile
+
+    if inputname is None:
+        return run(None, None)
+
+    shared_memory = _sharedmemory()
+    inputmemory = shared_memory.SharedMemory(name=inputname)
+    slabmemory = shared_memory.SharedMemory(name=slabname)
+    try:
+        return run(inputmemory.buf, slabmemory.buf)
+    finally:
+        inputmemory.close()
+        slabmemory.close()
+
+def _postfillbytes(hists, names, before):
+    # postfill bytes are the growth of each histogram's content, counted once after the fill (and after merging
+    # the workers' content in fillparallel/fillprocesses), not for each chunk; zero calls so that merging adds only bytes
+    out = FillProfile()
+    for i, x in enumerate(hists):
+        out.entries["postfill", names[i]] = [0, 0.0, x.nbytes - before[i]]
+    return out
+
+defaultbackend = "numpy"
+
+def _numexpr():
+    try:
+        import numexpr
+    except ImportError:
+        return None
+    else:
+        return numexpr
+
+_NUMEXPR_OPERATORS = {"numpy.add": "+", "numpy.subtract": "-", "numpy.multiply": "*", "numpy.true_divide": "/", "numpy.equal": "==", "numpy.not_equal": "!=", "numpy.less": "<", "numpy.less_equal": "<=", "numpy.logical_and": "&", "numpy.logical_or": "|"}
+
+_NUMEXPR_FUNCTIONS = {"numpy.logical_not": "~", "abs": "abs", "fabs": "abs", "arccos": "arccos", "arccosh": "arccosh", "arcsin": "arcsin", "arcsinh": "arcsinh", "arctan2": "arctan2", "arctan": "arctan", "arctanh": "arctanh", "cos": "cos", "cosh": "cosh", "exp": "exp", "expm1": "expm1", "log10": "log10", "log1p": "log1p", "log": "log", "sin": "sin", "sinh": "sinh", "sqrt": "sqrt", "tan": "tan", "tanh": "tanh", "where": "where"}
+
+_NUMEXPR_BOOLEANARGS = {"numpy.logical_and": (0, 1), "numpy.logical_or": (0, 1), "numpy.logical_not": (0,), "where": (0,)}
+
+_NUMEXPR_BOOLEANS = set(["numpy.equal", "numpy.not_equal", "numpy.less", "numpy.less_equal", "numpy.logical_and", "numpy.logical_or", "numpy.logical_not"])
+
+_NUMEXPR_TYPES = set([numpy.dtype(numpy.bool_), numpy.dtype(numpy.int32), numpy.dtype(numpy.int64), numpy.dtype(numpy.float64)])
+
+def _numexprconst(value):
+    if isinstance(value, (bool, numpy.bool_)):
+        return repr(bool(value))
+    elif isinstance(value, (numbers.Integral, numpy.integer)):
+        return repr(int(value))
+    elif isinstance(value, (numbers.Real, numpy.floating)) and numpy.isfinite(value):
+        return repr(float(value))
+    else:
+        return None
+
+class _NumExprCall(object):
+    def __init__(self, numexpr, string, numargs, booleans, fallback):
+        self.numexpr = numexpr
+        self.string = string
+        self.names = ["a{0}".format(i) for i in range(numargs)]
+        self.booleans = booleans
+        self.fallback = fallback
+
+    def __call__(self, *args):
+        for i, x in enumerate(args):
+            if not isinstance(x, numpy.ndarray) or x.dtype not in _NUMEXPR_TYPES or (i in self.booleans and x.dtype != numpy.bool_):
+                break
+        else:
+            try:
+                return self.numexpr.evaluate(self.string, local_dict=dict(zip(self.names, args)), truediv=True)
+            except (TypeError, ValueError, KeyError, NotImplementedError):
+                pass
+        return FillPlan._call(self.fallback[0], self.fallback[1], self.fallback[2], self.fallback[3], args)
+
+_SHORTCIRCUIT = set(["numpy.logical_and", "numpy.logical_or", "where"])
+
+class _LazyCall(object):
+    def __init__(self, fcn, condition, deferred):
+        self.fcn = fcn                  # "numpy.logical_and", "numpy.logical_or", or "where"
+        self.condition = condition      # term evaluated on all rows
+        self.deferred = deferred        # (term, leaf argument indexes, cost) for the other operand of logical_and/logical_or, or each branch of where
+
+    @staticmethod
+    def _evaluate(term, args):
+        kind, value = term
+        if kind == 0:
+            return args[value]
+        elif kind == 1:
+            return value
+        else:
+            return FillPlan._call(value[0], value[1], value[2], value[3], args)
+
+    def __call__(self, *args):
+        fcn = histbook.calc.library[self.fcn]
+        condition = self._evaluate(self.condition, args)
+        if not isinstance(condition, numpy.ndarray) or len(condition.shape) != 1 or len(condition) == 0:
+            return fcn(condition, *[self._evaluate(term, args) for term, leaves, cost in self.deferred])
+
+        length = len(condition)
+        mask = condition if condition.dtype == numpy.bool_ else condition.astype(numpy.bool_)
+        if self.fcn == "numpy.logical_and":
+            selections = [mask]
+        elif self.fcn == "numpy.logical_or":
+            selections = [numpy.logical_not(mask)]
+        else:
+            selections = [mask, numpy.logical_not(mask)]
+
+        # finding the selected rows costs about one pass; gathering each leaf and scattering the result back cost
+        # about two passes over the selected rows, and the operand itself is only calculated on the selected rows
+        values = []
+        indexes = []
+        for (term, leaves, cost), selection in zip(self.deferred, selections):
+            fraction = numpy.count_nonzero(selection) / float(length)
+            if 1 + (2 * (len(leaves) + 1) + cost) * fraction < cost:
+                index = numpy.flatnonzero(selection)
+                subargs = list(args)
+                for i in leaves:
+                    if isinstance(args[i], numpy.ndarray) and args[i].shape == (length,):
+                        subargs[i] = args[i].take(index)
+                values.append(self._evaluate(term, subargs))
+                indexes.append(index)
+            else:
+                values.append(self._evaluate(term, args))
+                indexes.append(None)
+
+        if all(index is None for index in indexes):
+            return fcn(condition, *values)
+
+        elif self.fcn == "where":
+            out = numpy.empty(length, dtype=numpy.result_type(*values))
+            for value, index, selection in zip(values, indexes, selections):
+                if index is None:
+                    index = selection
+                    if isinstance(value, numpy.ndarray) and value.shape == (length,):
+                        value = value[selection]
+                out[index] = value
+            return out
+
+        else:
+            out = numpy.array(mask) if self.fcn == "numpy.logical_or" else numpy.zeros(length, dtype=numpy.bool_)
+            out[indexes[0]] = values[0]
+            return out
+
+class BufferPool(object):
+    """
+    Temporary arrays kept from one fill to the next, keyed by (slot, dtype, length), so that repeated fills of equal-sized chunks reuse the same memory instead of reallocating it.
+
+    Arrays that a :py:class:`FillPlan <histbook.fill.FillPlan>` owns and no longer needs at the end of a run are given to the pool; exported arrays are lent out and given back by ``reclaim`` once the histograms have been filled. The pool never holds more than ``maxbytes``: arrays of other lengths are evicted first, and arrays that still don't fit are dropped.
+    """
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self._buffers = {}
+        self._lent = []
+        self.nbytes = 0
+
+    def take(self, slot, dtype, length):
+        """Returns a pooled array for ``slot``, ``dtype``, and ``length`` (removing it from the pool) or ``None``."""
+        out = self._buffers.pop((slot, dtype, length), None)
+        if out is not None:
+            self.nbytes -= out.nbytes
+        return out
+
+    def give(self, slot, array):
+        """Puts ``array``, which is no longer referenced anywhere else, into the pool for ``slot``."""
+        key = (slot, array.dtype, len(array))
+        if key in self._buffers:
+            return
+
+        if self.nbytes + array.nbytes > self.maxbytes:
+            for other in [x for x in self._buffers if x[2] != key[2]]:
+                self.nbytes -= self._buffers.pop(other).nbytes
+                if self.nbytes + array.nbytes <= self.maxbytes:
+                    break
+
+        if self.nbytes + array.nbytes <= self.maxbytes:
+            self._buffers[key] = array
+            self.nbytes += array.nbytes
+
+    def lend(self, slot, array):
+        """Notes that ``array`` has been exported and can be given back to the pool for ``slot`` by ``reclaim``."""
+        self._lent.append((slot, array))
+
+    def reclaim(self):
+        """Gives all lent arrays back to the pool (after their consumers are done with them)."""
+        for slot, array in self._lent:
+            self.give(slot, array)
+        self._lent = []
+
+    def clear(self):
+        """Releases all arrays."""
+        self._buffers = {}
+        self._lent = []
+        self.nbytes = 0
+
+class FillProfile(object):
+    """
+    Wall time, number of calls, and bytes allocated during fills, accumulated for each :py:class:`Param <histbook.instr.Param>`, :py:class:`Assign <histbook.instr.Assign>`, and :py:class:`Export <histbook.instr.Export>` instruction (keyed by the expression it calculates) and for each histogram's accumulation step (``"postfill"``, keyed by the histogram's path in a :py:class:`Book <histbook.book.Book>`, or ``""`` for a lone histogram).
+
+    Bytes are the sizes of new arrays produced by an instruction (not views, reused buffers, or inputs that needed no conversion) and the growth in a histogram's content. Profiles from different fills, threads, or processes can be combined with ``merge`` or ``+``.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def record(self, kind, name, seconds, nbytes):
+        """Adds one call of ``kind`` (``"Param"``, ``"Assign"``, ``"Export"``, or ``"postfill"``) for ``name``, taking ``seconds`` and allocating ``nbytes``."""
+        entry = self.entries.get((kind, name))
+        if entry is None:
+            self.entries[kind, name] = [1, seconds, nbytes]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+
+    def merge(self, other):
+        """Adds the entries of ``other`` (:py:class:`FillProfile <histbook.fill.FillProfile>`) into this profile (changing it in-place and returning it)."""
+        for key, (calls, seconds, nbytes) in other.entries.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [calls, seconds, nbytes]
+            else:
+                entry[0] += calls
+                entry[1] += seconds
+                entry[2] += nbytes
+        return self
+
+    def __add__(self, other):
+        return FillProfile().merge(self).merge(other)
+
+    def __radd__(self, other):
+        if isinstance(other, numbers.Integral) and other == 0:   # so that sum(profiles) works
+            return FillProfile().merge(self)
+        return NotImplemented
+
+    def clear(self):
+        """Removes all entries."""
+        self.entries = {}
+
+    @property
+    def seconds(self):
+        """Total wall time recorded."""
+        return sum(x[1] for x in self.entries.values())
+
+    def report(self, sortby="seconds"):
+        """Returns a list of dicts with ``"kind"``, ``"name"``, ``"calls"``, ``"seconds"``, and ``"bytes"`` for each entry, sorted by ``sortby`` (largest first)."""
+        if sortby not in ("calls", "seconds", "bytes"):
+            raise ValueError("sortby must be one of 'calls', 'seconds', 'bytes'")
+        out = [{"kind": kind, "name": name, "calls": calls, "seconds": seconds, "bytes": nbytes} for (kind, name), (calls, seconds, nbytes) in self.entries.items()]
+        out.sort(key=lambda x: (-x[sortby], x["kind"], x["name"]))
+        return out
+
+    def __repr__(self):
+        return "<FillProfile with {0} entries, {1:.6f} s>".format(len(self.entries), self.seconds)
+
+    def __str__(self, top=20):
+        out = ["{0:>10s} {1:>7s} {2:>12s}  {3:8s} {4}".format("seconds", "calls", "bytes", "kind", "name")]
+        for x in self.report()[:top]:
+            out.append("{seconds:10.6f} {calls:7d} {bytes:12d}  {kind:8s} {name}".format(**x))
+        return "\n".join(out)
+
+class FillPlan(object):
+    """
+    Instructions (:py:class:`Instruction <histbook.instr.Instruction>`) compiled into flat steps that can be run on many sets of arrays.
+
+    Functions are resolved in :py:data:`histbook.calc.library`, constants are bound into argument lists, and variable names are replaced by integer slots, so that running a plan involves no expression tree walking or instruction type dispatch.
+
+    With the ``"numexpr"`` backend, chains of elementwise operations whose intermediate results are used only once are fused into single `NumExpr <http://numexpr.readthedocs.io/en/latest/user_guide.html>`__ expressions, which avoids a full-length temporary array for each operation. Anything NumExpr can't do (functions it lacks, unsupported types) is done by the functions in :py:data:`histbook.calc.library`, as in the ``"numpy"`` backend. If NumExpr is not installed, the ``"numexpr"`` backend is the same as ``"numpy"``.
+
+    The ``"numba"`` backend calculates like ``"numpy"``, but histograms whose axes are all :py:class:`bin <histbook.axis.bin>`, :py:class:`intbin <histbook.axis.intbin>`, :py:class:`split <histbook.axis.split>`, or :py:class:`cut <histbook.axis.cut>` (plus any :py:class:`profiles <histbook.axis.profile>`) are filled by a Numba-compiled loop that bins, flattens bin indexes, applies weights and adds to content in a single pass (see :py:func:`histbook.calc.fusedkernel`). Binning calls whose results are only exported are not run by the plan: their arguments are exported as :py:class:`Unbinned <histbook.calc.Unbinned>` values instead of bin index arrays, and histograms that can't be filled by the fused loop bin them with the same functions as in ``"numpy"``. If Numba is not installed, it is the same as ``"numpy"``.
+    """
+
+    backends = ("numpy", "numexpr", "numba")
+
+    PARAM = 0
+    BROADCAST = 1
+    ASSIGN = 2
+    EXPORT = 3
+    DELETE = 4
+    UFUNC = 5
+
+    def __init__(self, instructions, backend="numpy", inplace=True, shortcircuit=True, numrows=None):
+        """Compiles an ordered sequence of ``instructions`` whose :py:class:`Exports <histbook.instr.Export>` have been given a ``destination`` by ``_streamline``, using ``backend`` (one of ``FillPlan.backends``); if ``inplace``, ufuncs write into dead intermediate arrays (see ``_recycle``); if ``shortcircuit``, expensive operands of ``and``, ``or``, and ``where`` are only calculated where they can change the result (see ``_shortcircuit``); if ``numrows`` is not ``None``, only the first ``numrows`` destination rows are histograms: later rows (such as ``PushdownPlan``'s filters) are read after ``run`` returns, so they are never reported as ready and arrays exported into them are not reused within the run."""
+        if backend not in self.backends:
+            raise ValueError("backend must be one of {0}".format(", ".join(repr(x) for x in self.backends)))
+        self.backend = backend
+
+        lazy = set()
+        if shortcircuit:
+            instructions, lazy = self._shortcircuit(instructions)
+
+        if backend == "numba" and histbook.calc._numba() is not None:
+            instructions = self._deferbinning(instructions)
+
+        numexpr = None
+        if backend == "numexpr":
+            numexpr = _numexpr()
+            if numexpr is not None:
+                instructions = self._fuse(instructions)
+
+        slots = {}
+        def slot(name):
+            if name not in slots:
+                slots[name] = len(slots)
+            return slots[name]
+
+        self._externals = []
+        self._steps = []
+        for instruction in instructions:
+            if isinstance(instruction, histbook.instr.Param):
+                if isinstance(instruction.extern, histbook.expr.BroadcastConst):
+                    self._steps.append((self.BROADCAST, slot(instruction.name), instruction.extern.value))
+                else:
+                    step = (self.PARAM, slot(instruction.name), instruction.extern.value, repr(str(instruction.extern)))
+                    self._externals.append(step)
+                    self._steps.append(step)
+
+            elif isinstance(instruction, histbook.instr.Assign):
+                if instruction.name in lazy:
+                    self._steps.append((self.ASSIGN, slot(instruction.name)) + self._compilelazy(instruction.expr, slot))
+                elif numexpr is not None and any(isinstance(x, histbook.expr.Call) for x in instruction.expr.args):
+                    self._steps.append((self.ASSIGN, slot(instruction.name)) + self._compilenumexpr(numexpr, instruction.expr, slot))
+                else:
+                    self._steps.append((self.ASSIGN, slot(instruction.name)) + self._compile(instruction.expr, slot))
+
+            elif isinstance(instruction, histbook.instr.Export):
+                self._steps.append((self.EXPORT, slot(instruction.name), tuple(getattr(instruction, "destination", ())), False, getattr(instruction, "binning", None)))
+
+            elif isinstance(instruction, histbook.instr.Delete):
+                self._steps.append((self.DELETE, slot(instruction.name), False))
+
+            else:
+                raise AssertionError(instruction)
+
+        self._numslots = len(slots)
+        if inplace:
+            self._recycle()
+        self._schedulerows(numrows)
+
+        self._instructions = instructions
+        self._labels = None
+
+    def _makelabels(self):
+        # profile keys for each step, in terms of the full expressions (not plan-specific variable names), so that profiles of independently compiled plans can be merged
+        exprs = {}
+        def original(expr):
+            if isinstance(expr, histbook.expr.Call):
+                return histbook.expr.Call(expr.fcn, *(original(x) for x in expr.args))
+            elif isinstance(expr, (histbook.expr.Name, histbook.expr.Predicate)) and expr.value in exprs:
+                return exprs[expr.value]
+            else:
+                return expr
+
+        labels = []
+        for instruction in self._instructions:
+            if isinstance(instruction, histbook.instr.Param):
+                exprs[instruction.name] = instruction.extern
+                labels.append(("Param", str(instruction.extern)))
+            elif isinstance(instruction, histbook.instr.Assign):
+                exprs[instruction.name] = original(instruction.expr)
+                labels.append(("Assign", str(exprs[instruction.name])))
+            elif isinstance(instruction, histbook.instr.Export):
+                labels.append(("Export", str(instruction.goal)))
+            else:
+                labels.append(None)
+
+        self._labels = labels     # only complete lists are visible to other threads running this plan
+
+    def _recycle(self):
+        # Arrays made by ufuncs belong to the plan; if they are not exported, they can be overwritten once they're
+        # dead. A ufunc writes into an argument that it is the last user of (if the dtype matches), into any array
+        # of the right dtype that has been deleted earlier in the same run, or into an array from the BufferPool.
+        # Exported ufunc results are lent to the BufferPool until the histograms are filled.
+        exported = set(step[1] for step in self._steps if step[0] == self.EXPORT)
+        owned = set()
+        for i, step in enumerate(self._steps):
+            if step[0] == self.ASSIGN and isinstance(step[2], numpy.ufunc) and step[2].nout == 1 and len(step[5]) == 0:
+                self._steps[i] = (self.UFUNC, step[1], step[2], step[3], step[4], (), {})
+                owned.add(step[1])
+        recyclable = owned.difference(exported)
+
+        lastuse = {}
+        for i, step in enumerate(self._steps):
+            if step[0] in (self.ASSIGN, self.UFUNC):
+                for j, x in step[4]:
+                    lastuse[x] = i
+
+        for i, step in enumerate(self._steps):
+            if step[0] == self.UFUNC:
+                dead = []
+                for j, x in step[4]:
+                    if x in recyclable and lastuse[x] == i and x not in dead:
+                        dead.append(x)
+                self._steps[i] = step[:5] + (tuple(dead), step[6])
+            elif step[0] == self.DELETE and step[1] in recyclable:
+                self._steps[i] = (self.DELETE, step[1], True)
+            elif step[0] == self.EXPORT and step[1] in owned:
+                self._steps[i] = step[:3] + (True,) + step[4:]
+
+    def _schedulerows(self, numrows):
+        # A destination row (one histogram) is complete after the last Export into it, and can be filled right
+        # away if ``run`` is given a ``ready`` callback. An exported array that the plan owns is dead once its
+        # name has been deleted and all of the rows it was exported into have been filled: it can then be reused
+        # within the same run, rather than being lent to the BufferPool until the end. Rows from ``numrows`` on
+        # are only read after the run, so arrays exported into them are always lent.
+        lastexport = {}
+        deleted = {}
+        for index, step in enumerate(self._steps):
+            if step[0] == self.EXPORT:
+                for i, j in step[2]:
+                    lastexport[i] = index
+            elif step[0] == self.DELETE:
+                deleted[step[1]] = index
+
+        self._rowsready = {}
+        for i, index in lastexport.items():
+            if numrows is None or i < numrows:
+                self._rowsready.setdefault(index, []).append(i)
+
+        self._release = {}
+        for step in self._steps:
+            if step[0] == self.EXPORT and step[3] and step[1] in deleted and len(step[2]) > 0 and (numrows is None or all(i < numrows for i, j in step[2])):
+                index = max([deleted[step[1]]] + [lastexport[i] for i, j in step[2]])
+                self._release.setdefault(index, []).append(step[1])
+        self._releasable = set(sum(self._release.values(), []))
+
+    @staticmethod
+    def _compile(expr, slot):
+        if not isinstance(expr, histbook.expr.Call) or expr.fcn not in histbook.calc.library:
+            raise AssertionError(repr(expr))
+
+        template = []
+        slotargs = []
+        callargs = []
+        for i, arg in enumerate(expr.args):
+            if isinstance(arg, histbook.expr.BroadcastConst):
+                template.append(None)
+                slotargs.append((i, slot(arg.name)))
+            elif isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                template.append(None)
+                slotargs.append((i, slot(arg.value)))
+            elif isinstance(arg, histbook.expr.Const):
+                template.append(arg.value)
+            else:
+                template.append(None)
+                callargs.append((i, FillPlan._compile(arg, slot)))
+
+        if expr.fcn in histbook.calc.persistent:
+            fcn = histbook.calc.persistent[expr.fcn]()
+        else:
+            fcn = histbook.calc.library[expr.fcn]
+        return fcn, tuple(template), tuple(slotargs), tuple(callargs)
+
+    @staticmethod
+    def _deferbinning(instructions):
+        # binning calls whose results are only exported are replaced by exports of their arguments (at the call's
+        # position, while the arguments are still alive), marked with the binning function for histbook.calc.Unbinned
+        exports = {}
+        used = set()
+        for x in instructions:
+            if isinstance(x, histbook.instr.Export):
+                exports.setdefault(x.name, []).append(x)
+            elif isinstance(x, histbook.instr.Assign):
+                FillPlan._leaves(x.expr, used)
+
+        def deferrable(x):
+            return isinstance(x, histbook.instr.Assign) and x.name in exports and x.name not in used and x.expr.fcn in histbook.calc.binning and \
+                   isinstance(x.expr.args[0], (histbook.expr.Name, histbook.expr.Predicate)) and not isinstance(x.expr.args[0], histbook.expr.BroadcastConst) and \
+                   all(isinstance(arg, histbook.expr.Const) for arg in x.expr.args[1:])
+
+        out = []
+        deferred = set()
+        for x in instructions:
+            if deferrable(x):
+                for export in exports[x.name]:
+                    y = histbook.instr.Export(x.expr.args[0].value, export.goal)
+                    y.destination = list(getattr(export, "destination", ()))
+                    y.binning = (x.expr.fcn, tuple(arg.value for arg in x.expr.args[1:]))
+                    out.append(y)
+                deferred.add(x.name)
+
+            elif isinstance(x, (histbook.instr.Export, histbook.instr.Delete)) and x.name in deferred:
+                pass
+
+            else:
+                out.append(x)
+
+        return out
+
+    @staticmethod
+    def _fusible(expr):
+        if expr.fcn not in _NUMEXPR_OPERATORS and expr.fcn not in _NUMEXPR_FUNCTIONS:
+            return False
+        for arg in expr.args:
+            if isinstance(arg, histbook.expr.Call) or (isinstance(arg, histbook.expr.Const) and _numexprconst(arg.value) is None):
+                return False
+        return True
+
+    @staticmethod
+    def _leaves(expr, out):
+        for x in expr.args:
+            if isinstance(x, histbook.expr.Call):
+                FillPlan._leaves(x, out)
+            elif isinstance(x, (histbook.expr.Name, histbook.expr.Predicate)):
+                out.add(x.value)
+        return out
+
+    @staticmethod
+    def _fuse(instructions):
+        assigns = dict((x.name, x) for x in instructions if isinstance(x, histbook.instr.Assign))
+        exported = set(x.name for x in instructions if isinstance(x, histbook.instr.Export))
+
+        consumers = {}
+        nested = set()      # used inside an expression that has already been inlined (by _shortcircuit)
+        for x in assigns.values():
+            for i, arg in enumerate(x.expr.args):
+                if isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                    consumers.setdefault(arg.value, []).append((x, i))
+                elif isinstance(arg, histbook.expr.Call):
+                    FillPlan._leaves(arg, nested)
+
+        inline = set()
+        for name, x in assigns.items():
+            if name not in exported and name not in nested and len(consumers.get(name, ())) == 1 and FillPlan._fusible(x.expr):
+                consumer, i = consumers[name][0]
+                if FillPlan._fusible(consumer.expr) and (i not in _NUMEXPR_BOOLEANARGS.get(consumer.expr.fcn, ()) or x.expr.fcn in _NUMEXPR_BOOLEANS):
+                    inline.add(name)
+
+        return FillPlan._inline(instructions, inline)
+
+    @staticmethod
+    def _shortcircuit(instructions):
+        # inlines the operands of logical_and, logical_or, and where that can be evaluated on a subset of rows (see _LazyCall):
+        # elementwise subexpressions used only by that operand, if they cost more array operations than selecting their leaves and scattering back
+        assigns = dict((x.name, x) for x in instructions if isinstance(x, histbook.instr.Assign))
+        exported = set(x.name for x in instructions if isinstance(x, histbook.instr.Export))
+
+        numconsumers = {}
+        for x in assigns.values():
+            for arg in x.expr.args:
+                if isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                    numconsumers[arg.value] = numconsumers.get(arg.value, 0) + 1
+
+        def owned(arg):
+            return isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)) and arg.value in assigns and arg.value not in exported and numconsumers[arg.value] == 1 and (isinstance(histbook.calc.library.get(assigns[arg.value].expr.fcn), numpy.ufunc) or assigns[arg.value].expr.fcn in _SHORTCIRCUIT)
+
+        def subtree(name, inline, leaves):
+            inline.add(name)
+            cost = 1
+            for arg in assigns[name].expr.args:
+                if owned(arg):
+                    cost += subtree(arg.value, inline, leaves)
+                elif isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                    leaves.add(arg.value)
+            return cost
+
+        inline = set()
+        lazy = set()
+        for x in instructions:
+            if isinstance(x, histbook.instr.Assign) and x.expr.fcn in _SHORTCIRCUIT:
+                candidates = []
+                for i in ((1, 2) if x.expr.fcn == "where" else (0, 1)):
+                    if owned(x.expr.args[i]):
+                        names, leaves = set(), set()
+                        cost = subtree(x.expr.args[i].value, names, leaves)
+                        if cost > len(leaves) + 1:
+                            candidates.append((cost, i, names))
+
+                if x.expr.fcn != "where":
+                    candidates = sorted(candidates)[-1:]    # the more expensive operand is deferred, the other is the condition
+                for cost, i, names in candidates:
+                    inline.update(names)
+                if len(candidates) > 0:
+                    lazy.add(x.name)
+
+        lazy.difference_update(inline)                      # nested in another's deferred operand, evaluated as an ordinary call
+        return FillPlan._inline(instructions, inline), lazy
+
+    @staticmethod
+    def _inline(instructions, inline):
+        # replaces references to the named Assigns by their expressions, keeping the inputs of those expressions alive until they're used
+        pending = {}
+        def substitute(expr):
+            return histbook.expr.Call(expr.fcn, *(pending.pop(x.value) if isinstance(x, (histbook.expr.Name, histbook.expr.Predicate)) and x.value in pending else x for x in expr.args))
+
+        leaves = FillPlan._leaves
+
+        out = []
+        deferred = []
+        for instruction in instructions:
+            if isinstance(instruction, histbook.instr.Assign) and instruction.name in inline:
+                pending[instruction.name] = substitute(instruction.expr)
+
+            elif isinstance(instruction, histbook.instr.Assign) and any(isinstance(x, (histbook.expr.Name, histbook.expr.Predicate)) and x.value in pending for x in instruction.expr.args):
+                out.append(histbook.instr.Assign(instruction.name, substitute(instruction.expr)))
+
+                # inputs of the fused expression were kept alive until now
+                needed = set()
+                for x in pending.values():
+                    leaves(x, needed)
+                out.extend(x for x in deferred if x.name not in needed)
+                deferred = [x for x in deferred if x.name in needed]
+
+            elif isinstance(instruction, histbook.instr.Delete) and instruction.name in inline:
+                pass
+
+            elif isinstance(instruction, histbook.instr.Delete) and any(instruction.name in leaves(x, set()) for x in pending.values()):
+                deferred.append(instruction)
+
+            else:
+                out.append(instruction)
+
+        return out + deferred
+
+    @staticmethod
+    def _numexprstring(expr, leaf):
+        args = []
+        for arg in expr.args:
+            if isinstance(arg, histbook.expr.Call):
+                args.append(FillPlan._numexprstring(arg, leaf))
+            elif isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                args.append("a{0}".format(leaf(arg.value)))
+            else:
+                args.append(_numexprconst(arg.value))
+
+        if expr.fcn in _NUMEXPR_OPERATORS:
+            return "({0} {1} {2})".format(args[0], _NUMEXPR_OPERATORS[expr.fcn], args[1])
+        elif expr.fcn == "numpy.logical_not":
+            return "(~{0})".format(args[0])
+        else:
+            return "{0}({1})".format(_NUMEXPR_FUNCTIONS[expr.fcn], ", ".join(args))
+
+    @staticmethod
+    def _numexprbooleans(expr, leaf, out):
+        for i, arg in enumerate(expr.args):
+            if isinstance(arg, histbook.expr.Call):
+                FillPlan._numexprbooleans(arg, leaf, out)
+            elif isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)) and i in _NUMEXPR_BOOLEANARGS.get(expr.fcn, ()):
+                out.add(leaf(arg.value))
+        return out
+
+    @staticmethod
+    def _compilenumexpr(numexpr, expr, slot):
+        names = []
+        def leaf(name):
+            if name not in names:
+                names.append(name)
+            return names.index(name)
+
+        string = FillPlan._numexprstring(expr, leaf)
+        booleans = FillPlan._numexprbooleans(expr, leaf, set())
+        fallback = FillPlan._compile(expr, leaf)
+        fcn = _NumExprCall(numexpr, string, len(names), booleans, fallback)
+        return fcn, (None,) * len(names), tuple((i, slot(x)) for i, x in enumerate(names)), ()
+
+    @staticmethod
+    def _compilelazy(expr, slot):
+        names = []
+        def leaf(name):
+            if name not in names:
+                names.append(name)
+            return names.index(name)
+
+        def term(arg, leaf):
+            if isinstance(arg, histbook.expr.Call):
+                return (2, FillPlan._compile(arg, leaf))
+            elif isinstance(arg, histbook.expr.BroadcastConst):
+                return (0, leaf(arg.name))
+            elif isinstance(arg, (histbook.expr.Name, histbook.expr.Predicate)):
+                return (0, leaf(arg.value))
+            else:
+                return (1, arg.value)
+
+        def cost(arg):
+            return 1 + sum(cost(x) for x in arg.args) if isinstance(arg, histbook.expr.Call) else 0
+
+        def deferred(arg):
+            used = set()
+            def record(name):
+                used.add(leaf(name))
+                return leaf(name)
+            compiled = term(arg, record)
+            return compiled, tuple(sorted(used)), cost(arg)
+
+        if expr.fcn == "where" or isinstance(expr.args[1], histbook.expr.Call):
+            condition, others = expr.args[0], expr.args[1:]
+        else:
+            condition, others = expr.args[1], expr.args[:1]
+
+        fcn = _LazyCall(expr.fcn, term(condition, leaf), [deferred(x) for x in others])
+        return fcn, (None,) * len(names), tuple((i, slot(x)) for i, x in enumerate(names)), ()
+
+    @staticmethod
+    def _call(fcn, template, slotargs, callargs, symbols):
+        args = list(template)
+        for i, j in slotargs:
+            args[i] = symbols[j]
+        for i, call in callargs:
+            args[i] = FillPlan._call(call[0], call[1], call[2], call[3], symbols)
+        return fcn(*args)
+
+    def length(self, arrays):
+        """Returns the length of the first non-scalar array in ``arrays`` needed by this plan, along with its slot number and value (or ``1, None, None`` if all are scalars)."""
+        for step in self._externals:
+            try:
+                array = arrays[step[2]]
+            except KeyError:
+                if step[2] in histbook.expr.Expr.maybeconstants:
+                    continue
+                else:
+                    raise ValueError("required field {0} not found in fill arguments".format(step[3]))
+
+            if not isinstance(array, numpy.ndarray):
+                array = numpy.array(array)
+            if array.shape != ():
+                return array.shape[0], step[1], array
+
+        return 1, None, None
+
+    def run(self, arrays, destination, pool=None, profile=None, ready=None):
+        u"""
+        Runs the plan on a set of ``arrays``, putting exported results in ``destination``.
+
+        Parameters
+        ----------
+        arrays : dict-like of str \u2192 Numpy array or number
+            field values to use in the calculation
+
+        destination : list of lists
+            exported results are put in ``destination[i][j]`` for each ``(i, j)`` of each :py:class:`Export <histbook.instr.Export>`
+
+        pool : ``None`` or :py:class:`BufferPool <histbook.fill.BufferPool>`
+            if not ``None``, temporary arrays are taken from and returned to this pool; exported arrays are lent to it, so its ``reclaim`` must only be called when ``destination`` is no longer needed
+
+        profile : ``None`` or :py:class:`FillProfile <histbook.fill.FillProfile>`
+            if not ``None``, the time and allocations of each step are recorded in this profile
+
+        ready : ``None`` or callable
+            if not ``None``, ``ready(i, length)`` is called as soon as all exports into ``destination[i]`` have been made, and must be done with them when it returns (so that the arrays can be reused for the rest of the run); rows without exports are not reported
+
+        Returns
+        -------
+        int
+            the number of entries in the arrays
+        """
+        length, firstslot, firstarray = self.length(arrays)
+        if pool is not None:
+            pool._lent = []
+
+        if profile is not None and self._labels is None:
+            self._makelabels()
+
+        symbols = [None] * self._numslots
+        homes = [None] * self._numslots    # slot that first allocated each array, for the BufferPool key
+        free = {}
+        exported = {}
+        for index, step in enumerate(self._steps):
+            op = step[0]
+            if profile is not None:
+                starttime = _clock()
+
+            if op == self.UFUNC:
+                args = list(step[3])
+                for i, j in step[4]:
+                    args[i] = symbols[j]
+
+                dtypes = tuple(x.dtype if isinstance(x, numpy.ndarray) else None for x in args)
+                dtype = step[6].get(dtypes)
+                if dtype is None:
+                    try:
+                        dtype = step[2](*[x[:0] if isinstance(x, numpy.ndarray) else x for x in args]).dtype
+                    except Exception:
+                        dtype = False
+                    step[6][dtypes] = dtype
+
+                out = None
+                home = step[1]
+                for j in step[5]:
+                    if isinstance(symbols[j], numpy.ndarray) and symbols[j].dtype == dtype and symbols[j].shape == (length,):
+                        out = symbols[j]
+                        home = homes[j]
+                        symbols[j] = None
+                        break
+                else:
+                    if len(free.get(dtype, ())) > 0:
+                        home, out = free[dtype].pop()
+                    elif pool is not None and dtype is not False:
+                        out = pool.take(step[1], dtype, length)
+                homes[step[1]] = home
+
+                if out is None:
+                    symbols[step[1]] = step[2](*args)
+                else:
+                    symbols[step[1]] = step[2](*args, out=out)
+
+            elif op == self.ASSIGN:
+                symbols[step[1]] = self._call(step[2], step[3], step[4], step[5], symbols)
+
+            elif op == self.PARAM:
+                if step[1] == firstslot:
+                    array = given = firstarray
+                else:
+                    try:
+                        array = given = arrays[step[2]]
+                    except KeyError:
+                        given = None
+                        if step[2] in histbook.expr.Expr.maybeconstants:
+                            array = _full(length, histbook.expr.Expr.maybeconstants[step[2]])
+                        else:
+                            raise ValueError("required field {0} not found in fill arguments".format(step[3]))
+
+                if not isinstance(array, numpy.ndarray):
+                    array = numpy.array(array)
+                if array.shape == ():
+                    array = _full(length, array)
+
+                if length != array.shape[0]:
+                    raise ValueError("array {0} has len {1} but other arrays have len {2}".format(step[3], len(array), length))
+
+                symbols[step[1]] = array
+
+            elif op == self.BROADCAST:
+                symbols[step[1]] = _broadcast(length, step[2])
+
+            elif op == self.EXPORT:
+                data = symbols[step[1]]
+                if step[4] is None:
+                    for i, j in step[2]:
+                        destination[i][j] = data
+                else:
+                    unbinned = histbook.calc.Unbinned(data, step[4][0], step[4][1])
+                    for i, j in step[2]:
+                        destination[i][j] = unbinned
+                if step[3] and isinstance(data, numpy.ndarray) and data.shape == (length,):
+                    if ready is not None and step[1] in self._releasable:
+                        exported[step[1]] = (homes[step[1]], data)
+                    elif pool is not None:
+                        pool.lend(homes[step[1]], data)
+
+            else:
+                if step[2] and isinstance(symbols[step[1]], numpy.ndarray) and symbols[step[1]].shape == (length,):
+                    free.setdefault(symbols[step[1]].dtype, []).append((homes[step[1]], symbols[step[1]]))
+                symbols[step[1]] = None
+
+            if profile is not None and self._labels[index] is not None:
+                seconds = _clock() - starttime
+                result = symbols[step[1]]
+                if op == self.EXPORT or op == self.BROADCAST or not isinstance(result, numpy.ndarray) or result.base is not None:
+                    nbytes = 0
+                elif op == self.PARAM:
+                    nbytes = 0 if result is given else result.nbytes
+                elif op == self.UFUNC:
+                    nbytes = 0 if out is not None else result.nbytes
+                else:
+                    nbytes = result.nbytes
+                profile.record(self._labels[index][0], self._labels[index][1], seconds, nbytes)
+
+            if ready is not None:
+                if index in self._rowsready:
+                    for i in self._rowsready[index]:
+                        ready(i, length)
+                if index in self._release:
+                    for j in self._release[index]:
+                        if j in exported:
+                            home, array = exported.pop(j)
+                            free.setdefault(array.dtype, []).append((home, array))
+
+        if pool is not None:
+            for buffers in free.values():
+                for slot, array in buffers:
+                    pool.give(slot, array)
+
+        return length
+
+class PlanCache(histbook.util.LRUCache):
+    """
+    Process-wide cache of compiled instructions (:py:class:`Instruction <histbook.instr.Instruction>`) and field names, keyed by the set of goals and the scheduler, so that structurally identical :py:class:`Fillables <histbook.fill.Fillable>` (such as every :py:class:`Book <histbook.book.Book>` in a :py:class:`SamplesBook <histbook.book.SamplesBook>`, or copies and cleared versions of one histogram) compile once and only bind their own destinations.
+
+    The cache used by ``Fillable.fields`` is ``histbook.fill.plancache``; ``compiles`` counts instruction compilations (cache misses and compilations with the cache disabled), ``hits``, ``misses``, and ``hitrate`` count lookups since the last ``clear`` (see :py:class:`LRUCache <histbook.util.LRUCache>`).
+    """
+
+    def __init__(self, maxsize=256):
+        super(PlanCache, self).__init__(maxsize)
+
+    def clear(self):
+        super(PlanCache, self).clear()
+        self.compiles = 0
+
+plancache = PlanCache()
+
+def _compile(goals, scheduler, groups=None):
+    key = (frozenset(x.goal for x in goals), scheduler, None if groups is None else tuple(frozenset(x) for x in groups))
+    compiled = plancache.get(key) if plancache.maxsize > 0 else None
+
+    if compiled is None:
+        table = {}
+        for x in goals:
+            x.clear()
+        for x in goals:
+            x.grow(table)
+
+        fields = histbook.instr.sources(goals, table)
+
+        instructions = list(histbook.instr.instructions(fields, goals, histbook.instr.schedulers[scheduler], groups))
+        compiled = (instructions, sorted(x.goal.value for x in fields if not isinstance(x.goal, histbook.expr.BroadcastConst)))
+        plancache.compiles += 1
+        if plancache.maxsize > 0:
+            plancache.put(key, compiled)
+
+    return compiled
+
+def _groups(hists):
+    # each histogram's goals, so that the instructions finish one histogram before starting the next (see histbook.instr.bygroup)
+    if len(hists) < 2:
+        return None
+    else:
+        return [[x.goal for x in hist._goals] for hist in hists]
+
+def _bind(instructions, lookup):
+    # like _streamline, but with destinations given explicitly as goal -> [(i, j), ...]
+    out = []
+    for x in instructions:
+        if isinstance(x, histbook.instr.Export):
+            x = histbook.instr.Export(x.name, x.goal)
+            x.destination = list(lookup.get(x.goal, ()))
+        out.append(x)
+    return out
+
+def _pushable(hist):
+    return hist._filterparsed is not None and not isinstance(hist._filterparsed, histbook.expr.Const)
+
+class PushdownPlan(object):
+    """
+    Fill plan for :py:class:`Fillables <histbook.fill.Fillable>` with ``pushdown`` turned on: a :py:class:`FillPlan <histbook.fill.FillPlan>` for the histograms without filters that also calculates each distinct filter, followed by a plan for each filter that calculates the histograms with that filter using only the rows that pass it.
+
+    Filters are exported into an extra last row of the destination; after ``run``, each is replaced by its number of selected rows (see ``lengths``).
+    """
+
+    def __init__(self, main, subplans, filterof, backend):
+        """Combines a ``main`` plan with ``subplans``, a list of (:py:class:`FillPlan <histbook.fill.FillPlan>`, list of field names) for each filter; ``filterof`` gives each histogram's filter index or ``None``."""
+        self.main = main
+        self.subplans = subplans
+        self.filterof = filterof
+        self.backend = backend
+
+    def run(self, arrays, destination, pool=None, profile=None, ready=None):
+        u"""
+        Runs the plan on a set of ``arrays``, putting exported results in ``destination``, as :py:meth:`FillPlan.run <histbook.fill.FillPlan.run>`.
+
+        The ``pool`` is only used by the main plan, since the number of rows selected by a filter changes from one fill to the next. If ``ready`` is given, it is called with each histogram's number of selected rows (see ``lengths``).
+        """
+        length = self.main.run(arrays, destination, pool, profile, ready)     # main was compiled with numrows, so it doesn't report the filters' row
+
+        selections = destination[-1]
+        for k, (plan, fields) in enumerate(self.subplans):
+            mask = selections[k]
+            if not isinstance(mask, numpy.ndarray) or mask.shape == ():
+                mask = numpy.full(length, bool(mask))
+            elif mask.dtype != numpy.bool_:
+                mask = mask.astype(numpy.bool_)
+
+            selected = {}
+            for n in fields:
+                try:
+                    array = arrays[n]
+                except KeyError:
+                    continue            # maybe a constant; the plan will raise an error if not
+                if not isinstance(array, numpy.ndarray):
+                    array = numpy.array(array)
+                selected[n] = array if array.shape == () else array[mask]
+
+            count = int(numpy.count_nonzero(mask))
+            plan.run(selected, destination, None, profile, None if ready is None else lambda i, sublength: ready(i, count))
+            selections[k] = count
+
+        return length
+
+    def lengths(self, destination, length):
+        """Returns the number of rows each histogram was filled with, after ``run`` of ``length`` rows into ``destination``."""
+        return [length if k is None else destination[-1][k] for k in self.filterof]
+
 class Fillable(object):
     """Mix-in for objects with a ``fill`` method, like `Hist <histbook.hist.Hist>` and `Book <histbook.hist.Book>`."""
 
+    _backend = None
+    _scheduler = "walkdown"
+    _poolsize = 2**26
+    _pool = None
+    _profiler = None
+    _lastlength = 0
+    _pushdown = False
+
+    @property
+    def poolsize(self):
+        """Maximum number of bytes in temporary arrays to keep from one ``fill`` to the next (see :py:class:`BufferPool <histbook.fill.BufferPool>`); default is 64 MB and ``0`` disables the pool."""
+        return self._poolsize
+
+    @poolsize.setter
+    def poolsize(self, value):
+        if not isinstance(value, (numbers.Integral, numpy.integer)) or value < 0:
+            raise TypeError("poolsize must be a non-negative integer")
+        self._poolsize = value
+        self._pool = None
+
+    @property
+    def backend(self):
+        """Calculation backend for fills: ``"numpy"``, ``"numexpr"``, ``"numba"``, or ``None`` (default) to use the global ``histbook.fill.defaultbackend`` (see :py:class:`FillPlan <histbook.fill.FillPlan>`)."""
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        if value is not None and value not in FillPlan.backends:
+            raise ValueError("backend must be None or one of {0}".format(", ".join(repr(x) for x in FillPlan.backends)))
+        self._backend = value
+
+    @property
+    def scheduler(self):
+        """Order in which to calculate subexpressions: ``"walkdown"`` (default) computes those needed by the most histograms first; ``"minlive"`` minimizes the number of full-length arrays alive at once (see :py:func:`histbook.instr.minlive`), which lets larger chunks fit in the same memory."""
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, value):
+        if value not in histbook.instr.schedulers:
+            raise ValueError("scheduler must be one of {0}".format(", ".join(repr(x) for x in sorted(histbook.instr.schedulers))))
+        self._scheduler = value
+        self._fields = None
+
+    @property
+    def pushdown(self):
+        """If ``True``, histograms with a ``filter`` are filled by calculating the filter first and then their axes, profiles, and weights only for the rows that pass it (with one selection for all histograms that share a filter); default is ``False``. Bin contents are the same, except that ``groupby`` and ``groupbin`` keys seen only in rows that fail the filter are not added, and profiles aren't affected by ``nan`` values in rows that fail the filter (see :py:class:`PushdownPlan <histbook.fill.PushdownPlan>`)."""
+        return self._pushdown
+
+    @pushdown.setter
+    def pushdown(self, value):
+        self._pushdown = bool(value)
+        self._fields = None
+
+    @property
+    def profiling(self):
+        """If ``True``, fills record the time and allocations of each step of the calculation and of each histogram's accumulation in ``fillprofile()``; default is ``False``. Setting it to ``False`` discards the profile."""
+        return self._profiler is not None
+
+    @profiling.setter
+    def profiling(self, value):
+        if value:
+            if self._profiler is None:
+                self._profiler = FillProfile()
+        else:
+            self._profiler = None
+
+    def fillprofile(self):
+        """Returns the :py:class:`FillProfile <histbook.fill.FillProfile>` of all fills since ``profiling`` was turned on (linked, not a copy), or ``None`` if ``profiling`` is off."""
+        return self._profiler
+
+    @property
+    def peakarrays(self):
+        """Predicted maximum number of full-length arrays (parameters and intermediate results) alive at once during a ``fill``, for the current ``scheduler``."""
+        self.fields  # for the side-effect of creating self._instructions
+        return histbook.instr.peaklive(self._instructions)
+
+    def memoryreport(self, chunksize=None):
+        u"""
+        Returns a breakdown of the memory used by histogram content and projected for the next ``fill``'s temporary arrays.
+
+        Parameters
+        ----------
+        chunksize : ``None`` or non-negative int
+            number of entries in the next fill, for projecting the size of temporary arrays; if ``None``, use the number of entries in the last fill
+
+        Returns
+        -------
+        dict
+            ``"nbytes"``: total bytes of content in all histograms;
+            ``"hists"``: dict of histogram path (``""`` for a lone histogram) \u2192 dict with ``"nbytes"``, number of ``"arrays"``, ``"arraybytes"`` (array data), ``"overhead"`` (Python objects: arrays and dicts), ``"keybytes"`` (group keys), and ``"axes"``, a list of (axis, bytes) pairs for each :py:class:`GroupAxis <histbook.axis.GroupAxis>` and ``"bins"`` for the arrays;
+            ``"pool"``: bytes of temporary arrays kept from one fill to the next (see ``poolsize``);
+            ``"chunksize"``: number of entries used for the projection;
+            ``"temporaries"``: projected bytes of full-length arrays alive at once in the next fill, ``peakarrays`` \u00d7 ``chunksize`` \u00d7 8 (an upper bound for 8-byte values that includes the input arrays)
+        """
+        if chunksize is None:
+            chunksize = self._lastlength
+        elif not isinstance(chunksize, (numbers.Integral, numpy.integer)) or chunksize < 0:
+            raise TypeError("chunksize must be None or a non-negative integer")
+
+        hists = {}
+        for name, x in zip(self._histnames, self._hists):
+            hists[name] = x._memory(x._content)
+
+        return {"nbytes": sum(x["nbytes"] for x in hists.values()),
+                "hists": hists,
+                "pool": 0 if self._pool is None else self._pool.nbytes,
+                "chunksize": chunksize,
+                "temporaries": self.peakarrays * chunksize * 8}
+
     @property
     def fields(self):
         """Names of fields that must be provided in the ``fill`` method."""
 
-        if self._fields is None:
-            table = {}
-            goals = set(self._goals)
+        backend = defaultbackend if self._backend is None else self._backend
+        if self._fields is None or self._plan.backend != backend:
+            hists = self._hists
+            if self._pushdown and any(_pushable(x) for x in hists):
+                self._compilepushdown(hists, backend)
+
+            else:
+                instructions, fields = _compile(set(self._goals), self._scheduler, _groups(hists))
+
+                # Exports are the only instructions that get attached to this Fillable (by _streamline), so they're the only ones copied
+                instructions = [histbook.instr.Export(x.name, x.goal) if isinstance(x, histbook.instr.Export) else x for x in instructions]
 
-            for x in goals:
-                x.clear()
-            for x in goals:
-                x.grow(table)
-            
-            fields = histbook.instr.sources(goals, table)
+                self._instructions = self._streamline(0, instructions)
+                self._plan = FillPlan(self._instructions, backend)
+                self._fields = list(fields)
 
-            self._instructions = self._streamline(0, list(histbook.instr.instructions(fields, goals)))
-            self._fields = sorted(x.goal.value for x in fields)
+            self._pool = None
 
         return self._fields
 
+    def _compilepushdown(self, hists, backend):
+        filters = []
+        filterof = []
+        for x in hists:
+            if not _pushable(x):
+                filterof.append(None)
+            else:
+                if x._filterparsed not in filters:
+                    filters.append(x._filterparsed)
+                filterof.append(filters.index(x._filterparsed))
+
+        # the main plan fills histograms without filters and exports the filters into an extra row of the destination
+        goals = set()
+        lookup = {}
+        for i, x in enumerate(hists):
+            if filterof[i] is None:
+                goals.update(x._goals)
+                for goal, js in x._lookup.items():
+                    lookup.setdefault(goal, []).extend((i, j) for j in js)
+        for k, x in enumerate(filters):
+            goal = histbook.instr.CallGraphGoal(x)
+            goals.add(goal)
+            lookup.setdefault(goal.goal, []).append((len(hists), k))
+
+        instructions, fields = _compile(goals, self._scheduler, _groups([x for i, x in enumerate(hists) if filterof[i] is None]))
+        self._instructions = _bind(instructions, lookup)
+        main = FillPlan(self._instructions, backend, numrows=len(hists))
+        allfields = set(fields)
+
+        # each filter's plan fills its histograms, unchanged (including the filter in their weights), from the selected rows
+        subplans = []
+        for k in range(len(filters)):
+            goals = set()
+            lookup = {}
+            for i, x in enumerate(hists):
+                if filterof[i] == k:
+                    goals.update(x._goals)
+                    for goal, js in x._lookup.items():
+                        lookup.setdefault(goal, []).extend((i, j) for j in js)
+
+            instructions, fields = _compile(goals, self._scheduler, _groups([x for i, x in enumerate(hists) if filterof[i] == k]))
+            subplans.append((FillPlan(_bind(instructions, lookup), backend), fields))
+            allfields.update(fields)
+
+        self._destination = [x._destination[0] for x in hists] + [[None] * len(filters)]
+        self._plan = PushdownPlan(main, subplans, filterof, backend)
+        self._fields = sorted(allfields)
+
+    def _lengths(self, destination, length):
+        if isinstance(self._plan, PushdownPlan):
+            return self._plan.lengths(destination, length)
+        else:
+            return [length] * len(destination)
+
+    def fillchunks(self, chunks, chunksize=None):
+        u"""
+        Fill from a stream of chunks of data, each of which could be passed to ``fill``.
+
+        The fill plan is compiled once for all chunks and only the fields that are needed are kept from each chunk. If ``chunksize`` is given, chunks are re-chunked so that each fill has exactly ``chunksize`` entries (except the last): large chunks are filled through views and small chunks are copied into assembly buffers that are reused from one fill to the next. Memory use is therefore bounded by the chunk size, not the size of the whole dataset.
+
+        Parameters
+        ----------
+        chunks : iterable of dict \u2192 Numpy array or number; iterable of Pandas DataFrames
+            field values for each chunk, as in ``fill``; chunks may be produced by a generator
+
+        chunksize : ``None`` or positive int
+            if not ``None``, the number of entries to fill at a time
+        """
+        if chunksize is not None and (not isinstance(chunksize, (numbers.Integral, numpy.integer)) or chunksize <= 0):
+            raise TypeError("chunksize must be None or a positive integer")
+
+        fields = self.fields
+
+        if chunksize is None:
+            for chunk in chunks:
+                self.fill(_select(chunk, fields)[0])
+            return
+
+        buffers = {}
+        numbuffered = [0]
+
+        def buffer(arrays, start, stop):
+            pos = numbuffered[0]
+            for n, x in arrays.items():
+                piece = x if x.shape == () else x[start:stop]
+                if n not in buffers:
+                    buffers[n] = numpy.empty(chunksize, dtype=piece.dtype)
+                elif not numpy.can_cast(piece.dtype, buffers[n].dtype):
+                    old = buffers[n]
+                    buffers[n] = numpy.empty(chunksize, dtype=numpy.result_type(old.dtype, piece.dtype))
+                    buffers[n][:pos] = old[:pos]
+                buffers[n][pos : pos + stop - start] = piece
+            numbuffered[0] += stop - start
+
+        def flush():
+            if numbuffered[0] > 0:
+                self.fill(dict((n, x[:numbuffered[0]]) for n, x in buffers.items()))
+                numbuffered[0] = 0
+
+        for chunk in chunks:
+            arrays, length = _select(chunk, fields)
+            start = 0
+
+            if numbuffered[0] > 0:
+                start = min(chunksize - numbuffered[0], length)
+                buffer(arrays, 0, start)
+                if numbuffered[0] == chunksize:
+                    flush()
+
+            while length - start >= chunksize:
+                self.fill(_view(arrays, start, start + chunksize))
+                start += chunksize
+
+            if start < length:
+                buffer(arrays, start, length)
+
+        flush()
+
+    def fillparallel(self, arrays=None, nthreads=None, **more):
+        u"""
+        Fill like ``fill``, but with the entries split into contiguous ranges that are filled by separate threads.
+
+        Each thread runs the compiled fill plan on its range and accumulates into its own content; the thread-local contents are added into the histograms at the end. Numpy releases the global interpreter lock in most calculations, so this can use several cores. Results are identical to ``fill`` up to the order of floating-point summation.
+
+        Parameters
+        ----------
+        arrays : dict \u2192 Numpy array or number; Pandas DataFrame
+            field values to use in the calculation of independent and dependent variables (axes)
+
+        nthreads : ``None`` or positive int
+            number of threads; if ``None``, use one per CPU
+
+        **more : Numpy arrays or numbers
+            more field values
+        """
+        if nthreads is not None and (not isinstance(nthreads, (numbers.Integral, numpy.integer)) or nthreads <= 0):
+            raise TypeError("nthreads must be None or a positive integer")
+        if nthreads is None:
+            import multiprocessing
+            nthreads = multiprocessing.cpu_count()
+
+        arrays = _normalize(arrays, more, "fillparallel")
+        arrays, length = _select(arrays, self.fields)
+        ranges = _ranges(length, nthreads)
+        if len(ranges) == 1:
+            self.fill(arrays)
+            return
+
+        hists = self._prepare()
+        names = self._histnames
+        before = None if self._profiler is None else [x.nbytes for x in hists]
+
+        results = [None] * len(ranges)
+        profiles = [None if self._profiler is None else FillProfile() for x in ranges]
+        errors = []
+        def work(i, start, stop):
+            try:
+                destination = [[None] * len(x) for x in self._destination]
+                out = [None] * len(hists)
+                def accumulate(k, rows):
+                    x, dest = hists[k], destination[k]
+                    starttime = _clock()
+                    content = x._newcontent()
+                    x._accumulate(content, dest, rows, self._plan.backend)
+                    out[k] = (content, [uniques for uniques, inverse in dest[:len(x._group)]])
+                    if profiles[i] is not None:
+                        profiles[i].record("postfill", names[k], _clock() - starttime, 0)
+
+                self._runplan(_view(arrays, start, stop), destination, accumulate, profile=profiles[i])
+                results[i] = out
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=work, args=(i, start, stop)) for i, (start, stop) in enumerate(ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(errors) > 0:
+            raise errors[0]
+
+        self._merge(hists, results)
+        if self._profiler is not None:
+            for profile in profiles:
+                self._profiler.merge(profile)
+            self._profiler.merge(_postfillbytes(hists, names, before))
+
+    def fillprocesses(self, arrays=None, nprocesses=None, **more):
+        u"""
+        Fill like ``fill``, but with the entries split into contiguous ranges that are filled by a pool of worker processes.
+
+        Each worker receives the histogram definitions once, without content, and compiles its own fill plan. Numerical input arrays are copied once into shared memory and each worker fills from views of its range. Dense content is accumulated into a per-worker shared-memory slab and summed by this process; only content with ``groupby`` or ``groupbin`` axes is sent back through a pipe. Unlike ``fillparallel``, this sidesteps the global interpreter lock for the Python parts of the calculation. Where ``multiprocessing.shared_memory`` is not available (before Python 3.8), inputs and content are passed through pipes instead.
+
+        Parameters
+        ----------
+        arrays : dict \u2192 Numpy array or number; Pandas DataFrame
+            field values to use in the calculation of independent and dependent variables (axes)
+
+        nprocesses : ``None`` or positive int
+            number of worker processes; if ``None``, use one per CPU
+
+        **more : Numpy arrays or numbers
+            more field values
+        """
+        if nprocesses is not None and (not isinstance(nprocesses, (numbers.Integral, numpy.integer)) or nprocesses <= 0):
+            raise TypeError("nprocesses must be None or a positive integer")
+        import multiprocessing
+        if nprocesses is None:
+            nprocesses = multiprocessing.cpu_count()
+
+        arrays = _normalize(arrays, more, "fillprocesses")
+        arrays, length = _select(arrays, self.fields)
+        ranges = _ranges(length, nprocesses)
+        if len(ranges) == 1:
+            self.fill(arrays)
+            return
+
+        hists = self._prepare()
+        before = None if self._profiler is None else [x.nbytes for x in hists]
+        definition = self.cleared()
+
+        shared_memory = _sharedmemory()
+        if shared_memory is None:
+            tasks = [(None, [], _view(arrays, start, stop), start, stop, None, [], self._profiler is not None) for start, stop in ranges]
+            memories = []
+        else:
+            inputs = [(n, x) for n, x in arrays.items() if x.shape != () and not x.dtype.hasobject]
+            objects = dict((n, x) for n, x in arrays.items() if x.shape == () or x.dtype.hasobject)
+            inputlayout, inputsize = _layout(inputs)
+            slablayout, slabsize = _layout([(i, x._content) for i, x in enumerate(hists) if isinstance(x._content, numpy.ndarray)])
+
+            memories = [shared_memory.SharedMemory(create=True, size=inputsize)]
+            memories.extend(shared_memory.SharedMemory(create=True, size=slabsize) for start, stop in ranges)
+            views = _attach(memories[0].buf, inputlayout)
+            for n, x in inputs:
+                views[n][...] = x
+            del views
+
+            tasks = [(memories[0].name, inputlayout, _view(objects, start, stop), start, stop, memory.name, slablayout, self._profiler is not None) for memory, (start, stop) in zip(memories[1:], ranges)]
+
+        try:
+            pool = multiprocessing.Pool(len(ranges), initializer=_initprocess, initargs=(definition,))
+            try:
+                results = pool.map(_fillprocess, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+            if self._profiler is not None:
+                for result, profile in results:
+                    self._profiler.merge(profile)
+            results = [result for result, profile in results]
+
+            def merge(results):
+                # in its own scope so that no views of the slabs outlive it (they must be released before closing)
+                for memory, result in zip(memories[1:], results):
+                    for i, content in _attach(memory.buf, slablayout).items():
+                        result[i] = (content, [])
+                self._merge(hists, results)
+            merge(results)
+            del results
+
+            if self._profiler is not None:
+                self._profiler.merge(_postfillbytes(hists, self._histnames, before))
+
+        finally:
+            for memory in memories:
+                memory.close()
+                memory.unlink()
+
+    def _prepare(self):
+        hists = self._hists
+        for x in hists:
+            if x._copyonfill:
+                x._content = x._copycontent(x._content)
+                x._copyonfill = False
+            x._prefill()
+        return hists
+
+    def _merge(self, hists, results):
+        for i, x in enumerate(hists):
+            for result in results:
+                x._content = x._addcontent(x._content, result[i][0])
+
+            if len(x._group) > 1:
+                uniques = []
+                for j in range(len(x._group)):
+                    seen = set()
+                    uniques.append([])
+                    for result in results:
+                        for unique in result[i][1][j]:
+                            if unique not in seen:
+                                seen.add(unique)
+                                uniques[j].append(unique)
+                x._allcombinations(0, x._content, uniques)
+
     def _showgoals(self):
         self.fields  # for the side-effect of creating self._instructions
 
+        table = {}      # the plan may have come from plancache, so grow the graph here
+        for x in self._goals:
+            x.clear()
+        for x in self._goals:
+            x.grow(table)
+
         numbers = {}
         order = []
         def recurse(node):
@@ -83,80 +1589,46 @@ class Fillable(object):
         print("")
         
     def _fill(self, arrays):
-        self.fields  # for the side-effect of creating self._instructions
-        
-        length = None
-        firstinstruction = None
-        firstarray = None
-        for instruction in self._instructions:
-            if isinstance(instruction, histbook.instr.Param) and not isinstance(instruction.extern, histbook.expr.BroadcastConst):
-                try:
-                    array = arrays[instruction.extern.value]
-                except KeyError:
-                    if instruction.extern.value in histbook.expr.Expr.maybeconstants:
-                        continue
-                    else:
-                        raise ValueError("required field {0} not found in fill arguments".format(repr(str(instruction.extern))))
-
-                if not isinstance(array, numpy.ndarray):
-                    array = numpy.array(array)
-                if array.shape != ():
-                    length = array.shape[0]
-                    firstinstruction = instruction.name
-                    firstarray = array
-                    break
-
-        if length is None:
-            length = 1
-
-        def full(length, value):
-            if isinstance(value, (histbook.util.string, bytes)):
-                value = numpy.array(value)
-            if isinstance(value, numpy.ndarray) and value.shape == () and (value.dtype.kind == "U" or value.dtype.kind == "S"):
-                out = numpy.empty(length, dtype=value.dtype)
-                out[:] = value
-                return out
-            else:
-                return numpy.full(length, value)
+        self.fields  # for the side-effect of creating self._plan
+        if self._pool is None and self._poolsize > 0:
+            self._pool = BufferPool(self._poolsize)
 
-        symbols = {}
-        for instruction in self._instructions:
-            if isinstance(instruction, histbook.instr.Param):
-                if isinstance(instruction.extern, histbook.expr.BroadcastConst):
-                    array = full(length, instruction.extern.value)
-                elif instruction.name == firstinstruction:
-                    array = firstarray
-                else:
-                    try:
-                        array = arrays[instruction.extern.value]
-                    except KeyError:
-                        if instruction.extern.value in histbook.expr.Expr.maybeconstants:
-                            array = full(length, histbook.expr.Expr.maybeconstants[instruction.extern.value])
-                        else:
-                            raise ValueError("required field {0} not found in fill arguments".format(repr(str(instruction.extern))))
+        hists = self._hists
+        backend = self._plan.backend
+        if self._profiler is None:
+            def accumulate(i, length):
+                hists[i]._postfill(arrays, length, backend)
+        else:
+            names = self._histnames
+            before = [x.nbytes for x in hists]
+            def accumulate(i, length):
+                starttime = _clock()
+                hists[i]._postfill(arrays, length, backend)
+                self._profiler.record("postfill", names[i], _clock() - starttime, 0)
 
-                if not isinstance(array, numpy.ndarray):
-                    array = numpy.array(array)
-                if array.shape == ():
-                    array = full(length, array)
+        self._lastlength = self._runplan(arrays, self._destination, accumulate, self._pool, self._profiler)
+        if self._profiler is not None:
+            self._profiler.merge(_postfillbytes(hists, names, before))
+        return self._lastlength
 
-                if length != array.shape[0]:
-                    raise ValueError("array {0} has len {1} but other arrays have len {2}".format(repr(str(instruction.extern)), len(array), length))
+    def _runplan(self, arrays, destination, accumulate, pool=None, profile=None):
+        # accumulate(i, length) fills histogram i from destination[i] as soon as the plan has exported all of its
+        # inputs, so that the inputs of only one histogram (rather than the whole Book) need to be alive at once
+        filled = set()
+        def ready(i, length):
+            accumulate(i, length)
+            row = destination[i]
+            for j in range(len(row)):
+                row[j] = None
+            filled.add(i)
 
-                symbols[instruction.name] = array
-
-            elif isinstance(instruction, histbook.instr.Assign):
-                symbols[instruction.name] = histbook.calc.calculate(instruction.expr, symbols)
-
-            elif isinstance(instruction, histbook.instr.Export):
-                data = symbols[instruction.name]
-                for i, j in instruction.destination:
-                    self._destination[i][j] = data
-
-            elif isinstance(instruction, histbook.instr.Delete):
-                del symbols[instruction.name]
-
-            else:
-                raise AssertionError(instruction)
+        length = self._plan.run(arrays, destination, pool, profile, ready)
 
+        for i, sublength in enumerate(self._lengths(destination, length)):
+            if i not in filled:
+                ready(i, sublength)
         return length
+
+    def _reclaim(self):
+        if self._pool is not None:
+            self._pool.reclaim()
@@ -30,24 +30,239 @@
 
 import collections
 import numbers
+import sys
 import threading
 
 import numpy
 
 import histbook.axis
 import histbook.calc
-import histbook.calc.spark
-import histbook.export
 import histbook.expr
 import histbook.fill
 import histbook.proj
 import histbook.instr
 import histbook.util
-import histbook.vega
+import histbook.chain
 
-class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Exportable, histbook.vega.PlottingChain):
+class GroupContent(collections.OrderedDict):
+    u"""
+    Bin contents of the last :py:class:`GroupAxis <histbook.axis.GroupAxis>` of a columnar histogram (see ``Hist.columnar``): an ordered dict of key \u2192 Numpy array whose arrays are all rows of one stacked array.
+
+    The stack has shape ``(capacity,) + shape`` and at least doubles its capacity when it runs out of rows, so that many new keys cost one allocation instead of one each, and operations on all keys (filling, adding, scaling) are single Numpy operations on the stack. Each row's position in the stack is in a key index.
+
+    The dict's values are views of the stack: they may be modified in place, but a view is only valid until the next new key is added (growing moves the stack). Assigning to an existing key copies into its row and deleting a key moves the last row into its place.
+
+    Parameters
+    ----------
+    items : dict or iterable of (key, Numpy array) pairs
+        initial content (copied)
+
+    shape : ``None`` or tuple of ints
+        shape of each key's array; if ``None``, it's taken from the first array added
+
+    dtype : ``None`` or Numpy dtype
+        type of each key's array; if ``None``, it's taken from the first array added
+    """
+
+    def __init__(self, items=(), shape=None, dtype=None):
+        collections.OrderedDict.__init__(self)
+        self._shape = None if shape is None else tuple(shape)
+        self._dtype = None if dtype is None else numpy.dtype(dtype)
+        self._stack = None
+        self._keys = []
+        self._index = {}
+        if isinstance(items, dict):
+            items = items.items()
+        for n, x in items:
+            self[n] = x
+
+    @property
+    def stack(self):
+        """Numpy array of all rows in use, in the order of the key index (linked, not a copy); ``None`` if no array has been added yet."""
+        if self._stack is None:
+            return None
+        return self._stack[:len(self._keys)]
+
+    @property
+    def capacity(self):
+        """Number of rows allocated in the stack."""
+        return 0 if self._stack is None else len(self._stack)
+
+    def __setitem__(self, key, value):
+        slot = self._index.get(key)
+        if slot is None:
+            if self._shape is None:
+                value = numpy.asarray(value)
+                self._shape, self._dtype = value.shape, value.dtype
+            self._append([key])
+        view = collections.OrderedDict.__getitem__(self, key)
+        if value is not view:
+            view[...] = value
+
+    def __delitem__(self, key):
+        slot = self._index.pop(key)
+        collections.OrderedDict.__delitem__(self, key)
+        last = len(self._keys) - 1
+        if slot != last:
+            moved = self._keys[last]
+            self._stack[slot] = self._stack[last]
+            self._keys[slot] = moved
+            self._index[moved] = slot
+            collections.OrderedDict.__setitem__(self, moved, self._stack[slot])
+        self._keys.pop()
+        self._stack[last] = 0
+
+    def pop(self, key, *default):
+        if key in self._index:
+            out = self[key].copy()
+            del self[key]
+            return out
+        elif len(default) == 1:
+            return default[0]
+        elif len(default) == 0:
+            raise KeyError(key)
+        else:
+            raise TypeError("pop takes 1 or 2 arguments; {0} provided".format(len(default) + 1))
+
+    def popitem(self, last=True):
+        if len(self._keys) == 0:
+            raise KeyError("dictionary is empty")
+        key = next(reversed(self)) if last else next(iter(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self._index:
+            self[key] = default
+        return self[key]
+
+    def clear(self):
+        collections.OrderedDict.clear(self)
+        self._stack = None
+        self._keys = []
+        self._index = {}
+
+    def copy(self):
+        out = self.__class__(shape=self._shape, dtype=self._dtype)
+        if len(self._keys) > 0:
+            keys, rows = self._rows()
+            out._append(keys)
+            out._stack[:len(keys)] = rows
+        return out
+
+    def __reduce__(self):
+        keys, rows = self._rows() if self._stack is not None else ([], None)
+        return (self.__class__, (), (self._shape, self._dtype, keys, rows))
+
+    def __setstate__(self, state):
+        self._shape, self._dtype, keys, stack = state
+        if len(keys) > 0:
+            self._append(keys)
+            self._stack[:len(keys)] = stack
+
+    def _grow(self, size):
+        capacity = self.capacity
+        if size <= capacity:
+            return
+        stack = numpy.zeros((max(size, 2*capacity),) + self._shape, dtype=self._dtype)
+        if self._stack is not None:
+            stack[:len(self._keys)] = self._stack[:len(self._keys)]
+        self._stack = stack
+        self._point(self._keys, 0)
+
+    def _point(self, keys, start):
+        setitem = collections.OrderedDict.__setitem__
+        for n, x in zip(keys, self._stack[start : start + len(keys)]):
+            setitem(self, n, x)
+
+    def _append(self, keys):
+        # keys must be new and distinct; their rows are zero
+        start = len(self._keys)
+        self._grow(start + len(keys))
+        self._keys.extend(keys)
+        self._index.update(zip(keys, range(start, start + len(keys))))
+        self._point(keys, start)
+
+    def _rows(self):
+        # rows of the stack in dict order
+        keys = list(self)
+        if keys == self._keys:
+            return keys, self._stack[:len(keys)]
+        else:
+            return keys, self._stack[self._slots(keys)]
+
+    def _slots(self, keys, add=False):
+        # rows of keys in the stack (adding any that are missing as zeros if add)
+        if add:
+            new = [n for n in keys if n not in self._index]
+            if len(new) > 0:
+                self._append(new)
+        return numpy.array([self._index[n] for n in keys], dtype=numpy.intp)
+
+    def _add(self, other):
+        # in-place sum, aligned by key
+        if len(other._keys) > 0:
+            if self._shape is None:
+                self._shape, self._dtype = other._shape, other._dtype
+            keys, rows = other._rows()
+            slots = self._slots(keys, add=True)
+            self._stack[slots] += rows
+        return self
+
+    def _scale(self, value):
+        if self._stack is not None:
+            self._stack[:len(self._keys)] *= value
+        return self
+
+class Exportable(object):
+    """Mix-in for methods that export histograms to third-party software (implemented in :py:mod:`histbook.export`, which is imported on first use)."""
+
+    def pandas(self, *axis, **opts):
+        """
+        Exports the data in the histogram to a Pandas DataFrame.
+
+        Parameters
+        ----------
+        *axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            axis or axes to include in the table; if no axes or all :py:class:`profile <histbook.axis.profile>` axes, this function calls :py:meth:`Hist.table <histbook.proj.Projectable.table>`; if all :py:class:`cut <histbook.axis.cut>` axes, this function calls :py:meth:`Hist.fraction <histbook.proj.Projectable.fraction>`
+
+        Keyword Arguments
+        -----------------
+        **opts : *any*
+            passed to :py:meth:`Hist.table <histbook.proj.Projectable.table>` or :py:meth:`Hist.fraction <histbook.proj.Projectable.fraction>`; see these methods for options
+        """
+        import histbook.export
+        return histbook.export.pandas(self, *axis, **opts)
+
+    def root(self, *axis, **opts):
+        """
+        Exports the data in the histogram to a ROOT histogram.
+
+        The histogram may need to be selected (:py:meth:`Hist.select <histbook.proj.Projectable.select>`) or projected (:py:meth:`Hist.project <histbook.proj.Projectable.project>`) to make it useful in a ROOT histogram.
+
+        Parameters
+        ----------
+        *axis : :py:class:`Axis <histbook.axis.Axis>`, algebraic expression (lambda or string), or index position (integer)
+            axis or axes to include in the output; if no axes, this function returns a histogram of counts; if one :py:class:`profile <histbook.axis.profile>`, this function returns a profile; ...
+
+        Keyword Arguments
+        -----------------
+        name : string
+            name to give to the ROOT object *(default is the empty string)*
+
+        title : string
+            title to give to the ROOT object *(default is the empty string)*
+
+        cache : dict-like object
+            if supplied, the return value is inserted into ``cache`` keyed by its name; this for convenience (ROOT objects must be kept in scope to be drawn)
+        """
+        import histbook.export
+        return histbook.export.root(self, *axis, **opts)
+
+class Hist(histbook.fill.Fillable, histbook.proj.Projectable, Exportable, histbook.chain.PlottingChain):
     COUNTTYPE = numpy.float64
 
+    _columnar = False
+
     @property
     def _source(self):
         return self
@@ -56,6 +271,14 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
     def _chain(self):
         return ()
 
+    @property
+    def _hists(self):
+        return [self]
+
+    @property
+    def _histnames(self):
+        return [""]
+
     def weight(self, expr):
         """Returns a copy of this histogram with ``expr`` as weights (for fluent construction)."""
         return Hist(*(self._group + self._fixed + self._profile), weight=expr, filter=self._filteroriginal, defs=dict(self._defs), attachment=dict(self._attachment))
@@ -74,6 +297,8 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
             return None
         elif isinstance(content, numpy.ndarray):
             return content.copy()
+        elif isinstance(content, GroupContent):
+            return content.copy()
         else:
             return dict((n, cls._copycontent(x)) for n, x in content.items())
 
@@ -81,6 +306,10 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
         """Return an immediate copy of the histogram."""
         out = Hist(*(self._group + self._fixed + self._profile), weight=self._weightoriginal, filter=self._filteroriginal, defs=dict(self._defs), attachment=dict(self._attachment))
         out._content = self.__class__._copycontent(self._content)
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        out._columnar = self._columnar
         return out
 
     def copyonfill(self):
@@ -88,6 +317,10 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
         out = Hist(*(self._group + self._fixed + self._profile), weight=self._weightoriginal, filter=self._filteroriginal, defs=dict(self._defs), attachment=dict(self._attachment))
         out._copyonfill = True
         out._content = self._content
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        out._columnar = self._columnar
         return out
 
     def clear(self):
@@ -96,7 +329,12 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
 
     def cleared(self):
         """Return a copy with all bins set to zero."""
-        return Hist(*(self._group + self._fixed + self._profile), weight=self._weightoriginal, filter=self._filteroriginal, defs=dict(self._defs), attachment=dict(self._attachment))        
+        out = Hist(*(self._group + self._fixed + self._profile), weight=self._weightoriginal, filter=self._filteroriginal, defs=dict(self._defs), attachment=dict(self._attachment))
+        out._backend = self._backend
+        out._scheduler = self._scheduler
+        out._pushdown = self._pushdown
+        out._columnar = self._columnar
+        return out
 
     def __init__(self, *axis, **opts):
         u"""
@@ -258,7 +496,7 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
         self._copyonfill = False
 
         if fill is not None:
-            if not histbook.calc.spark.isspark(fill, {}) and not isinstance(fill, dict):
+            if not histbook.calc.isspark(fill, {}) and not isinstance(fill, dict):
                 if len(self._group + self._fixed + self._profile) == 1:
                     fill = {str((self._group + self._fixed + self._profile)[0]._parsed): fill}
                 else:
@@ -318,11 +556,74 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
     def __str__(self, indent=",\n     ", first=""):
         return self.__repr__(indent)
 
+    @property
+    def columnar(self):
+        """If ``True``, the bin arrays of the last :py:class:`GroupAxis <histbook.axis.GroupAxis>` are rows of one stacked array that grows geometrically (see :py:class:`GroupContent <histbook.hist.GroupContent>`), rather than one array per key; default is ``False``. Content is still a dict of key \u2192 Numpy array either way, but fills, sums, and scaling with many keys are single operations on the stack. Setting it converts existing content."""
+        return self._columnar
+
+    @columnar.setter
+    def columnar(self, value):
+        value = bool(value)
+        if value != self._columnar and len(self._group) > 0 and self._content is not None:
+            self._content = self._restack(0, self._content, value)
+        self._columnar = value
+
+    def _restack(self, j, content, columnar):
+        if j + 1 < len(self._group):
+            return type(content)((n, self._restack(j + 1, x, columnar)) for n, x in content.items())
+        elif columnar:
+            return GroupContent(content, self._shape, self.COUNTTYPE)
+        elif isinstance(self._group[j], histbook.axis.groupby) and self._group[j].keeporder:
+            return collections.OrderedDict((n, x.copy()) for n, x in content.items())
+        else:
+            return dict((n, x.copy()) for n, x in content.items())
+
     @property
     def shape(self):
         """Shape of the Numpy array defining the content of the fixed-memory axes (:py:class:`FixedAxis <histbook.axis.FixedAxis>`) only."""
         return self._shape
 
+    @property
+    def nbytes(self):
+        """Approximate number of bytes used by the content: bin arrays (with their Python object overhead) and, for :py:class:`GroupAxis <histbook.axis.GroupAxis>` axes, the dicts that hold them and their keys."""
+        return self._memory(self._content)["nbytes"]
+
+    def _memory(self, content):
+        # walks nested dicts of group axes down to the arrays of fixed axes and profiles
+        groups = [[0, 0] for x in self._group]      # dict overhead and key bytes at each level of grouping
+        arrays = [0, 0, 0]                          # number of arrays, their data, and their object overhead
+
+        def recurse(j, node):
+            if isinstance(node, numpy.ndarray):
+                arrays[0] += 1
+                arrays[1] += node.nbytes
+                arrays[2] += sys.getsizeof(node) - (node.nbytes if node.base is None else 0)
+            elif isinstance(node, GroupContent):
+                # one stack (including unused capacity) and a view for each key
+                groups[j][0] += sys.getsizeof(node) + sys.getsizeof(node._index) + sys.getsizeof(node._keys)
+                groups[j][1] += sum(sys.getsizeof(key) for key in node)
+                if node._stack is not None:
+                    arrays[0] += 1
+                    arrays[1] += node._stack.nbytes
+                    arrays[2] += sys.getsizeof(node._stack) - node._stack.nbytes + sum(sys.getsizeof(x) for x in node.values())
+            elif isinstance(node, dict):
+                groups[j][0] += sys.getsizeof(node)
+                for key, value in node.items():
+                    groups[j][1] += sys.getsizeof(key)
+                    recurse(j + 1, value)
+
+        if content is not None:
+            recurse(0, content)
+
+        axes = [(repr(axis), overhead + keys) for axis, (overhead, keys) in zip(self._group, groups)]
+        axes.append(("bins", arrays[1] + arrays[2]))
+        return {"nbytes": sum(x for n, x in axes),
+                "arrays": arrays[0],
+                "arraybytes": arrays[1],
+                "overhead": arrays[2] + sum(overhead for overhead, keys in groups),
+                "keybytes": sum(keys for overhead, keys in groups),
+                "axes": axes}
+
     def _streamline(self, i, instructions):
         for instruction in instructions:
             if isinstance(instruction, histbook.instr.Export):
@@ -352,9 +653,10 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
             self._content = Hist._copycontent(self._content)
             self._copyonfill = False
 
-        if histbook.calc.spark.isspark(arrays, more):
+        if histbook.calc.isspark(arrays, more):
             # pyspark.DataFrame
-            wait = histbook.calc.spark.fillspark(self, arrays)
+            from histbook.calc import spark
+            wait = spark.fillspark(self, arrays)
             self._prefill()
             wait()
 
@@ -375,50 +677,92 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
 
             self._prefill()
 
-            length = self._fill(arrays)
-            self._postfill(arrays, length)
+            self._fill(arrays)
+            self._reclaim()
+
+    def _newcontent(self):
+        if len(self._group) == 0:
+            return numpy.zeros(self._shape, dtype=self.COUNTTYPE)
+
+        elif len(self._group) == 1 and self._columnar:
+            return GroupContent(shape=self._shape, dtype=self.COUNTTYPE)
+
+        elif isinstance(self._group[0], histbook.axis.groupby) and self._group[0].keeporder:
+            return collections.OrderedDict()
+
+        else:
+            return {}
 
     def _prefill(self):
         if self._content is None:
-            if len(self._group) == 0:
-                self._content = numpy.zeros(self._shape, dtype=self.COUNTTYPE)
+            self._content = self._newcontent()
 
-            elif isinstance(self._group[0], histbook.axis.groupby) and self._group[0].keeporder:
-                self._content = collections.OrderedDict()
+    def _postfill(self, arrays, length, backend="numpy"):
+        self._accumulate(self._content, self._destination[0], length, backend)
+
+        for j in range(len(self._destination[0])):
+            self._destination[0][j] = None
+
+    def _subcontent(self, j, content, unique):
+        if unique not in content:
+            if j + 1 == len(self._group):
+                if isinstance(content, GroupContent):
+                    content._append([unique])
+                else:
+                    content[unique] = numpy.zeros(self._shape, dtype=self.COUNTTYPE)
+
+            elif j + 2 == len(self._group) and self._columnar:
+                content[unique] = GroupContent(shape=self._shape, dtype=self.COUNTTYPE)
+
+            elif isinstance(self._group[j + 1], histbook.axis.groupby) and self._group[j + 1].keeporder:
+                content[unique] = collections.OrderedDict()
 
             else:
-                self._content = {}
+                content[unique] = {}
+
+        return content[unique]
+
+    def _allcombinations(self, j, content, uniques):
+        # nested groups get every combination of the keys seen in a fill, even if empty
+        for unique in uniques[j]:
+            sub = self._subcontent(j, content, unique)
+            if j + 1 < len(self._group):
+                self._allcombinations(j + 1, sub, uniques)
+
+    def _accumulate(self, content, destination, length, backend="numpy"):
+        if backend == "numba" and self._fusedaccumulate(content, destination, length):
+            return
+        destination = [x.indexes() if isinstance(x, histbook.calc.Unbinned) else x for x in destination]
 
-    def _postfill(self, arrays, length):
         j = len(self._group)
         step = 0
         indexes = None
         for axis in self._fixed:
             if step == 0:
-                indexes = self._destination[0][j]
+                indexes = destination[j]
             elif step == 1:
                 indexes = indexes.copy()
             if step > 0:
-                numpy.multiply(indexes, self._shape[axis._shapeindex], indexes)
-                numpy.add(indexes, self._destination[0][j], indexes)
+                numpy.multiply(indexes, self._shape[axis._shapeindex] + 1, indexes)    # + 1 for each axis's trash bin
+                numpy.add(indexes, destination[j], indexes)
             j += 1
             step += 1
 
         axissumx, axissumx2 = [], []
         for axis in self._profile:
-            axissumx.append(self._destination[0][j])
-            axissumx2.append(self._destination[0][j + 1])
+            axissumx.append(destination[j])
+            axissumx2.append(destination[j + 1])
             j += 2
 
         if self._weightparsed is None:
-            weight = 1
+            weight = None
             weight2 = None
         elif isinstance(self._weightparsed, histbook.expr.Const):
-            weight = numpy.ones(length) * self._weightparsed.value
-            weight2 = numpy.ones(length) * self._weightparsed.value**2
+            weight = self._weightparsed.value
+            weight2 = self._weightparsed.value**2
         else:
-            weight = self._destination[0][j]
-            weight2 = self._destination[0][j + 1]
+            weight = destination[j]
+            weight2 = destination[j + 1]
             selection = numpy.isnan(weight)
             if selection.any():
                 weight = weight.copy()
@@ -426,82 +770,114 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
                 weight[selection] = 0.0
                 weight2[selection] = 0.0
 
-        def fillblock(content, indexes, axissumx, axissumx2, weight, weight2):
+        def fillblock(content, indexes, axissumx, axissumx2, weight, weight2, length):
+            columns = []
             for sumx, sumx2, axis in zip(axissumx, axissumx2, self._profile):
-                if indexes is None:
-                    indexes = numpy.ma.zeros(len(sumx), dtype=histbook.calc.INDEXTYPE)
-                if weight2 is not None:
-                    selection = numpy.ma.getmask(indexes)
-                    if selection is not numpy.ma.nomask:
-                        selection = numpy.bitwise_not(selection)
-                        weight = weight[selection]
-                        weight2 = weight2[selection]
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, axis._sumwxindex], indexes.compressed(), sumx * weight)
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, axis._sumwx2index], indexes.compressed(), sumx2 * weight)
-
-            if weight2 is None:
-                if indexes is None:
-                    content.reshape((-1, self._shape[-1]))[:, self._sumwindex] += (1 if length is None else length) * weight
+                if weight is None:
+                    columns.append((axis._sumwxindex, sumx))
+                    columns.append((axis._sumwx2index, sumx2))
                 else:
-                    numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumwindex], indexes.compressed(), weight)
-            else:
-                if indexes is None:
-                    indexes = numpy.ma.zeros(len(weight), dtype=histbook.calc.INDEXTYPE)
-                selection = numpy.ma.getmask(indexes)
-                if selection is not numpy.ma.nomask:
-                    selection = numpy.bitwise_not(selection)
-                    weight = weight[selection]
-                    weight2 = weight2[selection]
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumwindex], indexes.compressed(), weight)
-                numpy.add.at(content.reshape((-1, self._shape[-1]))[:, self._sumw2index], indexes.compressed(), weight2)
-
-        def filldict(j, content, indexes, axissumx, axissumx2, weight, weight2, allselection):
-            if j == len(self._group):
-                fillblock(content, indexes, axissumx, axissumx2, weight, weight2)
-
-            else:
-                uniques, inverse = self._destination[0][j]
-                for idx, unique in enumerate(uniques):
-                    if allselection is None:
-                        selection = (inverse == idx)
-                    else:
-                        selection = (inverse[allselection] == idx)
-                    
-                    if unique not in content:
-                        if j + 1 == len(self._group):
-                            content[unique] = numpy.zeros(self._shape, dtype=self.COUNTTYPE)
-
-                        elif isinstance(self._group[j + 1], histbook.axis.groupby) and self._group[j + 1].keeporder:
-                            content[unique] = collections.OrderedDict()
-
-                        else:
-                            content[unique] = {}
-
-                    subcontent = content[unique]
-                    if indexes is None:
-                        subindexes = numpy.ma.zeros(numpy.count_nonzero(selection), dtype=histbook.calc.INDEXTYPE)
-                    else:
-                        subindexes = indexes[selection]
-                    subaxissumx = [x[selection] for x in axissumx]
-                    subaxissumx2 = [x[selection] for x in axissumx2]
-                    if weight2 is None:
-                        subweight, subweight2 = weight, weight2
-                    else:
-                        subweight = weight[selection]
-                        subweight2 = weight2[selection]
+                    columns.append((axis._sumwxindex, sumx * weight))
+                    columns.append((axis._sumwx2index, sumx2 * weight))
+
+            columns.append((self._sumwindex, weight))
+            if weight2 is not None:
+                columns.append((self._sumw2index, weight2))
+
+            histbook.calc.accumulate(content, indexes, length, columns)
+
+        if len(self._group) == 0:
+            fillblock(content, indexes, axissumx, axissumx2, weight, weight2, length)
+
+        elif len(self._group) == 1 and isinstance(content, GroupContent):
+            # the key's row in the stack is one more dimension of the flattened index (no sorting into runs)
+            uniques, inverse = destination[0]
+            present = numpy.bincount(inverse[inverse >= 0], minlength=len(uniques)) > 0
+            lookup = numpy.empty(len(uniques) + 1, dtype=numpy.intp)
+            lookup[:-1][present] = content._slots([uniques[k] for k in numpy.flatnonzero(present)], add=True)
+            lookup[-1] = len(content)                                                     # trash row for excluded entries
+            if len(content) > 0:
+                combined = lookup[inverse]
+                if indexes is not None:
+                    numpy.multiply(combined, histbook.calc.product([x + 1 for x in self._shape[:-1]]), combined)
+                    numpy.add(combined, indexes, combined)
+                fillblock(content.stack, combined, axissumx, axissumx2, weight, weight2, length)
 
-                    if allselection is None:
-                        suballselection = selection
-                    else:
-                        suballselection = allselection.copy()
-                        suballselection[inverse != idx] = False
+        else:
+            groups = destination[:len(self._group)]
+            order, starts, stops, keys = histbook.calc.groupruns([inverse for uniques, inverse in groups], [len(uniques) for uniques, inverse in groups])
+
+            if indexes is not None:
+                indexes = indexes[order]
+            axissumx = [x[order] for x in axissumx]
+            axissumx2 = [x[order] for x in axissumx2]
+            if isinstance(weight, numpy.ndarray):
+                weight = weight[order]
+                weight2 = weight2[order]
+
+            if len(self._group) > 1:
+                self._allcombinations(0, content, [uniques for uniques, inverse in groups])
+
+            for run, (start, stop) in enumerate(zip(starts, stops)):
+                subcontent = content
+                for j, (uniques, inverse) in enumerate(groups):
+                    subcontent = self._subcontent(j, subcontent, uniques[keys[j][run]])
+
+                run = slice(start, stop)
+                fillblock(subcontent,
+                          None if indexes is None else indexes[run],
+                          [x[run] for x in axissumx],
+                          [x[run] for x in axissumx2],
+                          weight[run] if isinstance(weight, numpy.ndarray) else weight,
+                          weight2[run] if isinstance(weight2, numpy.ndarray) else weight2,
+                          stop - start)
+
+    def _fusedaccumulate(self, content, destination, length):
+        if len(self._group) != 0 or not all(isinstance(axis, (histbook.axis.bin, histbook.axis.intbin, histbook.axis.split, histbook.axis.cut)) for axis in self._fixed) or not content.flags.c_contiguous:
+            return False
 
-                    filldict(j + 1, subcontent, subindexes, subaxissumx, subaxissumx2, subweight, subweight2, suballselection)
+        if self._weightparsed is None:
+            weighting, weight, weight2 = 0, 0.0, 0.0
+        elif isinstance(self._weightparsed, histbook.expr.Const):
+            weighting, weight, weight2 = 1, float(self._weightparsed.value), float(self._weightparsed.value)**2
+        else:
+            weighting, weight, weight2 = 2, destination[-2], destination[-1]
+
+        # axes whose values the plan left unbinned are binned by the kernel, unless it can't do so exactly for their type
+        binnings, binargs = [], []
+        for x in destination[:len(self._fixed)]:
+            binning = x.binning() if isinstance(x, histbook.calc.Unbinned) else None
+            if binning is None:
+                values = x.indexes() if isinstance(x, histbook.calc.Unbinned) else x
+                binnings.append(("index",))
+                binargs.append([values])
+            else:
+                binnings.append(binning[0])
+                binargs.append([x.values] + binning[1])
+
+        arrays = [x[0] for x in binargs] + destination[len(self._fixed) : len(self._fixed) + 2*len(self._profile)]
+        if weighting == 2:
+            arrays = arrays + [weight, weight2]
+        if not all(isinstance(x, numpy.ndarray) and len(x.shape) == 1 and x.dtype.kind in ("b", "i", "u", "f") for x in arrays):
+            return False
+
+        kernel = histbook.calc.fusedkernel(tuple(binnings), len(self._profile), weighting)
+        if kernel is None:
+            return False
+
+        totbins = [self._shape[axis._shapeindex] for axis in self._fixed]
+        strides = [histbook.calc.product(totbins[k + 1:]) for k in range(len(totbins))]
+        args = [content.reshape((-1, content.shape[-1])), length]
+        for k in range(len(self._fixed)):
+            args.extend([totbins[k], strides[k]] + binargs[k])
+        for k in range(len(self._profile)):
+            args.extend(destination[len(self._fixed) + 2*k : len(self._fixed) + 2*k + 2])
+        args.extend([weight, weight2, self._sumwindex, getattr(self, "_sumw2index", 0)])
+        for axis in self._profile:
+            args.extend([axis._sumwxindex, axis._sumwx2index])
 
-        filldict(0, self._content, indexes, axissumx, axissumx2, weight, weight2, None)
-
-        for j in range(len(self._destination[0])):
-            self._destination[0][j] = None
+        kernel(*args)
+        return True
 
     def __add__(self, other):
         if not isinstance(other, Hist):
@@ -523,6 +899,9 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
             elif isinstance(selfcontent, numpy.ndarray) and isinstance(othercontent, numpy.ndarray):
                 return selfcontent + othercontent
 
+            elif isinstance(selfcontent, GroupContent):
+                return selfcontent.copy()._add(othercontent if isinstance(othercontent, GroupContent) else GroupContent(othercontent))
+
             else:
                 assert isinstance(selfcontent, dict) and isinstance(othercontent, dict)
                 out = {}
@@ -548,38 +927,42 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
         if self._group + self._fixed + self._profile != other._group + other._fixed + other._profile:
             raise TypeError("histograms can only be added to other histograms with the same axis specifications")
 
-        def add(selfcontent, othercontent):
-            assert isinstance(selfcontent, dict) and isinstance(othercontent, dict)
-            for n in selfcontent:
-                if n in othercontent:
-                    if isinstance(selfcontent[n], numpy.ndarray):
-                        selfcontent[n] += othercontent[n]
-                    else:
-                        add(selfcontent[n], othercontent[n])
-            for n in othercontent:
-                if n not in selfcontent:
-                    selfcontent[n] = Hist._copycontent(othercontent[n])
+        self._content = self.__class__._addcontent(self._content, other._content)
+        return self
 
-        if other._content is None:
-            pass
+    @classmethod
+    def _addcontent(cls, selfcontent, othercontent):
+        # in-place if possible
+        if othercontent is None:
+            return selfcontent
 
-        elif self._content is None:
-            self._content = Hist._copycontent(other._content)
+        elif selfcontent is None:
+            return cls._copycontent(othercontent)
 
-        elif isinstance(self._content, numpy.ndarray):
-            self._content += other._content
+        elif isinstance(selfcontent, numpy.ndarray):
+            selfcontent += othercontent
+            return selfcontent
 
-        else:
-            add(self._content, other._content)
+        elif isinstance(selfcontent, GroupContent):
+            return selfcontent._add(othercontent if isinstance(othercontent, GroupContent) else GroupContent(othercontent))
 
-        return self
+        else:
+            assert isinstance(selfcontent, dict) and isinstance(othercontent, dict)
+            for n, x in othercontent.items():
+                if n in selfcontent:
+                    selfcontent[n] = cls._addcontent(selfcontent[n], x)
+                else:
+                    selfcontent[n] = cls._copycontent(x)
+            return selfcontent
 
     def __mul__(self, value):
         if not isinstance(value, (numbers.Real, numpy.integer, numpy.floating)):
             raise TypeError("Hist can only be multiplied by a scalar number.")
 
         def recurse(content):
-            if isinstance(content, dict):
+            if isinstance(content, GroupContent):
+                return content.copy()._scale(value)
+            elif isinstance(content, dict):
                 return dict((n, recurse(x)) for n, x in content.items())
             else:
                 return content * value
@@ -597,7 +980,9 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
             raise TypeError("Hist can only be multiplied by a scalar number.")
 
         def recurse(content):
-            if isinstance(content, dict):
+            if isinstance(content, GroupContent):
+                content._scale(value)
+            elif isinstance(content, dict):
                 for x in content.values():
                     recurse(x)
             else:
@@ -739,6 +1124,9 @@ class Hist(histbook.fill.Fillable, histbook.proj.Projectable, histbook.export.Ex
         packed, weight, filter, defs, content, attachment = state
         self.__init__(*[histbook.axis.Axis._unpack(x) for x in packed], weight=weight, filter=filter, defs=defs, attachment=attachment)
         self._content = content
+        while isinstance(content, dict) and not isinstance(content, GroupContent) and len(content) > 0:
+            content = next(iter(content.values()))
+        self._columnar = isinstance(content, GroupContent)
 
     def __eq__(self, other):
         def recurse(one, two):
@@ -28,7 +28,8 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import functools
+import heapq
+import weakref
 
 import histbook.expr
 
@@ -114,9 +115,29 @@ class CallGraphNode(object):
         """Rename all :py:class:`Names <histbook.expr.Name>` and :py:class:`Predicates <histbook.expr.Predicate>` in the graph using ``names`` (dict) mapping old names to new names."""
         return self.goal.rename(names)
 
+_trees = {}    # id(expr) -> (weak reference to expr, tree)
+
 def totree(expr):
     """Simplifies ``expr`` (:py:class:`Expr <histbook.expr.Expr>`) to contain only constants (:py:class:`Const <histbook.expr.Const>`), names (:py:class:`Name <histbook.expr.Name>` and :py:class:`Predicate <histbook.expr.Predicate>`), and function calls (:py:class:`Call <histbook.expr.Call>`)."""
 
+    # expressions are immutable and interned, so results can be remembered for as long as the expression lives;
+    # they're remembered by identity, not equality, because x + 1 == x + 1.0 but their trees have different constants
+    if not isinstance(expr, histbook.expr.Expr):
+        return _totree(expr)
+    key = id(expr)
+    remembered = _trees.get(key, None)
+    if remembered is not None and remembered[0]() is expr:
+        return remembered[1]
+
+    out = _totree(expr)
+    if out is not expr:
+        def forget(ref):
+            if _trees.get(key, (None,))[0] is ref:
+                _trees.pop(key, None)
+        _trees[key] = (weakref.ref(expr, forget), out)
+    return out
+
+def _totree(expr):
     def linear(fcn, args):
         if len(args) == 1:
             return args[0]
@@ -236,26 +257,99 @@ class CallGraphGoal(CallGraphNode):
 
 def sources(goals, table):
     """Returns the sources (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) in a set of ``goals`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) given a ``table`` (dict) filled with :py:meth:`CallGraphNode.grow <histbook.instr.CallGraphNode.grow>`."""
-    return functools.reduce(set.union, (x.sources(table) for x in goals), set())
+    out = set()
+    for x in goals:
+        out.update(x.sources(table))
+    return out
 
 def walkdown(sources):
     """Generator for an ordered walk from ``sources`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) to goals (:py:class:`CallGraphGoal <histbook.instr.CallGraphGoal>`) that steps through nodes required by the most goals first."""
     seen = set()
-    def recurse(node):
-        if node not in seen:
-            seen.add(node)
-            yield node
-
-            pairs = [(x.numrequiredby, x) for x in node.requiredby]
-            pairs.sort(reverse=True)
-            for num, x in pairs:
-                if all(y in seen for y in x.requires):
-                    for y in recurse(x):
-                        yield y
+    waiting = {}     # node -> number of its requirements not yet seen
+
+    def visit(node):
+        seen.add(node)
+        for x in node.requiredby:
+            waiting[x] = waiting.get(x, len(x.requires)) - 1
+        pairs = [(x.numrequiredby, x) for x in node.requiredby]
+        pairs.sort(reverse=True)
+        return iter(pairs)
 
     for source in [x for x in sources if not isinstance(x.goal, histbook.expr.BroadcastConst)] + [x for x in sources if isinstance(x.goal, histbook.expr.BroadcastConst)]:
-        for x in recurse(source):
-            yield x
+        if source in seen:
+            continue
+        stack = [visit(source)]
+        yield source
+
+        # depth-first with an explicit stack: a node is entered as soon as all of its requirements have been seen
+        while len(stack) > 0:
+            for num, x in stack[-1]:
+                if x not in seen and waiting[x] == 0:
+                    stack.append(visit(x))
+                    yield x
+                    break
+            else:
+                stack.pop()
+
+def minlive(sources):
+    """Generator for an ordered walk from ``sources`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) to goals (:py:class:`CallGraphGoal <histbook.instr.CallGraphGoal>`) that keeps as few intermediate arrays alive at once as it can.
+
+    This is greedy list scheduling, as in register allocation: among the nodes whose requirements have all been seen, take the one that adds the fewest live arrays (a new array, minus the arguments for which it is the last use), breaking ties in favor of nodes that were most recently made ready or whose co-arguments were most recently computed, so that subexpressions are finished before new parameters are brought in. Finding the true minimum is NP-hard; see :py:func:`peaklive <histbook.instr.peaklive>` for the resulting peak.
+    """
+    remaining = {}   # node -> number of nodes that require it and haven't been seen
+    waiting = {}     # node -> number of its requirements not yet seen
+    stamp = {}       # node -> last step at which it was made ready or a co-argument was computed
+    seen = set()
+    heap = []
+    counter = [0]
+
+    def key(node):
+        delta = 1 if len(node.requiredby) > 0 else 0
+        for x in node.requires:
+            if remaining[x] == 1:
+                delta -= 1
+        return (delta, -stamp[node], -node.numrequiredby)
+
+    def push(node):
+        heapq.heappush(heap, (key(node), counter[0], node))
+        counter[0] += 1
+
+    sources = sorted(sources)
+    for source in sources:
+        remaining[source] = len(source.requiredby)
+        stamp[source] = -1
+        push(source)
+
+    step = 0
+    while len(heap) > 0:
+        k, num, node = heapq.heappop(heap)
+        if node in seen or k != key(node):
+            continue      # stale entry: a fresher one has been pushed
+        seen.add(node)
+        yield node
+
+        for x in node.requires:
+            remaining[x] -= 1
+            if remaining[x] == 1:
+                for y in x.requiredby:
+                    if y not in seen and waiting[y] == 0:
+                        push(y)      # y is now the last use of x
+
+        for x in node.requiredby:
+            waiting[x] = waiting.get(x, len(x.requires)) - 1
+            if waiting[x] == 0:
+                remaining[x] = len(x.requiredby)
+                stamp[x] = step
+                push(x)
+            else:
+                for y in x.requires:
+                    if y not in seen and waiting.get(y, len(y.requires)) == 0:
+                        stamp[y] = step
+                        push(y)
+
+        step += 1
+
+schedulers = {"walkdown": walkdown, "minlive": minlive}
 
 # def walkdown(sources):
 #     """Generator for an ordered walk from sources (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) to goals (:py:class:`CallGraphGoal <histbook.instr.CallGraphGoal>`) that steps through nodes required by the most goals first."""
@@ -339,8 +433,27 @@ class Delete(Instruction):
     def __str__(self):
         return "delete {0}".format(self.name)
 
-def instructions(sources, goals):
-    """Returns an ordered sequence of instructions (:py:class:`Instruction <histbook.instr.Instruction>`), given a set of ``sources`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) and a set of ``goals`` (:py:class:`CallGraphGoal <histbook.instr.CallGraphGoal>`)."""
+def bygroup(nodes, groups):
+    """Reorders a scheduled sequence of ``nodes`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) so that the goals in each of ``groups`` (list of collections of goal expressions) are finished before work for the next group begins.
+
+    Each node is moved to the first group that needs it, keeping the scheduler's order within a group. This is still a valid order because every group that needs a node also needs all of its requirements. Nodes that no group needs come last.
+    """
+    bygoal = dict((node.goal, node) for node in nodes)
+    stage = {}
+    for k, group in enumerate(groups):
+        stack = [bygoal[x] for x in group if x in bygoal]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node not in stage:
+                stage[node] = k
+                stack.extend(node.requires)
+
+    return sorted(nodes, key=lambda node: stage.get(node, len(groups)))
+
+def instructions(sources, goals, scheduler=walkdown, groups=None):
+    """Returns an ordered sequence of instructions (:py:class:`Instruction <histbook.instr.Instruction>`), given a set of ``sources`` (:py:class:`CallGraphNode <histbook.instr.CallGraphNode>`) and a set of ``goals`` (:py:class:`CallGraphGoal <histbook.instr.CallGraphGoal>`), in the order given by ``scheduler`` (:py:func:`walkdown <histbook.instr.walkdown>` or :py:func:`minlive <histbook.instr.minlive>`).
+
+    If ``groups`` (list of collections of goal expressions, such as one per histogram) is given, all goals in each group are reached before any node that only later groups need (see :py:func:`bygroup <histbook.instr.bygroup>`)."""
 
     live = {}
     names = {}
@@ -351,7 +464,20 @@ def instructions(sources, goals):
         live[name] = node
         return name
 
-    nodes = list(walkdown(sources))
+    nodes = list(scheduler(sources))
+    if groups is not None:
+        nodes = bygroup(nodes, groups)
+
+    # a node's value is dead after the last node that requires it (or immediately, if nothing does)
+    lastuse = {}
+    for j, node in enumerate(nodes):
+        lastuse[node] = j
+        for x in node.requires:
+            lastuse[x] = j
+    deaths = [[] for node in nodes]
+    for node in nodes:
+        deaths[lastuse[node]].append(node)
+
     for i, node in enumerate(nodes):
         if isinstance(node.goal, histbook.expr.Const):
             pass
@@ -372,10 +498,38 @@ def instructions(sources, goals):
         if node in goals:
             yield Export(name, node.goal)
 
-        dead = []
-        for n, x in live.items():
-            if not any(x in nodes[j].requires for j in range(i + 1, len(nodes))):
-                dead.append(n)
-        for n in dead:
-            del live[n]
-            yield Delete(n)
+        for x in deaths[i]:
+            if x.goal in names:
+                del live[names[x.goal]]
+                yield Delete(names[x.goal])
+
+def peaklive(instructions):
+    """Returns the maximum number of variables (full-length arrays) alive at once in an ordered sequence of ``instructions`` (:py:class:`Instruction <histbook.instr.Instruction>`).
+
+    If the :py:class:`Exports <histbook.instr.Export>` have a ``destination``, an exported variable stays alive after it is deleted until the last export into each of its destination rows, when that histogram is filled.
+    """
+    lastexport = {}
+    for index, instruction in enumerate(instructions):
+        if isinstance(instruction, Export):
+            for i, j in getattr(instruction, "destination", ()):
+                lastexport[i] = index
+
+    held = {}
+    for instruction in instructions:
+        if isinstance(instruction, Export) and len(getattr(instruction, "destination", ())) > 0:
+            held[instruction.name] = max(lastexport[i] for i, j in instruction.destination)
+
+    live = 0
+    peak = 0
+    released = {}
+    for index, instruction in enumerate(instructions):
+        if isinstance(instruction, (Param, Assign)):
+            live += 1
+            peak = max(peak, live)
+        elif isinstance(instruction, Delete):
+            if held.get(instruction.name, -1) > index:
+                released[held[instruction.name]] = released.get(held[instruction.name], 0) + 1
+            else:
+                live -= 1
+        live -= released.pop(index, 0)
+    return peak
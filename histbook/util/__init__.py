@@ -28,7 +28,9 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import collections
 import sys
+import threading
 
 if sys.version_info[0] <= 2:
     string = basestring
@@ -45,3 +47,48 @@ class ChainedDict(object):
             return self._two[n]    # and it has precedence
         else:
             return self._one[n]    # self._one might only have __getitem__
+
+class LRUCache(object):
+    """Bounded, thread-safe, least-recently-used cache that counts ``hits`` and ``misses``; setting ``maxsize`` to ``0`` disables it."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return "<{0} {1}/{2} entries, {3} hits, {4} misses>".format(self.__class__.__name__, len(self._cache), self.maxsize, self.hits, self.misses)
+
+    @property
+    def hitrate(self):
+        """Fraction of lookups since the last ``clear`` that were hits (``0.0`` if there were none)."""
+        total = self.hits + self.misses
+        return 0.0 if total == 0 else float(self.hits) / total
+
+    def get(self, key):
+        """Returns the cached value for ``key`` or ``None``, counting a hit or a miss."""
+        with self._lock:
+            out = self._cache.pop(key, None)
+            if out is None:
+                self.misses += 1
+            else:
+                self._cache[key] = out     # most recently used is last
+                self.hits += 1
+            return out
+
+    def put(self, key, value):
+        """Adds ``value`` for ``key``, evicting the least recently used entries beyond ``maxsize``."""
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > max(self.maxsize, 0):
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries and resets the statistics."""
+        with self._lock:
+            self._cache = collections.OrderedDict()
+            self.hits = 0
+            self.misses = 0
@@ -32,6 +32,8 @@ import unittest
 
 import numpy
 
+import histbook.calc
+import histbook.fill
 from histbook.axis import *
 from histbook.hist import *
 from histbook.book import *
@@ -55,6 +57,549 @@ class TestBook(unittest.TestCase):
         self.assertEqual(b["one"]._content.tolist(), [[3], [2]])
         self.assertEqual(b["two"]._content.tolist(), [[3], [2]])
 
+    def test_plan(self):
+        b = Book()
+        b["one"] = Hist(bin("x", 2, 0, 3, underflow=False, overflow=False, nanflow=False))
+        b["two"] = Hist(bin("sqrt(x**2 + y**2)", 2, 0, 3, underflow=False, overflow=False, nanflow=False), weight="y")
+        b.fill(x=[1, 1, 1, 2, 2], y=[0, 0, 0, 1, 1])
+        plan = b._plan
+        b.fill(x=[1, 1, 1, 2, 2], y=[0, 0, 0, 1, 1])
+        self.assertIs(b._plan, plan)
+        self.assertEqual(b["one"]._content.tolist(), [[6], [4]])
+        self.assertEqual(b["two"]._content.tolist(), [[0, 0], [4, 4]])
+
+        b["three"] = Hist(bin("y", 2, 0, 2, underflow=False, overflow=False, nanflow=False))
+        b.fill(x=[1, 1, 1, 2, 2], y=[0, 0, 0, 1, 1])
+        self.assertIsNot(b._plan, plan)
+        self.assertEqual(b["one"]._content.tolist(), [[9], [6]])
+        self.assertEqual(b["three"]._content.tolist(), [[3], [2]])
+
+        self.assertRaises(ValueError, lambda: b.fill(x=[1, 1, 1, 2, 2]))
+
+    def test_plan_inplace(self):
+        import histbook.fill
+        numpy.random.seed(12345)
+        arrays = {"x": numpy.random.normal(0, 1, 1000), "y": numpy.random.normal(0, 1, 1000), "q": numpy.random.randint(-3, 3, 1000)}
+        b = Book()
+        b["one"] = Hist(bin("sqrt(x**2 + y**2) * (q + 1)", 10, 0, 5), weight="x*2 + 1")
+        b["two"] = Hist(intbin("q*2 - 1", -5, 5), profile("exp(-(x**2)) / (1 + q**2)"), filter="q > 0 and x < 1")
+        b.fields
+
+        plan = histbook.fill.FillPlan(b._instructions)
+        self.assertTrue(any(step[0] == plan.UFUNC and len(step[5]) > 0 for step in plan._steps))
+        before = dict((n, x.copy()) for n, x in arrays.items())
+        results = []
+        for p in plan, histbook.fill.FillPlan(b._instructions, inplace=False):
+            destination = [[None] * len(x) for x in b._destination]
+            p.run(arrays, destination)
+            p.run(arrays, destination)
+            results.append(destination)
+        for x, y in zip(sum(results[0], []), sum(results[1], [])):
+            if isinstance(x, numpy.ndarray):
+                self.assertTrue(numpy.array_equal(x, y))
+        for n in arrays:
+            self.assertTrue(numpy.array_equal(arrays[n], before[n]))
+
+    def test_shortcircuit(self):
+        import histbook.fill
+        numpy.random.seed(12345)
+        arrays = dict((n, numpy.random.normal(0, 1, 1000)) for n in "abcd")
+        arrays["n"] = numpy.random.randint(0, 4, 1000)
+        arrays["a"][::5] = numpy.nan
+        contents = []
+        for shortcircuit in True, False:
+            h = Hist(bin("where(n > 2, sqrt(abs(a)) * cos(b) + exp(c) * d, n)", 10, -3, 3), profile("a + b"), filter="(n > 2) and (exp(d) * sin(c) + a * b * c > 0)")
+            h.fields
+            h._plan = histbook.fill.FillPlan(h._instructions, shortcircuit=shortcircuit)
+            h.fill(arrays)
+            lazy = [step for step in h._plan._steps if len(step) > 2 and isinstance(step[2], histbook.fill._LazyCall)]
+            self.assertEqual(len(lazy) > 0, shortcircuit)
+            contents.append(h._content)
+        self.assertTrue(numpy.allclose(contents[0], contents[1], equal_nan=True))
+
+    def test_bufferpool(self):
+        numpy.random.seed(12345)
+        arrays = {"x": numpy.random.normal(0, 1, 1000), "y": numpy.random.normal(0, 1, 1000)}
+        b = Book()
+        b["one"] = Hist(bin("sqrt(x**2 + y**2) * y", 10, 0, 5), weight="x*2 + 1")
+        b["two"] = Hist(groupby("2"), bin("1.5", 3, 0, 3), profile("exp(-(x**2))"))
+        self.assertEqual(b.fields, ["x", "y"])
+        expect = b.cleared()
+        expect.poolsize = 0
+
+        for i in range(3):
+            b.fill(arrays)
+            expect.fill(arrays)
+        b.fill(x=arrays["x"][:10], y=arrays["y"][:10])
+        expect.fill(x=arrays["x"][:10], y=arrays["y"][:10])
+        self.assertTrue(0 < b._pool.nbytes <= b.poolsize)
+        self.assertIsNone(expect._pool)
+        self.assertTrue(numpy.array_equal(b["one"]._content, expect["one"]._content))
+        self.assertTrue(numpy.array_equal(b["two"]._content[2], expect["two"]._content[2]))
+        self.assertEqual(b["two"]._content[2][2, 2], 3010)
+
+        b.poolsize = 10000
+        for i in range(3):
+            b.fill(arrays)
+        self.assertTrue(b._pool.nbytes <= 10000)
+        self.assertRaises(TypeError, lambda: setattr(b, "poolsize", -1))
+
+    def test_fillchunks(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 10000)
+        y = numpy.random.randint(0, 5, 10000)
+
+        expect = Book()
+        expect["one"] = Hist(bin("x", 10, -3, 3), weight="y")
+        expect["two"] = Hist(groupby("y"), profile("x"))
+        expect.fill(x=x, y=y)
+
+        def chunks(sizes):
+            scratch = {"x": numpy.empty(max(sizes)), "y": numpy.empty(max(sizes), dtype=y.dtype)}
+            start = 0
+            for size in sizes:
+                scratch["x"][:size] = x[start : start + size]      # generator reuses its own buffers
+                scratch["y"][:size] = y[start : start + size]
+                yield {"x": scratch["x"][:size], "y": scratch["y"][:size], "unused": None}
+                start += size
+
+        sizes = [1, 2, 3000, 7, 1, 999, 5990]
+        for chunksize in (None, 1000, 37, 20000):
+            b = expect.cleared()
+            b.fillchunks(chunks(sizes), chunksize=chunksize)
+            self.assertTrue(numpy.allclose(b["one"]._content, expect["one"]._content))
+            self.assertEqual(set(b["two"]._content), set(expect["two"]._content))
+            for n in expect["two"]._content:
+                self.assertTrue(numpy.allclose(b["two"]._content[n], expect["two"]._content[n]))
+
+        h = Hist(bin("x", 10, -3, 3))
+        h.fillchunks(({"x": x[i : i + 100]} for i in range(0, 10000, 100)), chunksize=256)
+        self.assertEqual(h._content.sum(), 10000)
+        self.assertRaises(TypeError, lambda: h.fillchunks([], chunksize=0))
+
+    def test_fillparallel(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 10000)
+        y = numpy.random.randint(0, 5, 10000)
+        z = numpy.random.randint(0, 3, 10000)
+
+        expect = Book()
+        expect["one"] = Hist(bin("x", 10, -3, 3), weight="y")
+        expect["two"] = Hist(groupby("y"), profile("x"))
+        expect["three"] = Hist(groupby("y"), groupby("z"), bin("x", 5, -3, 3))
+        expect.fill(x=x, y=y, z=z)
+
+        for nthreads in (1, 3, 8):
+            b = expect.cleared()
+            b.fillparallel(x=x, y=y, z=z, nthreads=nthreads)
+            self.assertTrue(numpy.allclose(b["one"]._content, expect["one"]._content))
+            self.assertEqual(set(b["two"]._content), set(expect["two"]._content))
+            for n in expect["two"]._content:
+                self.assertTrue(numpy.allclose(b["two"]._content[n], expect["two"]._content[n]))
+            self.assertEqual(set(b["three"]._content), set(expect["three"]._content))
+            for n in expect["three"]._content:
+                self.assertEqual(set(b["three"]._content[n]), set(expect["three"]._content[n]))
+                for m in expect["three"]._content[n]:
+                    self.assertTrue(numpy.array_equal(b["three"]._content[n][m], expect["three"]._content[n][m]))
+
+        h = Hist(bin("x", 10, -3, 3))
+        h.fillparallel({"x": x}, nthreads=4)
+        h.fillparallel({"x": 0.5}, nthreads=4)
+        self.assertEqual(h._content.sum(), 10001)
+        self.assertRaises(TypeError, lambda: h.fillparallel(x=x, nthreads=0))
+        self.assertRaises(ValueError, lambda: h.fillparallel(y=y, nthreads=2))
+
+    def test_fillprocesses(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 10000)
+        y = numpy.random.randint(0, 5, 10000)
+        z = numpy.array(["a", "b", "c"], dtype=object)[numpy.random.randint(0, 3, 10000)]
+
+        expect = Book()
+        expect["one"] = Hist(bin("x", 10, -3, 3), weight="y")
+        expect["two"] = Hist(groupby("y"), groupby("z"), profile("x"))
+        expect.fill(x=x, y=y, z=z)
+
+        b = expect.cleared()
+        b.fillprocesses(x=x, y=y, z=z, nprocesses=3)
+        self.assertTrue(numpy.allclose(b["one"]._content, expect["one"]._content))
+        self.assertEqual(set(b["two"]._content), set(expect["two"]._content))
+        for n in expect["two"]._content:
+            self.assertEqual(set(b["two"]._content[n]), set(expect["two"]._content[n]))
+            for m in expect["two"]._content[n]:
+                self.assertTrue(numpy.allclose(b["two"]._content[n][m], expect["two"]._content[n][m]))
+
+        self.assertRaises(TypeError, lambda: b.fillprocesses(x=x, y=y, z=z, nprocesses=0))
+
+    def backendbook(self):
+        numpy.random.seed(12345)
+        data = {"x": numpy.random.normal(0, 1, 10000), "y": numpy.random.normal(0, 1, 10000), "c": numpy.random.randint(0, 2, 10000).astype(bool)}
+
+        expect = Book()
+        expect["one"] = Hist(bin("sqrt(x**2 + y**2)", 10, 0, 3), profile("x*y + 1"), weight="exp(-x)", filter="x > 0 and y < 2")
+        expect["two"] = Hist(bin("arctan2(y, x)", 10, -4, 4), filter="c or not (x < y)")
+        expect["three"] = Hist(groupby("floor(x)"), bin("abs(x - y)/2", 5, 0, 3))
+
+        expect["four"] = Hist(split("x", [-1, 0, 1]), cut("c"), intbin("floor(y)", -2, 2, overflow=False), weight=2.5)
+        expect["five"] = Hist(profile("y"))
+        expect.fill(**data)
+        return expect, data
+
+    def assertBackend(self, book, expect):
+        for n in "one", "two", "four", "five":
+            self.assertTrue(numpy.allclose(book[n]._content, expect[n]._content))
+        self.assertEqual(set(book["three"]._content), set(expect["three"]._content))
+        for n in expect["three"]._content:
+            self.assertTrue(numpy.array_equal(book["three"]._content[n], expect["three"]._content[n]))
+
+    def test_backend(self):
+        expect, data = self.backendbook()
+        for backend in ("numexpr", "numba"):
+            b = expect.cleared()
+            b.backend = backend
+            self.assertEqual(b.cleared().backend, backend)
+            b.fill(**data)
+            self.assertEqual(b._plan.backend, backend)
+
+        b.backend = None
+        b.fill(**data)
+        self.assertEqual(b._plan.backend, "numpy")
+        self.assertRaises(ValueError, lambda: setattr(b, "backend", "fortran"))
+
+    @unittest.skipIf(histbook.fill._numexpr() is None, "the numexpr backend needs NumExpr")
+    def test_backend_numexpr(self):
+        expect, data = self.backendbook()
+        b = expect.cleared()
+        b.backend = "numexpr"
+        b.fill(**data)
+        self.assertTrue(any(step[0] == histbook.fill.FillPlan.ASSIGN and isinstance(step[2], histbook.fill._NumExprCall) for step in b._plan._steps))
+        self.assertBackend(b, expect)
+
+    @unittest.skipIf(histbook.calc._numba() is None, "the numba backend needs Numba")
+    def test_backend_numba(self):
+        expect, data = self.backendbook()
+        b = expect.cleared()
+        b.backend = "numba"
+
+        fused = {}
+        original = Hist._fusedaccumulate
+        def recording(hist, content, destination, length):
+            unbinned = [isinstance(x, histbook.calc.Unbinned) for x in destination[len(hist._group) : len(hist._group) + len(hist._fixed)]]
+            fused[id(hist)] = (original(hist, content, destination, length), unbinned)
+            return fused[id(hist)][0]
+
+        Hist._fusedaccumulate = recording
+        try:
+            b.fill(**data)
+        finally:
+            Hist._fusedaccumulate = original
+
+        # everything but the groupby histogram is filled by the kernel, which does the binning too
+        self.assertEqual(fused[id(b["one"])], (True, [True]))
+        self.assertEqual(fused[id(b["two"])], (True, [True]))
+        self.assertEqual(fused[id(b["three"])], (False, [True]))
+        self.assertEqual(fused[id(b["four"])], (True, [True, True, True]))
+        self.assertEqual(fused[id(b["five"])], (True, []))
+        self.assertBackend(b, expect)
+
+    def test_scheduler(self):
+        numpy.random.seed(12345)
+        data = dict((n, numpy.random.normal(0, 1, 1000)) for n in "xyzw")
+
+        expect = Book()
+        for i in range(20):
+            expect["h{0}".format(i)] = Hist(bin("x*{0} + y".format(i + 1), 10, 0, 3), weight="w*{0}".format(i + 1), filter="z > {0}".format(i % 2))
+        expect.fill(**data)
+
+        b = expect.cleared()
+        b.scheduler = "minlive"
+        self.assertEqual(b.cleared().scheduler, "minlive")
+        b.fill(**data)
+        for n in expect.keys():
+            self.assertTrue(numpy.array_equal(b[n]._content, expect[n]._content))
+        self.assertEqual(len(b._instructions), len(expect._instructions))
+
+        import histbook.fill
+        import histbook.instr
+        peaks = [histbook.instr.peaklive(histbook.fill._compile(set(b._goals), x)[0]) for x in ("minlive", "walkdown")]
+        self.assertTrue(peaks[0] < peaks[1])
+        self.assertRaises(ValueError, lambda: setattr(b, "scheduler", "random"))
+
+    def test_walkdown(self):
+        import sys
+        import histbook.expr
+        import histbook.instr
+
+        def recursivewalkdown(sources):
+            # walkdown as it was before it used an explicit stack
+            seen = set()
+            def recurse(node):
+                if node not in seen:
+                    seen.add(node)
+                    yield node
+                    pairs = [(x.numrequiredby, x) for x in node.requiredby]
+                    pairs.sort(reverse=True)
+                    for num, x in pairs:
+                        if all(y in seen for y in x.requires):
+                            for y in recurse(x):
+                                yield y
+            for source in [x for x in sources if not isinstance(x.goal, histbook.expr.BroadcastConst)] + [x for x in sources if isinstance(x.goal, histbook.expr.BroadcastConst)]:
+                for x in recurse(source):
+                    yield x
+
+        def compare(sources, goals):
+            expect = list(histbook.instr.instructions(sources, goals, recursivewalkdown))
+            self.assertEqual([str(x) for x in histbook.instr.instructions(sources, goals)], [str(x) for x in expect])
+
+        b = Book()
+        for i in range(10):
+            b["h{0}".format(i)] = Hist(bin("sqrt(x**2 + y**2)*{0} + z".format(i + 1), 10, 0, 3), bin("x*y + {0}".format(i % 3), 5, -3, 3), weight="w*{0}".format(i + 1), filter="z > {0}".format(i % 2))
+        goals = set(b._goals)
+        table = {}
+        for x in goals:
+            x.clear()
+        for x in goals:
+            x.grow(table)
+        compare(histbook.instr.sources(goals, table), goals)
+
+        # a chain deeper than the recursion limit: node k needs node k - 1 and a side branch from the second source
+        depth = sys.getrecursionlimit() + 500
+        node = lambda name: histbook.instr.CallGraphNode(histbook.expr.Name(name))
+        a, c = node("a"), node("c")
+        previous = a
+        goals = set()
+        for k in range(depth):
+            side, chain = node("s{0:05d}".format(k)), node("n{0:05d}".format(k))
+            for x, requires in ((side, [c]), (chain, [previous, side])):
+                for y in requires:
+                    x.requires.add(y)
+                    y.requiredby.add(x)
+                    y.numrequiredby += 1
+            if k % 100 == 0:
+                goals.add(chain)
+                chain.numrequiredby += 1
+            previous = chain
+        goals.add(previous)
+        previous.numrequiredby += 1
+
+        self.assertEqual(len(list(histbook.instr.walkdown([a, c]))), 2*depth + 2)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(4*depth)
+        try:
+            compare([a, c], goals)
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def test_peaklive(self):
+        import histbook.expr
+        import histbook.instr
+        x, y = histbook.expr.Name("x"), histbook.expr.Name("y")
+        plan = [histbook.instr.Param("x0", x),                                         # 1 live
+                histbook.instr.Param("x1", y),                                         # 2 live
+                histbook.instr.Assign("x2", histbook.expr.Call("numpy.add", x, y)),   # 3 live (peak)
+                histbook.instr.Delete("x0"),                                           # 2
+                histbook.instr.Delete("x1"),                                           # 1
+                histbook.instr.Export("x2", histbook.expr.Call("numpy.add", x, y)),
+                histbook.instr.Param("x3", x),                                         # 2
+                histbook.instr.Delete("x2"),                                           # 1
+                histbook.instr.Export("x3", x),
+                histbook.instr.Delete("x3")]                                           # 0
+        self.assertEqual(histbook.instr.peaklive(plan), 3)
+
+        # an exported variable is held after its Delete until its histogram's last export (when the histogram is filled)
+        plan = [histbook.instr.Param("x0", x),                                         # 1
+                histbook.instr.Export("x0", x),
+                histbook.instr.Delete("x0"),                                           # 0, or 1 if held
+                histbook.instr.Param("x1", y),                                         # 1, or 2 if held
+                histbook.instr.Export("x1", y),                                        # x0 released if held
+                histbook.instr.Delete("x1")]                                           # 0
+        self.assertEqual(histbook.instr.peaklive(plan), 1)
+        plan[1].destination = [(0, 0)]
+        plan[4].destination = [(0, 1)]
+        self.assertEqual(histbook.instr.peaklive(plan), 2)
+        plan[4].destination = [(1, 0)]
+        self.assertEqual(histbook.instr.peaklive(plan), 1)
+
+    def test_interleave(self):
+        numpy.random.seed(12345)
+        data = dict((n, numpy.random.normal(0, 1, 1000)) for n in "xyzw")
+
+        b = Book()
+        for i in range(20):
+            b["h{0}".format(i)] = Hist(bin("sqrt(x**2 + y**2)*{0} + z".format(i + 1), 10, 0, 3), bin("x*y + {0}".format(i), 5, -3, 3), weight="exp(w*0.{0})".format(i + 1))
+        b.fill(**data)
+        b.fill(**data)
+        self.assertTrue(b.peakarrays < 20)     # rather than 3 per histogram, if they were all filled at the end
+
+        for n in b.keys():
+            h = b[n].cleared()
+            h.fill(**data)
+            h.fill(**data)
+            self.assertTrue(numpy.allclose(b[n]._content, h._content))
+            self.assertTrue(all(x is None for x in b[n]._destination[0]))
+
+    def test_plancache(self):
+        import histbook.fill
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 1000)
+        y = numpy.random.normal(0, 1, 1000)
+        histbook.fill.plancache.clear()
+
+        samples = SamplesBook(["one", "two", "three"], Book(a=Hist(bin("x + y", 10, -3, 3), weight="exp(-x)"), b=Hist(bin("x*y", 10, -3, 3), filter="x > y")))
+        for name in "one", "two", "three":
+            samples.view(name + "/*").fill(x=x, y=y)
+        self.assertEqual(histbook.fill.plancache.compiles, 1)
+        self.assertEqual(histbook.fill.plancache.hits, 2)
+
+        b = samples["one"].cleared()
+        b.fill(x=x, y=y)
+        self.assertEqual(histbook.fill.plancache.compiles, 1)
+        self.assertTrue(numpy.array_equal(b["0/a"]._content, samples["one/0/a"]._content))
+        self.assertTrue(numpy.array_equal(b["0/b"]._content, samples["three/0/b"]._content))
+
+        b.scheduler = "minlive"
+        b.fields
+        self.assertEqual(histbook.fill.plancache.compiles, 2)
+        self.assertTrue(0 < histbook.fill.plancache.hitrate < 1)
+        self.assertEqual(samples["two/0/b"].fields, ["x", "y"])
+
+    def test_fillprofile(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 1000)
+        y = numpy.random.normal(0, 1, 1000)
+
+        b = Book(one=Hist(bin("x + y", 10, -3, 3)), two=Hist(bin("x + y", 5, -3, 3), weight="y"))
+        self.assertFalse(b.profiling)
+        self.assertEqual(b.fillprofile(), None)
+        b.fill(x=x, y=y)
+
+        b.profiling = True
+        b.fill(x=x, y=y)
+        b.fill(x=x, y=y)
+        b.fillparallel(x=x, y=y, nthreads=2)
+        entries = dict(((e["kind"], e["name"]), e) for e in b.fillprofile().report())
+        self.assertEqual(entries["Param", "x"]["calls"], 4)
+        self.assertEqual(entries["Param", "x"]["bytes"], 0)
+        self.assertEqual(entries["Assign", "numpy.add(x, y)"]["calls"], 4)
+        self.assertEqual(entries["Assign", "numpy.add(x, y)"]["bytes"], x.nbytes)   # fill reuses pooled buffers; fillparallel's threads allocate half each
+        self.assertEqual(entries["postfill", "one"]["calls"], 4)
+        self.assertEqual(entries["postfill", "two"]["calls"], 4)
+        self.assertTrue(b.fillprofile().seconds > 0)
+
+        merged = b.fillprofile() + b.fillprofile()
+        self.assertEqual(merged.entries["postfill", "one"][0], 8)
+        self.assertEqual(sum([b.fillprofile(), b.fillprofile()]).entries, merged.entries)
+
+        b.profiling = False
+        self.assertEqual(b.fillprofile(), None)
+
+        # threads of a first fillparallel share the plan while one of them makes its profile labels
+        import sys
+        if hasattr(sys, "setswitchinterval"):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            try:
+                for i in range(5):
+                    b = Book(dict(("h{0}".format(j), Hist(bin("x*{0} + y".format(j + 1), 10, -3, 3), weight="y*{0}".format(j + 1))) for j in range(20)))
+                    b.profiling = True
+                    b.fillparallel(x=x, y=y, nthreads=8)
+                    self.assertEqual(b.fillprofile().entries["postfill", "h0"][0], 8)
+            finally:
+                sys.setswitchinterval(interval)
+
+    def test_pushdown(self):
+        numpy.random.seed(12345)
+        arrays = {"x": numpy.random.normal(0, 1, 1000), "y": numpy.random.normal(0, 1, 1000), "w": numpy.random.uniform(0, 1, 1000), "c": numpy.arange(1000) % 7}
+
+        def book():
+            b = Book()
+            b["all"] = Hist(bin("x", 10, -3, 3))
+            b["one"] = Hist(bin("x", 10, -3, 3), filter="y > 1")
+            b["two"] = Hist(bin("x + y", 10, -3, 3), profile("w"), weight="w", filter="y > 1")
+            b["three"] = Hist(groupby("c"), bin("x", 10, -3, 3), filter="(y > 1) and (c < 3)")
+            b["none"] = Hist(bin("x", 10, -3, 3), filter="y > 100")
+            return b
+
+        one = book()
+        one.fill(arrays)
+        two = book()
+        two.pushdown = True
+        self.assertEqual(two.fields, one.fields)
+        two.fill(arrays)
+        two.fillparallel(arrays, nthreads=2)
+        one.fillparallel(arrays, nthreads=2)
+
+        self.assertEqual(len(two._plan.subplans), 3)
+        for n in "all", "one", "two", "none":
+            self.assertTrue(numpy.allclose(one[n]._content, two[n]._content))
+        self.assertEqual(set(two["three"]._content), set([0, 1, 2]))
+        for n in 0, 1, 2:
+            self.assertTrue(numpy.allclose(one["three"]._content[n], two["three"]._content[n]))
+        self.assertEqual(two["one"]._content[:, 0].sum(), 2 * (arrays["y"] > 1).sum())
+
+        three = two.cleared()
+        self.assertTrue(three.pushdown)
+        three.pushdown = False
+        three.fill(arrays)
+        self.assertTrue(numpy.allclose(2 * three["two"]._content, one["two"]._content))
+
+        # a filter that is also another histogram's axis must not be overwritten before the filtered histograms use it
+        for pushdown in False, True:
+            b = Book(h1=Hist(bin("y", 4, -2, 2), filter="x > 0"), h2=Hist(cut("x > 0")), h3=Hist(cut("y > 1")))
+            b.pushdown = pushdown
+            b.fill(arrays)
+            b.fill(arrays)
+            if pushdown:
+                for n in b.keys():
+                    self.assertTrue(numpy.array_equal(b[n]._content, expect[n]._content))
+            else:
+                expect = b
+        self.assertEqual(expect["h1"]._content[:, 0].sum(), 2 * (arrays["x"] > 0).sum())
+
+    def test_memoryreport(self):
+        b = Book()
+        b["one"] = Hist(bin("x", 10, -3, 3))
+        b["two/g"] = Hist(groupby("c"), bin("x", 10, -3, 3))
+        self.assertEqual(b.nbytes, 0)
+        self.assertEqual(b.memoryreport()["temporaries"], 0)
+
+        b.fill(x=numpy.arange(1000) % 5, c=numpy.arange(1000) % 100)
+        report = b.memoryreport()
+        self.assertEqual(report["nbytes"], b.nbytes)
+        self.assertEqual(report["nbytes"], b["one"].nbytes + b["two/g"].nbytes)
+        self.assertEqual(report["chunksize"], 1000)
+        self.assertEqual(report["temporaries"], b.peakarrays * 1000 * 8)
+
+        g = report["hists"]["two/g"]
+        self.assertEqual(g["arrays"], 100)
+        self.assertEqual(g["arraybytes"], 100 * b["two/g"]._content[0].nbytes)
+        self.assertEqual(g["nbytes"], g["arraybytes"] + g["overhead"] + g["keybytes"])
+        self.assertEqual([n for n, x in g["axes"]], ["groupby('c')", "bins"])
+        self.assertEqual(sum(x for n, x in g["axes"]), g["nbytes"])
+        self.assertEqual(report["hists"]["one"]["arrays"], 1)
+        self.assertEqual(b.memoryreport(chunksize=10)["temporaries"], b.peakarrays * 10 * 8)
+
+    def test_postfillbytes(self):
+        arrays = {"x": numpy.arange(1000) % 5, "c": numpy.arange(1000) % 100}
+        growths, profiles = [], []
+        for fill in (lambda b: b.fill(arrays), lambda b: b.fillparallel(arrays, nthreads=2), lambda b: b.fillprocesses(arrays, nprocesses=2)):
+            b = Book()
+            b["one"] = Hist(bin("x", 10, -3, 3))
+            b["two/g"] = Hist(groupby("c"), bin("x", 10, -3, 3))
+            b.fill(x=arrays["x"][:500], c=arrays["c"][:500] % 50)
+            before = dict((n, x["nbytes"]) for n, x in b.memoryreport()["hists"].items())
+            b.profiling = True
+            fill(b)
+            growths.append(dict((n, x["nbytes"] - before[n]) for n, x in b.memoryreport()["hists"].items()))
+            profiles.append(dict((n, b.fillprofile().entries["postfill", n][2]) for n in ("one", "two/g")))
+
+        # the workers' content is counted once, after merging, as the growth of each histogram
+        self.assertEqual(growths[0], {"one": 0, "two/g": growths[0]["two/g"]})
+        self.assertTrue(growths[0]["two/g"] > 0)
+        self.assertEqual(growths[1], growths[0])
+        self.assertEqual(growths[2], growths[0])
+        self.assertEqual(profiles, growths)
+
     def test_hierarchy(self):
         h = Hist(bin("x", 100, -5, 5))
         outer = Book()
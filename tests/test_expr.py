@@ -28,6 +28,8 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import copy
+import pickle
 import unittest
 
 from histbook.expr import *
@@ -247,3 +249,54 @@ class TestExpr(unittest.TestCase):
 
     def test_function(self):
         self.assertEqual(Expr.parse("sqrt(x)"), Call("sqrt", Name("x")))
+
+    def test_interned(self):
+        self.assertTrue(Expr.parse("sqrt(x**2 + y**2)") is Expr.parse("sqrt(y**2 + x**2)"))
+        self.assertTrue(Expr.parse("x > 0 and y < 2") is Expr.parse("y < 2 and x > 0"))
+        self.assertTrue(Predicate("p") is Predicate("p", positive=True))
+
+        # equal but distinct types of constants stay distinct objects
+        self.assertEqual(Const(1), Const(True))
+        self.assertEqual(hash(Const(1)), hash(Const(True)))
+        self.assertFalse(Const(1) is Const(True))
+        self.assertEqual(str(Call("f", Const(True))), "f(True)")
+        self.assertEqual(str(Call("f", Const(1))), "f(1)")
+        self.assertEqual(Const(-0.0), Const(0.0))
+        self.assertFalse(Const(-0.0) is Const(0.0))
+        self.assertTrue(Const(-0.0) is Const(-0.0))
+        self.assertEqual(str(Call("f", Const(-0.0))), "f(-0.0)")
+        self.assertEqual(str(Call("f", Const(0.0))), "f(0.0)")
+
+        # and so do the trees built from them
+        import histbook.instr
+        self.assertEqual(repr(histbook.instr.totree(Expr.parse("x + 1"))), "Call('numpy.add', Name('x'), Const(1))")
+        self.assertEqual(repr(histbook.instr.totree(Expr.parse("x + 1.0"))), "Call('numpy.add', Name('x'), Const(1.0))")
+        self.assertEqual(repr(histbook.instr.totree(Expr.parse("x + 1"))), "Call('numpy.add', Name('x'), Const(1))")
+
+        x = Expr.parse("x in {1, 2, 3} or y/2 > 3")
+        self.assertTrue(pickle.loads(pickle.dumps(x)) is x)
+        self.assertTrue(copy.deepcopy(x) is x)
+        self.assertRaises(AttributeError, lambda: setattr(Name("x"), "value", "y"))
+
+    def test_parsecache(self):
+        import histbook.expr
+        cache = histbook.expr.parsecache
+        cache.clear()
+
+        x = Expr.parse("sqrt(a**2 + b**2)")
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertTrue(Expr.parse("sqrt(a**2 + b**2)") is x)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        self.assertEqual(Expr.parse("a + c", defs={"c": "b*2"}), Expr.parse("a + b*2"))
+        self.assertEqual(Expr.parse("a + c", defs={"c": 3}), Expr.parse("a + 3"))
+        self.assertEqual(Expr.parse("a + c", defs={"c": 3.5}), Expr.parse("a + 3.5"))
+        self.assertEqual(str(Expr.parse("a + c", defs={"c": 3.5})), "3.5 + a")
+
+        cache.maxsize = 2
+        Expr.parse("p"); Expr.parse("q"); Expr.parse("r")
+        self.assertEqual(len(cache), 2)
+        cache.maxsize = 1024
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
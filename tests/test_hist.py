@@ -28,11 +28,17 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import pickle
+import platform
+import subprocess
+import sys
 import unittest
 
 import numpy
 
+import histbook.calc
+import histbook.fill
 from histbook.axis import *
 from histbook.hist import *
 
@@ -110,6 +116,15 @@ class TestHist(unittest.TestCase):
         h.fill(x=[0.0, 0.0001, 0.0001, 0.5, 0.5, 0.5, 0.9999, 0.9999, 0.9999, 0.9999, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0001, 1.0001, 1.0001, 1.0001, 1.0001, 1.0001, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.5, 1.9999, 1.9999, 1.9999, 1.9999, 1.9999, 1.9999, 1.9999, 1.9999, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001, 2.0001])
         self.assertEqual(h._content.tolist(), [[1], [2 + 3 + 4 + 5], [6 + 7 + 8 + 9], [10], [0]])
 
+    def test_bin_infinite(self):
+        h = Hist(bin("x", 2, 0, 2))
+        h.fill(x=[numpy.inf, -numpy.inf, 0.5, numpy.nan])
+        self.assertEqual(h._content.tolist(), [[1], [1], [0], [1], [1]])
+
+        h = Hist(bin("x", 2, 0, 2, underflow=False, nanflow=False), bin("y", 2, 0, 2, overflow=False))
+        h.fill(x=[-numpy.inf, 0.5, numpy.inf, 1.5, 1.5], y=[0.5, 5, 0.5, -1, numpy.nan])
+        self.assertEqual(h._content.tolist(), [[[0], [0], [0], [0]], [[1], [0], [0], [1]], [[0], [1], [0], [0]]])
+
     def test_bin_bin(self):
         h = Hist(bin("x", 3, 0, 3, underflow=False, overflow=False, nanflow=False), bin("y", 5, 0, 5, underflow=False, overflow=False, nanflow=False))
         h.fill(x=[1], y=[3])
@@ -391,6 +406,48 @@ class TestHist(unittest.TestCase):
         h.fill(x=[10.4, 10.3, 10.3, 10.5, 10.4, 10.8], y=[0.1, 0.1, 0.1, 0.1, 0.1, 1.0])
         self.assertEqual(h._content.tolist(), [[0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.2, 0.020000000000000004, 0.4, 0.08000000000000002, 2.0], [0.2, 0.020000000000000004, 0.4, 0.08000000000000002, 2.0], [0.1, 0.010000000000000002, 0.2, 0.04000000000000001, 1.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0], [1.0, 1.0, 2.0, 4.0, 1.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0]])
 
+    def test_profile_excluded(self):
+        h = Hist(bin("x", 2, 0, 2, underflow=False, overflow=False, nanflow=False), profile("y"))
+        h.fill(x=[-1, 0.5, 1.5, 1.5, 3, numpy.nan], y=[100, 1, 2, 3, 100, 100])
+        self.assertEqual(h._content.tolist(), [[1.0, 1.0, 1.0], [5.0, 13.0, 2.0]])
+
+    def test_accumulate_sparse(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0, 1, 1000)
+        w = numpy.random.uniform(0, 1, 1000)
+        dense = Hist(bin("x", 10, -3, 3), profile("x"), weight="w")
+        dense.fill(x=x, w=w)
+        sparse = Hist(bin("x", 10000, -3, 3), profile("x"), weight="w")
+        sparse.fill(x=x, w=w)
+        self.assertTrue(numpy.allclose(dense._content[1:-2].sum(axis=0), sparse._content[1:-2].sum(axis=0)))
+        self.assertTrue(numpy.allclose(dense._content[[0, -2, -1]], sparse._content[[0, -2, -1]]))
+
+    @unittest.skipIf(histbook.calc._numba() is None, "the fused kernel needs Numba")
+    def test_fusedbinning(self):
+        numpy.random.seed(12345)
+        x = numpy.random.normal(0.5, 1, 1000)
+        x[::7] = numpy.round(x[::7], 1)
+        x[::13] = numpy.nan
+        x[::17] = numpy.inf
+        x[::19] = -numpy.inf
+        data = dict(x=x, f=x.astype(numpy.float32), i=numpy.random.randint(-5, 10, 1000), c=numpy.random.randint(0, 2, 1000) == 1, w=numpy.random.uniform(0, 1, 1000))
+
+        for expect in (Hist(bin("x", 10, -1, 2), split("x", [-1, 0, 0.5, 1, 2]), weight="w"),
+                       Hist(bin("x", 10, -1, 2, underflow=False, overflow=False, nanflow=False, closedlow=False), profile("i")),
+                       Hist(split("x", [-1, 0, 0.5, 1, 2], underflow=False, nanflow=False, closedlow=False), cut("c"), intbin("i", -2, 5, overflow=False)),
+                       Hist(bin("f", 10, -1, 2), intbin("i", -2, 5), filter="i > 0")):
+            expect.fill(**data)
+            h = expect.cleared()
+            h.backend = "numba"
+            h.fill(**data)
+            self.assertTrue(numpy.array_equal(h._content, expect._content))
+
+            # the plan exports the binnings' arguments and the kernel bins them (float32 values are binned by the library function)
+            self.assertFalse(any(step[0] == histbook.fill.FillPlan.ASSIGN and step[2] in [histbook.calc.library[n] for n in histbook.calc.binning] for step in h._plan._steps))
+            self.assertEqual(len([step for step in h._plan._steps if step[0] == histbook.fill.FillPlan.EXPORT and step[4] is not None]), len(h._fixed))
+            kinds = tuple("index" if axis.expr == "f" else type(axis).__name__ for axis in h._fixed)
+            self.assertIn(kinds, [tuple(binning[0] for binning in key[0]) for key in histbook.calc._fusedkernels])
+
     def test_groupby(self):
         h = Hist(groupby("c"), bin("x", 3, 1.0, 4.0, underflow=False, overflow=False, nanflow=False))
         h.fill(c=["one", "two", "three", "two", "one", "one", "one"], x=[1, 2, 3, 2, 1, 1, 3])
@@ -406,6 +463,122 @@ class TestHist(unittest.TestCase):
         self.assertEqual(h._content["one"]["dos"].tolist(), [[1]])
         self.assertEqual(h._content["two"]["dos"].tolist(), [[1]])
 
+    def test_groupby_many(self):
+        numpy.random.seed(12345)
+        run = numpy.random.randint(0, 500, 10000)
+        lumi = numpy.random.randint(0, 3, 10000)
+        x = numpy.random.normal(0, 1, 10000)
+        h = Hist(groupby("run"), groupby("lumi"), bin("x", 5, -2, 2), weight="x")
+        h.fill(run=run, lumi=lumi, x=x)
+        self.assertEqual(h.groupkeys("run"), set(numpy.unique(run)))
+        for r in (0, 17, 499):
+            for l in (0, 1, 2):
+                selection = numpy.logical_and(run == r, lumi == l)
+                expect = Hist(bin("x", 5, -2, 2), weight="x")
+                expect.fill(x=x[selection])
+                self.assertTrue(numpy.allclose(h._content[r][l], expect._content))
+
+    def test_factorizer(self):
+        import histbook.calc
+        numpy.random.seed(12345)
+        words = numpy.array(["one", "two", "three", "a somewhat longer string", "a somewhat longer strinG", ""])
+        for values in (numpy.random.randint(-5, 5, 100), numpy.random.randint(0, 2**62, 20)[numpy.random.randint(0, 20, 100)], numpy.random.randint(0, 2, 100) == 1, words[numpy.random.randint(0, 6, 100)], words[numpy.random.randint(0, 6, 100)].astype("S"), words[numpy.random.randint(0, 6, 100)].astype(object)):
+            factorizer = histbook.calc.Factorizer()
+            for chunk in values[:0], values[:10], values, values[50:]:
+                expect = histbook.calc.histbook_groupby(chunk)
+                uniques, inverse = factorizer(chunk)
+                self.assertEqual(uniques.dtype, expect[0].dtype)
+                self.assertEqual(uniques.tolist(), expect[0].tolist())
+                self.assertEqual(inverse.tolist(), expect[1].tolist())
+            self.assertEqual(len(factorizer.keys), len(numpy.unique(values)))
+
+        # bytes and unicode (and signed and unsigned integers) with the same codes are different keys
+        factorizer = histbook.calc.Factorizer()
+        for chunk in numpy.array([b"a", b"b"]), numpy.array([u"a", u"c"]), numpy.array([b"a", b"c"]), numpy.array([-1, 1]), numpy.array([2**64 - 1, 1], dtype=numpy.uint64):
+            for i in range(2):
+                expect = histbook.calc.histbook_groupby(chunk)
+                uniques, inverse = factorizer(chunk)
+                self.assertEqual(uniques.dtype, expect[0].dtype)
+                self.assertEqual(uniques.tolist(), expect[0].tolist())
+                self.assertEqual(inverse.tolist(), expect[1].tolist())
+        self.assertEqual(len(factorizer.keys), 3 + 2 + 2 + 2)
+
+        # a new chunk far outside the direct table's range
+        factorizer = histbook.calc.Factorizer()
+        for chunk in numpy.arange(-5, 5), numpy.array([1, 2**63 - 1, -5]), numpy.array([-2**63, 4, 2**63 - 1]):
+            expect = histbook.calc.histbook_groupby(chunk)
+            uniques, inverse = factorizer(chunk)
+            self.assertEqual(uniques.tolist(), expect[0].tolist())
+            self.assertEqual(inverse.tolist(), expect[1].tolist())
+
+        # the same strings in arrays of different widths are the same keys
+        short = numpy.array(["one", "two", "three", "a somewhat longer string", "a somewhat longer strinG", "", "nine char"])
+        for values in short, short.astype("S"), short.astype(">U"):
+            factorizer = histbook.calc.Factorizer()
+            for chunk in values[:3], values[:3].astype(values.dtype.kind + "12"), values, values[::-1].astype(values.dtype.str[:2] + "40"), values[6:].astype(values.dtype.kind + "9"):
+                expect = histbook.calc.histbook_groupby(chunk)
+                uniques, inverse = factorizer(chunk)
+                self.assertEqual(uniques.dtype, expect[0].dtype)
+                self.assertEqual(uniques.tolist(), expect[0].tolist())
+                self.assertEqual(inverse.tolist(), expect[1].tolist())
+            self.assertEqual(len(factorizer.keys), len(short))
+
+        c = numpy.random.randint(0, 500, 10000)
+        x = numpy.random.normal(0, 1, 10000)
+        expect = Hist(groupby("c"), bin("x", 5, -2, 2))
+        expect.fill(c=c, x=x)
+        h = expect.cleared()
+        for start in range(0, 10000, 1000):
+            h.fill(c=c[start : start + 1000], x=x[start : start + 1000])
+        self.assertEqual(len([step[2] for step in h._plan._steps if isinstance(step[2], histbook.calc.Factorizer)][0].keys), 500)
+        self.assertEqual(h, expect)
+
+    def test_columnar(self):
+        numpy.random.seed(12345)
+        c = numpy.random.randint(0, 50, 3000)
+        s = numpy.array(["one", "two", "three"])[numpy.random.randint(0, 3, 3000)]
+        x = numpy.random.normal(0, 1, 3000)
+        x[::17] = numpy.nan
+        for expect in Hist(groupby("c"), bin("x", 5, -2, 2), profile("c"), filter="x > -1"), Hist(groupby("s", keeporder=True), groupbin("c", 10), cut("x > 0")):
+            h = expect.cleared()
+            h.columnar = True
+            for start in range(0, 3000, 1000):
+                expect.fill(c=c[start : start + 1000], s=s[start : start + 1000], x=x[start : start + 1000])
+                h.fill(c=c[start : start + 1000], s=s[start : start + 1000], x=x[start : start + 1000])
+            self.assertEqual(h, expect)
+            if h._group[0].keeporder:
+                self.assertEqual(list(h._content), list(expect._content))
+            self.assertEqual(h + h, expect + expect)
+            self.assertEqual(h * 2, expect * 2)
+            self.assertEqual(h.project(h._group[0]), expect.project(expect._group[0]))
+
+            copy = h.copy()
+            copy += expect
+            self.assertTrue(copy.columnar)
+            self.assertEqual(copy, expect + expect)
+            self.assertEqual(h, pickle.loads(pickle.dumps(h)))
+            self.assertTrue(pickle.loads(pickle.dumps(h)).columnar)
+            self.assertEqual(expect, Hist.fromjson(h.tojson()))
+
+            h.columnar = False
+            self.assertFalse(isinstance(h._content, GroupContent))
+            self.assertEqual(h, expect)
+
+        content = GroupContent(shape=(2,), dtype=numpy.float64)
+        for i in range(5):
+            content[i] = [i, 2*i]
+        self.assertEqual(content.capacity, 8)
+        content[1] += 10
+        del content[2]
+        self.assertEqual(list(content), [0, 1, 3, 4])
+        self.assertEqual([x.tolist() for x in content.values()], [[0, 0], [11, 12], [3, 6], [4, 8]])
+        self.assertEqual(content.stack.tolist(), [[0, 0], [11, 12], [4, 8], [3, 6]])
+        self.assertEqual(content.pop(3).tolist(), [3, 6])
+        self.assertEqual(dict((n, x.tolist()) for n, x in content.copy().items()), {0: [0, 0], 1: [11, 12], 4: [4, 8]})
+        total = GroupContent()
+        total._add(content)._add(content)
+        self.assertEqual(total.stack.tolist(), (2 * content.stack).tolist())
+
     def test_groupbin(self):
         h = Hist(groupbin("x", 10.0), bin("y", 4, 1.0, 5.0, underflow=False, overflow=False, nanflow=False))
         h.fill(x=[0, 10, 15, 20], y=[1, 2, 3, 4])
@@ -448,3 +621,18 @@ class TestHist(unittest.TestCase):
         h.fill(x=[1, 2, 3])
         self.assertEqual(h, Hist.fromjson(h.tojson()))
 
+    @unittest.skipIf(sys.version_info < (3, 7) or platform.python_implementation() != "CPython", "-X importtime and lazy module attributes need CPython 3.7")
+    def test_lazyimports(self):
+        import histbook
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(histbook.__file__)))] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH", "") != "" else []))
+        process = subprocess.Popen([sys.executable, "-X", "importtime", "-c", "import sys, histbook; print(' '.join(sorted(sys.modules)))"], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0)
+        imported = set(line.split("|")[-1].strip() for line in stderr.decode().split("\n") if line.startswith("import time:"))
+        loaded = set(stdout.decode().split())
+        self.assertIn("histbook.hist", imported)
+        self.assertIn("histbook.hist", loaded)
+        for lazy in ("histbook.vega", "histbook.export", "histbook.util.astunparse", "histbook.calc.spark", "multiprocessing"):
+            self.assertNotIn(lazy, imported)
+            self.assertNotIn(lazy, loaded)